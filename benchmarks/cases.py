@@ -0,0 +1,72 @@
+"""cases.py
+
+Representative design specifications for the benchmarks, for every design mode.
+
+Across each mode's cases every slump category, maximum aggregate size (10, 20 & 40mm),
+aggregate type pairing (crushed, uncrushed & mixed), specified/unspecified relative density at SSD
+and oven-dry batching case (none, both aggregates, fine aggregate only) is covered.
+Specifications use the column names of `core.logic.helpers.stream_helpers.input_fields`.
+"""
+
+modes = ('DOE', 'AEM', 'PFA', 'GGBS')
+
+slump_categories = ('0-10mm', '10-30mm', '30-60mm', '60-180mm')
+
+# Checked aggregate sizes for each maximum aggregate size
+aggregate_sizes = {10: (10, 0, 0), 20: (10, 20, 0), 40: (10, 20, 40)}
+
+# (coarse aggregate type, fine aggregate type)
+aggregate_types = (('Crushed', 'Crushed'), ('Uncrushed', 'Uncrushed'), ('Crushed', 'Uncrushed'))
+
+# (fine aggregate absorption, coarse aggregate absorption)
+oven_dry_cases = (('', ''), ('1.2', '0.8'), ('1.2', ''))
+
+# Extra inputs each mode needs
+mode_inputs = {
+    'DOE': {},
+    'AEM': {'air_content': '4.5'},
+    'PFA': {'pfa_proportion': '30'},
+    'GGBS': {'ggbs_proportion': '40'}
+}
+
+# Number of cases per mode, enough for every value above to appear
+cases_per_mode = 12
+
+
+def benchmark_cases() -> list:
+    """
+    Makes the benchmark specifications
+
+    :return: (list): [{'name': ..., 'mode': ..., 'spec': {column: value}}, ...]
+    """
+    cases = []
+
+    for mode in modes:
+        for i in range(cases_per_mode):
+            max_agg = (10, 20, 40)[i % 3]
+            coarse_type, fine_type = aggregate_types[(i // 4) % 3]
+            fine_absorption, coarse_absorption = oven_dry_cases[(i // 2) % 3]
+            agg_10mm, agg_20mm, agg_40mm = aggregate_sizes[max_agg]
+
+            spec = {
+                'characteristic_strength': str(20 + (i * 5) % 40),
+                'curing_days': '28',
+                'defective_rate': '5',
+                'slump': slump_categories[i % 4],
+                'agg_10mm': agg_10mm,
+                'agg_20mm': agg_20mm,
+                'agg_40mm': agg_40mm,
+                'coarse_agg_type': coarse_type,
+                'fine_agg_type': fine_type,
+                'ssd_relative_density': '2.65' if i % 2 else '',
+                'perc_passing_600um': str((15, 40, 60, 80, 100, 50)[i % 6]),
+                'fagg_absorption': fine_absorption,
+                'cagg_absorption': coarse_absorption,
+                'batch_volume': '1',
+                **mode_inputs[mode]
+            }
+
+            cases.append({'name': f'{mode.lower()}-{i:02d}-{max_agg}mm-{slump_categories[i % 4]}', 'mode': mode,
+                          'spec': spec})
+
+    return cases
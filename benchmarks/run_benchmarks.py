@@ -0,0 +1,336 @@
+"""run_benchmarks.py
+
+Times the design pipeline of every mode (whole and stage by stage), figure rendering and each export format,
+storing the results as JSON so they can be compared across commits.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks --output benchmarks/results/main.json
+    python -m benchmarks.run_benchmarks --output new.json --compare benchmarks/results/main.json --threshold 0.2
+
+With --compare, every timing whose median is more than `threshold` slower than the baseline (and slower by more
+than --noise-ms) is reported as a regression and the script exits with status 1.
+Rendering needs kaleido and a display for Tk; exports needing missing libraries are reported as skipped.
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.cases import benchmark_cases, modes
+from core.logic.batch_engine import analyzer_from_spec
+from core.utils import instrumentation
+
+
+def timing_stats(seconds: list) -> dict:
+    """Statistics of repeated timings, in milliseconds"""
+    ms = np.asarray(seconds) * 1e3
+
+    return {'n': int(ms.size), 'median_ms': float(np.median(ms)), 'p95_ms': float(np.percentile(ms, 95)),
+            'min_ms': float(ms.min()), 'mean_ms': float(ms.mean())}
+
+
+def designed(case: dict):
+    """Designs a benchmark case, returning its analyzer"""
+    analyzer = analyzer_from_spec(case['spec'])
+    analyzer.run_headless(case['mode'])
+    analyzer.batch_to_desired_volume(mode=case['mode'], mix_design_data=analyzer.design_results)
+
+    return analyzer
+
+
+def bench_pipeline(cases: list, repeat: int) -> dict:
+    """
+    Times the whole design (all five stages and batching) of every case
+
+    :return: (dict): 'pipeline/<mode>' and 'pipeline/all' -> timing stats
+    """
+    timings = {mode: [] for mode in modes}
+
+    # Warm up, the first design loads the reference data and Figure 6 lines
+    designed(cases[0])
+
+    for _ in range(repeat):
+        for case in cases:
+            start = time.perf_counter()
+            designed(case)
+            timings[case['mode']].append(time.perf_counter() - start)
+
+    results = {f'pipeline/{mode}': timing_stats(values) for mode, values in timings.items()}
+    results['pipeline/all'] = timing_stats(sum(timings.values(), []))
+
+    return results
+
+
+def bench_stages(cases: list, repeat: int) -> dict:
+    """
+    Times each analyzer method through the instrumentation layer
+
+    :return: (dict): 'stage/<mode>/<method>' -> timing stats
+    """
+    instrumentation.install()
+    timings = {}
+
+    for _ in range(repeat):
+        for case in cases:
+            instrumentation.span_buffer.clear()
+            designed(case)
+
+            for recorded in instrumentation.span_buffer:
+                method = recorded['name'].split('.', 1)[1]
+                timings.setdefault(f"stage/{case['mode']}/{method}", []).append(recorded['duration_us'] / 1e6)
+
+    return {name: timing_stats(values) for name, values in sorted(timings.items())}
+
+
+def figure_v_status(analyzer) -> str:
+    """The Figure 5 case the GUI plots for a design"""
+    if not analyzer.null_check('Additional info', 'Relative density of agg'):
+        return 'specified'
+
+    same_types = (analyzer.data['Additional info']['Coarse Aggregate Type']
+                  == analyzer.data['Additional info']['Fine Aggregate Type'])
+
+    return 'crushed or uncrushed, unspecified' if same_types else 'crushed and uncrushed, unspecified'
+
+
+def bench_render(cases: list, repeat: int, skipped: dict) -> dict:
+    """
+    Times the rendering of each figure (kaleido render & PNG decode into Tk), for the first case of each mode
+
+    :return: (dict): 'render/<mode>/<figure>' -> timing stats
+    """
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+    except Exception as error:
+        skipped['render'] = f'no Tk display ({error})'
+        return {}
+
+    results = {}
+
+    try:
+        for mode in modes:
+            case = next(case for case in cases if case['mode'] == mode)
+            analyzer = designed(case)
+
+            figures = {'figure_iii': analyzer.plot_sd,
+                       'figure_iv': analyzer.plot_fwc_determination,
+                       'figure_v': lambda: analyzer.plot_figure_v(status=figure_v_status(analyzer), mode=mode),
+                       'figure_vi': analyzer.plot_fine_agg_proportion}
+
+            for figure, plot in figures.items():
+                seconds = []
+
+                try:
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        plot()
+                        seconds.append(time.perf_counter() - start)
+                except Exception as error:
+                    skipped[f'render/{mode}/{figure}'] = f'{type(error).__name__}: {error}'
+                    continue
+
+                results[f'render/{mode}/{figure}'] = timing_stats(seconds)
+    finally:
+        root.destroy()
+
+    return results
+
+
+def bench_exports(cases: list, repeat: int, skipped: dict) -> dict:
+    """
+    Times each export format, for the first case of each mode; the workbook, JSON Lines and Parquet
+    exports write every case.
+
+    :return: (dict): 'export/<format>' -> timing stats
+    """
+    from core.logic.helpers import output_helpers
+    from core.logic.helpers.stream_helpers import JsonlSink, DesignParquetWriter
+
+    analyzers = [(case['mode'], designed(case)) for case in cases]
+    firsts = {mode: next(analyzer for analyzer_mode, analyzer in analyzers if analyzer_mode == mode)
+              for mode in modes}
+
+    def results_of(analyzer) -> list:
+        return [analyzer.data, analyzer.calc_data, analyzer.design_results, analyzer.design_batch_results]
+
+    def report_of(mode, analyzer):
+        return output_helpers.generate_md_report(
+            mode=mode,
+            design_results=[analyzer.data['Specified variables'], analyzer.data['Additional info'],
+                            analyzer.data['Mix Parameters'], analyzer.data['Result Tuning'],
+                            analyzer.calc_data, analyzer.design_results, analyzer.design_batch_results])
+
+    def to_jsonl(path):
+        with JsonlSink(path) as sink:
+            for mode, analyzer in analyzers:
+                sink.write(mode, results_of(analyzer))
+
+    def to_parquet(path):
+        with DesignParquetWriter(path) as writer:
+            for mode, analyzer in analyzers:
+                writer.write(mode, results_of(analyzer))
+
+    exports = {
+        'xlsx': lambda mode, analyzer, path: output_helpers.to_xlsx(
+            path=path / 'design.xlsx',
+            sheets=output_helpers.result_preparer(results_of(analyzer), mode=mode, accuracy_switch=0,
+                                                  odb_status=analyzer.odb_status)),
+        'md': lambda mode, analyzer, path: report_of(mode, analyzer),
+        'pdf': lambda mode, analyzer, path: output_helpers.to_pdf(report_of(mode, analyzer), path / 'design.pdf'),
+        'docx': lambda mode, analyzer, path: output_helpers.to_word(report_of(mode, analyzer), path / 'design.docx'),
+    }
+    batch_exports = {
+        'xlsx_workbook': lambda path: output_helpers.to_xlsx_workbook(
+            path / 'designs.xlsx', [(mode, results_of(analyzer)) for mode, analyzer in analyzers]),
+        'jsonl': lambda path: to_jsonl(path / 'designs.jsonl'),
+        'parquet': lambda path: to_parquet(path / 'designs.parquet'),
+    }
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir)
+
+        for export_format, export in exports.items():
+            seconds = []
+
+            try:
+                for _ in range(repeat):
+                    for mode, analyzer in firsts.items():
+                        start = time.perf_counter()
+                        export(mode, analyzer, path)
+                        seconds.append(time.perf_counter() - start)
+            except Exception as error:
+                skipped[f'export/{export_format}'] = f'{type(error).__name__}: {error}'
+                continue
+
+            results[f'export/{export_format}'] = timing_stats(seconds)
+
+        for export_format, export in batch_exports.items():
+            seconds = []
+
+            try:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    export(path)
+                    seconds.append(time.perf_counter() - start)
+            except Exception as error:
+                skipped[f'export/{export_format}'] = f'{type(error).__name__}: {error}'
+                continue
+
+            results[f'export/{export_format}'] = timing_stats(seconds)
+
+    return results
+
+
+def run_benchmarks(repeat: int = 5, render_repeat: int = 2, render: bool = True, exports: bool = True) -> dict:
+    """
+    Runs every benchmark
+
+    :param repeat: (int): Repeats of the pipeline, stage and export timings
+    :param render_repeat: (int): Repeats of the figure renders, which are slow
+    :param render: (bool): Time figure rendering
+    :param exports: (bool): Time the export formats
+    :return: (dict): {'meta': ..., 'results': {name: timing stats}, 'skipped': {name: reason}}
+    """
+    cases = benchmark_cases()
+    skipped = {}
+
+    # Rendering & exports are timed before the stages, whose instrumentation stays installed
+    results = bench_pipeline(cases, repeat)
+    if render:
+        results.update(bench_render(cases, render_repeat, skipped))
+    if exports:
+        results.update(bench_exports(cases, repeat, skipped))
+    results.update(bench_stages(cases, repeat))
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    meta = {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'cases': len(cases), 'repeat': repeat}
+
+    return {'meta': meta, 'results': results, 'skipped': skipped}
+
+
+def compare(current: dict, baseline: dict, threshold: float, noise_ms: float) -> list:
+    """
+    Finds the timings that regressed against a baseline
+
+    :param current: (dict): Results of this run
+    :param baseline: (dict): Results to compare against
+    :param threshold: (float): Allowed slowdown of a median, 0.2 is 20%
+    :param noise_ms: (float): Slowdowns smaller than this are ignored, whatever their ratio
+    :return: (list): [(name, baseline median ms, current median ms, ratio)] of the regressions
+    """
+    regressions = []
+
+    for name, stats in current['results'].items():
+        if name not in baseline['results']:
+            continue
+
+        before = baseline['results'][name]['median_ms']
+        after = stats['median_ms']
+        ratio = after / before if before else float('inf')
+
+        if ratio > 1 + threshold and after - before > noise_ms:
+            regressions.append((name, before, after, ratio))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OptiMix design pipeline benchmarks")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where the results JSON is written")
+    parser.add_argument('--compare', metavar='BASELINE', help="Results JSON of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown of a median (0.2 = 20%%)")
+    parser.add_argument('--noise-ms', type=float, default=0.05, help="Slowdowns below this many ms are ignored")
+    parser.add_argument('--repeat', type=int, default=5, help="Repeats of each timing")
+    parser.add_argument('--render-repeat', type=int, default=2, help="Repeats of each figure render")
+    parser.add_argument('--no-render', dest='render', action='store_false', help="Skip figure rendering")
+    parser.add_argument('--no-exports', dest='exports', action='store_false', help="Skip the export formats")
+    args = parser.parse_args()
+
+    results = run_benchmarks(repeat=args.repeat, render_repeat=args.render_repeat, render=args.render,
+                             exports=args.exports)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.output).write_text(json.dumps(results, indent=2))
+
+    width = max(len(name) for name in results['results'])
+    for name, stats in results['results'].items():
+        if not name.startswith('stage/'):
+            print(f"{name:<{width}}  median {stats['median_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms")
+
+    for name, reason in results['skipped'].items():
+        print(f"skipped {name}: {reason}")
+
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(results, baseline, args.threshold, args.noise_ms)
+
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms ({ratio - 1:+.0%})")
+
+        if regressions:
+            sys.exit(1)
+
+        print(f"No regressions against {args.compare} (threshold {args.threshold:.0%})")
+
+
+if __name__ == '__main__':
+    main()
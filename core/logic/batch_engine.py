@@ -0,0 +1,553 @@
+"""batch_engine.py
+
+Headless batch design of many mix specifications, streamed chunk by chunk from .csv or .parquet files.
+"""
+import os
+import json
+import time
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pyarrow as pa
+
+from core.logic.mix_design import MixDesignAnalyzer
+from core.logic.cement_limits import cement_limits
+from core.logic.design_records import DesignInput, DesignResult
+from core.logic.helpers.stream_helpers import input_fields, design_status, JsonlSink, DesignParquetWriter, \
+    concat_design_records
+from core.utils.resource_usage import peak_rss_mb
+
+# Concrete mix design modes
+design_modes = ('DOE', 'AEM', 'PFA', 'GGBS')
+
+
+def read_chunks(path, chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    Reads a specification file chunk by chunk, only one chunk is held in memory at a time.
+
+    Columns are named as the inputs in `stream_helpers.input_fields`, with an optional 'mode' column.
+    :param path: Location of the .csv or .parquet specification file
+    :param chunksize: (int): Number of specifications per chunk
+    """
+    if Path(path).suffix == '.parquet':
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+
+        for record_batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield record_batch.to_pandas()
+
+    else:
+        # Keep every value as text, as if it was typed into the GUI's entries
+        yield from pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False)
+
+
+def to_entry(value, arrow_type: pa.DataType):
+    """
+    Converts a specification value to the form `MixDesignAnalyzer.data` stores it in
+
+    :param value: Value read from the specification file
+    :param arrow_type: Arrow type of the input's column
+    :return: int for checkbuttons (aggregate sizes, <20 results toggle), str for everything else.
+             None when the value is missing, of any type, and the analyzer's default should be kept
+             (e.g. Strength Loss 5.5, or '' for inputs without one)
+    """
+    if value is None or pd.isna(value) or str(value).strip() == '':
+        return None
+
+    if pa.types.is_integer(arrow_type):
+        return int(float(value))
+
+    return str(value).strip()
+
+
+def analyzer_from_spec(spec: dict) -> MixDesignAnalyzer:
+    """
+    Makes an analyzer whose inputs are the values of a single specification
+
+    :param spec: (dict): input column name -> value
+    :return: (MixDesignAnalyzer): analyzer ready for `run_headless`
+    """
+    analyzer = MixDesignAnalyzer()
+
+    for column, value in spec.items():
+        if column in input_fields:
+            category, key, arrow_type = input_fields[column]
+            entry = to_entry(value, arrow_type)
+
+            if entry is not None:
+                analyzer.data[category][key] = entry
+
+    return analyzer
+
+
+def headless_stage(stage: Callable, *args):
+    """
+    Runs a headless design stage, turning input errors into a status
+
+    :param stage: The analyzer method to run, e.g. `analyzer.run_headless`
+    :param args: The method's arguments
+    :return: What the stage returns, or why the design could not be completed
+    """
+    try:
+        return stage(*args)
+
+    except (ValueError, KeyError, TypeError, ZeroDivisionError) as error:
+        # Missing or malformed compulsory inputs
+        return f'error: {type(error).__name__}: {error}'
+
+
+def headless_design(analyzer: MixDesignAnalyzer, mode: str) -> str:
+    """
+    Runs every design stage of an analyzer, turning input errors into a status
+
+    :param analyzer: (MixDesignAnalyzer): analyzer holding the specification's inputs
+    :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+    :return: (str): 'ok' or why the design could not be completed
+    """
+    return headless_stage(analyzer.run_headless, mode)
+
+
+def headless_designs(analyzers: list, modes: list) -> Tuple[list, list]:
+    """
+    Designs many analyzers, with the cement content limits of all of them evaluated at once by `cement_limits`
+    instead of design by design
+
+    :param analyzers: (list): analyzers holding the specifications' inputs
+    :param modes: (list) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode of each analyzer
+    :return: (list, list): 'ok' or why each design could not be completed, and the seconds spent on each
+    """
+    statuses = [None] * len(analyzers)
+    seconds = [0.0] * len(analyzers)
+    inputs = {}
+
+    # Stages one & two, then the limit inputs of the designs that got that far
+    for row, (analyzer, mode) in enumerate(zip(analyzers, modes)):
+        start = time.perf_counter()
+        statuses[row] = headless_stage(analyzer.headless_mix_parameters, mode)
+
+        if statuses[row] is None:
+            row_inputs = headless_stage(analyzer.cement_limit_inputs, mode)
+
+            if isinstance(row_inputs, str):
+                statuses[row] = row_inputs
+            else:
+                inputs[row] = row_inputs
+
+        seconds[row] += time.perf_counter() - start
+
+    # Stage three, every design's cement content limits in one go
+    if inputs:
+        start = time.perf_counter()
+        rows = list(inputs)
+        limits = cement_limits([modes[row] for row in rows],
+                               **{name: [inputs[row].get(name, np.nan) for row in rows]
+                                  for name in ('fw_content', 'fwc_ratio', 'min_content', 'max_content', 'max_ratio',
+                                               'proportion', 'efficiency', 'invalid_entry')})
+        shared_seconds = (time.perf_counter() - start) / len(rows)
+
+        # Stages four & five
+        for position, row in enumerate(rows):
+            start = time.perf_counter()
+            analyzer, mode = analyzers[row], modes[row]
+            status = headless_stage(analyzer.apply_cement_limits, mode, limits, position)
+
+            statuses[row] = status if isinstance(status, str) else headless_stage(analyzer.headless_aggregates, mode)
+            seconds[row] += time.perf_counter() - start + shared_seconds
+
+    return statuses, seconds
+
+
+class DesignCache:
+    """
+    Bounded least-recently-used store of finished designs, so repeated specifications are only designed once.
+
+    Designs are keyed by their parsed inputs (`DesignInput`, so '30' and '30.0' are the same design) and kept as
+    `DesignResult` records of what the results are made of, not the analyzer's plot data, so each entry stays small.
+    """
+
+    def __init__(self, max_designs: int = 4096):
+        """
+        :param max_designs: (int): Number of designs kept before the least recently used is dropped
+        """
+        self.max_designs = max_designs
+        self.designs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, analyzer: MixDesignAnalyzer, mode: str):
+        """
+        Fills the analyzer in from an identical earlier design, if there is one
+
+        :param analyzer: (MixDesignAnalyzer): analyzer holding the specification's inputs
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :return: (key, status): the design's cache key (None for malformed inputs, which are not cached)
+                 and the earlier design's status, None when it has not been designed yet
+        """
+        try:
+            # The batch volume and unit are left out, they only scale the finished design
+            key = (mode, DesignInput.from_data(analyzer.data).without_batching())
+        except ValueError:
+            # Malformed inputs, the design reports why
+            return None, None
+
+        cached = self.designs.get(key)
+
+        if cached is None:
+            return key, None
+
+        self.designs.move_to_end(key)
+        self.hits += 1
+
+        cached.to_analyzer(analyzer)
+        return key, cached.status
+
+    def store(self, key, analyzer: MixDesignAnalyzer, mode: str, status: str) -> None:
+        """
+        Keeps a finished design for reuse
+
+        :param key: The design's cache key from `lookup`
+        :param analyzer: (MixDesignAnalyzer): The designed analyzer
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :param status: (str): 'ok' or why the design could not be completed
+        """
+        self.misses += 1
+        self.designs[key] = DesignResult.from_analyzer(analyzer, mode, status)
+
+        if len(self.designs) > self.max_designs:
+            self.designs.popitem(last=False)
+
+    def design(self, analyzer: MixDesignAnalyzer, mode: str) -> str:
+        """
+        Designs the analyzer's specification, or fills the analyzer in from an identical earlier one
+
+        :param analyzer: (MixDesignAnalyzer): analyzer holding the specification's inputs
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :return: (str): 'ok' or why the design could not be completed
+        """
+        key, status = self.lookup(analyzer, mode)
+
+        if key is None:
+            return headless_design(analyzer, mode)
+
+        if status is not None:
+            return status
+
+        status = headless_design(analyzer, mode)
+        self.store(key, analyzer, mode, status)
+
+        return status
+
+
+def spec_analyzer(spec: dict, mode: str = 'DOE') -> Tuple[str, MixDesignAnalyzer]:
+    """
+    Makes the analyzer of a specification, and picks its mode
+
+    :param spec: (dict): input column name -> value, a 'mode' entry overrides `mode`
+    :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the default concrete mix design mode
+    :return: (mode, analyzer)
+    """
+    return str(spec.get('mode') or mode).strip().upper(), analyzer_from_spec(spec)
+
+
+def batch_design(analyzer: MixDesignAnalyzer, mode: str, status: str) -> str:
+    """
+    Batches a finished design to its specified volume, if one is specified
+
+    :param analyzer: (MixDesignAnalyzer): The designed analyzer
+    :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+    :param status: (str): 'ok' or why the design could not be completed
+    :return: (str): the design's status, or why it could not be batched
+    """
+    if status == 'ok' and not analyzer.null_check('Result Tuning', 'Batch volume'):
+        try:
+            analyzer.batch_to_desired_volume(mode=mode, mix_design_data=analyzer.design_results)
+
+        except (ValueError, KeyError, TypeError) as error:
+            status = f'error: {type(error).__name__}: {error}'
+
+    return status
+
+
+def design_spec(spec: dict, mode: str = 'DOE', cache: DesignCache = None) -> Tuple[str, MixDesignAnalyzer, str]:
+    """
+    Designs a single specification, then batches it to its specified volume
+
+    :param spec: (dict): input column name -> value, a 'mode' entry overrides `mode`
+    :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the default concrete mix design mode
+    :param cache: (DesignCache): Earlier designs to reuse for an identical specification
+    :return: (mode, analyzer, status), status is 'ok' or why the design could not be completed
+    """
+    mode, analyzer = spec_analyzer(spec, mode)
+
+    if mode not in design_modes:
+        return mode, analyzer, f'unknown mode {mode}'
+
+    status = headless_design(analyzer, mode) if cache is None else cache.design(analyzer, mode)
+
+    return mode, analyzer, batch_design(analyzer, mode, status)
+
+
+def open_sink(output_path, resume_at: int = None):
+    """
+    Opens the results writer matching the output file's extension, .parquet or .jsonl ('-' for stdout)
+
+    :param output_path: Location of the results file
+    :param resume_at: (int): JSON Lines only, size of the output at the last checkpoint;
+                      anything written after it is discarded and new lines are appended
+    """
+    if Path(str(output_path)).suffix == '.parquet':
+        return DesignParquetWriter(output_path)
+
+    if resume_at is not None:
+        os.truncate(output_path, resume_at)
+        return JsonlSink(output_path, append=True)
+
+    return JsonlSink(output_path)
+
+
+def checkpoint_path(output_path) -> Path:
+    """Location of the checkpoint manifest of a batch run's results file"""
+    return Path(f'{output_path}.checkpoint.json')
+
+
+def parts_path(output_path) -> Path:
+    """Location of the per-chunk Parquet files of a batch run, joined into the results file once the run ends"""
+    return Path(f'{output_path}.parts')
+
+
+def save_checkpoint(output_path, manifest: dict) -> None:
+    """
+    Persists the checkpoint manifest, replacing the previous one atomically so a crash never leaves half a manifest
+
+    :param output_path: Location of the results file
+    :param manifest: (dict): The checkpoint manifest, see `run_batch`
+    """
+    path = checkpoint_path(output_path)
+    temp_path = path.with_suffix('.tmp')
+
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(output_path, manifest: dict) -> dict:
+    """
+    Loads the checkpoint manifest of an interrupted run
+
+    :param output_path: Location of the results file
+    :param manifest: (dict): Manifest of the run being started, the checkpoint must be from the same job
+    :return: (dict): The checkpoint manifest, or `manifest` unchanged if there is no checkpoint to resume from
+    """
+    path = checkpoint_path(output_path)
+
+    if not path.exists():
+        return manifest
+
+    with open(path, encoding='utf-8') as file:
+        checkpoint = json.load(file)
+
+    for key in ('input', 'input_bytes', 'mode', 'chunksize'):
+        if checkpoint.get(key) != manifest[key]:
+            raise ValueError(f"The checkpoint at {path} is from a different job ({key} does not match), "
+                             f"delete it or run without resuming")
+
+    return checkpoint
+
+
+def write_design(sink, row_number: int, mode: str, analyzer: MixDesignAnalyzer, status: str) -> None:
+    """
+    Writes a designed specification into the results sink
+
+    :param sink: (JsonlSink or DesignParquetWriter): The results sink
+    :param row_number: (int): Position of the specification in the input file, starting from 0
+    :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+    :param analyzer: (MixDesignAnalyzer): The analyzer used for the design
+    :param status: (str): 'ok' or why the design could not be completed
+    """
+    mix_design_results = [analyzer.data, analyzer.calc_data, analyzer.design_results, analyzer.design_batch_results]
+
+    if isinstance(sink, JsonlSink):
+        sink.write(mode, mix_design_results, status=design_status(analyzer),
+                   row_number=row_number, design_status=status)
+    else:
+        sink.write(mode, mix_design_results, row_number=row_number, design_status=status)
+
+
+def design_chunk(sink, chunk: pd.DataFrame, first_row: int, mode: str, cache: DesignCache = None) -> int:
+    """
+    Designs every specification in a chunk into the results sink.
+    The chunk's designs are run together by `headless_designs`; repeats of a design earlier in the run
+    or the chunk are filled in from the cache instead.
+
+    :param sink: (JsonlSink or DesignParquetWriter): The results sink
+    :param chunk: (pd.DataFrame): The specifications
+    :param first_row: (int): Row number of the chunk's first specification in the input file
+    :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] mode for rows without a 'mode' column
+    :param cache: (DesignCache): Earlier designs to reuse for identical specifications
+    :return: (int): Number of specifications that could not be designed
+    """
+    rows = [spec_analyzer(spec, mode) for spec in chunk.to_dict(orient='records')]
+    statuses = [None] * len(rows)
+    keys = [None] * len(rows)
+    designing = set()  # cache keys of the chunk's designs, later rows with the same key are repeats
+    repeats = set()
+
+    for row, (row_mode, analyzer) in enumerate(rows):
+        if row_mode not in design_modes:
+            statuses[row] = f'unknown mode {row_mode}'
+
+        elif cache is not None:
+            keys[row], statuses[row] = cache.lookup(analyzer, row_mode)
+
+            if statuses[row] is None and keys[row] is not None:
+                if keys[row] in designing:
+                    repeats.add(row)
+                else:
+                    designing.add(keys[row])
+
+    # Designs not filled in from the cache
+    to_design = [row for row, status in enumerate(statuses) if status is None and row not in repeats]
+    new_statuses, _ = headless_designs([rows[row][1] for row in to_design], [rows[row][0] for row in to_design])
+
+    for row, status in zip(to_design, new_statuses):
+        statuses[row] = status
+
+        if cache is not None and keys[row] is not None:
+            cache.store(keys[row], rows[row][1], rows[row][0], status)
+
+    for row in repeats:
+        row_mode, analyzer = rows[row]
+        _, statuses[row] = cache.lookup(analyzer, row_mode)
+
+        if statuses[row] is None:
+            # Dropped from a full cache before its repeat was reached
+            statuses[row] = cache.design(analyzer, row_mode)
+
+    failed = 0
+
+    for row_number, (row_mode, analyzer), status in zip(range(first_row, first_row + len(rows)), rows, statuses):
+        if row_mode in design_modes:
+            status = batch_design(analyzer, row_mode, status)
+
+        write_design(sink, row_number, row_mode, analyzer, status)
+
+        failed += status != 'ok'
+
+    return failed
+
+
+def run_batch(input_path, output_path, mode: str = 'DOE', chunksize: int = 1000,
+              progress: Callable[[dict], None] = None, resume: bool = False, dedup: bool = True,
+              cache_size: int = 4096) -> dict:
+    """
+    Designs every specification in the input file, one chunk at a time;
+    a chunk's results are written out before the next chunk is read, so memory use does not grow with the file.
+
+    After every chunk a checkpoint manifest (`<output>.checkpoint.json`) records the chunks done
+    and the size of the results written so far. With `resume`, finished chunks are skipped
+    and results are continued from the checkpoint, giving the same output as an uninterrupted run.
+    Parquet results are written as one file per chunk in `<output>.parts` and joined when the run ends.
+
+    With `dedup`, specifications with the same inputs apart from the batch volume and unit are designed once
+    and the design is reused for every repeat; `batch_to_desired_volume` still runs for each row.
+
+    :param input_path: Location of the .csv or .parquet specification file
+    :param output_path: Location of the .jsonl or .parquet results file, '-' streams to stdout without checkpoints
+    :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] mode for rows without a 'mode' column
+    :param chunksize: (int): Number of specifications read and designed at a time
+    :param progress: Called with the running summary after every chunk
+    :param resume: (bool): Continue an interrupted run from its checkpoint
+    :param dedup: (bool): Design repeated specifications only once
+    :param cache_size: (int): Number of unique designs kept for reuse
+    :return: (dict): summary of the run; rows, failed, chunks, resumed_rows, seconds, rows_per_second,
+             peak_rss_mb, unique_designs, reused_designs and dedup_ratio (share of rows reusing an earlier design).
+             rows_per_second and the dedup figures only count the rows designed by this call
+    """
+    checkpointing = str(output_path) != '-'
+    parquet_output = Path(str(output_path)).suffix == '.parquet'
+
+    if resume and not checkpointing:
+        raise ValueError("Results streamed to stdout can not be resumed")
+
+    manifest = {'input': str(Path(input_path).resolve()),
+                'input_bytes': os.path.getsize(input_path),
+                'mode': mode,
+                'chunksize': chunksize,
+                'chunks_done': 0,
+                'rows_done': 0,
+                'failed': 0,
+                'output_bytes': 0}
+    resuming = resume and checkpoint_path(output_path).exists()
+
+    if resuming:
+        manifest = load_checkpoint(output_path, manifest)
+
+    summary = {'rows': manifest['rows_done'], 'failed': manifest['failed'], 'chunks': manifest['chunks_done'],
+               'resumed_rows': manifest['rows_done'], 'seconds': 0.0, 'rows_per_second': 0.0, 'peak_rss_mb': 0.0,
+               'unique_designs': 0, 'reused_designs': 0, 'dedup_ratio': 0.0}
+    cache = DesignCache(cache_size) if dedup else None
+    start = time.perf_counter()
+
+    if checkpointing and parquet_output:
+        # Each chunk gets its own file, a crash can then only ever lose the chunk being designed
+        parts = parts_path(output_path)
+        parts.mkdir(exist_ok=True)
+        sink = None
+    else:
+        sink = open_sink(output_path, resume_at=manifest['output_bytes'] if resuming else None)
+
+    try:
+        for chunk_number, chunk in enumerate(read_chunks(input_path, chunksize)):
+            if chunk_number < manifest['chunks_done']:
+                continue
+
+            if sink is None:
+                with DesignParquetWriter(parts / f'part-{chunk_number:06d}.parquet') as part_sink:
+                    summary['failed'] += design_chunk(part_sink, chunk, summary['rows'], mode, cache)
+            else:
+                summary['failed'] += design_chunk(sink, chunk, summary['rows'], mode, cache)
+
+                # Results of the chunk are written before the next chunk is read
+                sink.flush()
+
+            summary['rows'] += len(chunk)
+            summary['chunks'] += 1
+            summary['seconds'] = time.perf_counter() - start
+            summary['rows_per_second'] = (summary['rows'] - summary['resumed_rows']) / summary['seconds']
+            summary['peak_rss_mb'] = peak_rss_mb()
+
+            if cache is not None:
+                summary['unique_designs'] = cache.misses
+                summary['dedup_ratio'] = cache.hits / max(cache.hits + cache.misses, 1)
+                summary['reused_designs'] = cache.hits
+
+            if checkpointing:
+                if sink is not None:
+                    os.fsync(sink.file.fileno())
+                    manifest['output_bytes'] = os.path.getsize(output_path)
+
+                manifest.update(chunks_done=summary['chunks'], rows_done=summary['rows'], failed=summary['failed'])
+                save_checkpoint(output_path, manifest)
+
+            if progress:
+                progress(dict(summary))
+
+    finally:
+        if sink is not None:
+            sink.close()
+
+    if checkpointing:
+        if parquet_output:
+            concat_design_records([parts / f'part-{i:06d}.parquet' for i in range(summary['chunks'])], output_path)
+            shutil.rmtree(parts)
+
+        checkpoint_path(output_path).unlink(missing_ok=True)
+
+    return summary
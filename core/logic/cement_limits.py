@@ -0,0 +1,199 @@
+"""cement_limits.py
+
+Table-driven cement content limits, evaluated as array operations over many designs at once.
+
+Stage three of every mode divides the free-water content by the free-water/cement ratio, then holds the result to the
+specified minimum & maximum cement contents. PFA & GGBS designs also split it into cement & addition and hold it to
+the maximum W/(C+F) or W/(C+G) ratio. `cement_limits` applies these rules to whole columns of designs with masks,
+`MixDesignAnalyzer.calculate_cement_content` is the single design case.
+"""
+from enum import IntEnum, IntFlag
+
+import numpy as np
+
+
+class ContentSplit(IntEnum):
+    """How a mode splits its cementitious content into cement & addition"""
+    NONE = 0
+    EFFICIENCY = 1  # pfa, cement from its cementing efficiency factor
+    PROPORTION = 2  # ggbs, cement from the ggbs proportion
+
+
+# mode -> (split, name of the free-water ratio limiting the cementitious content, calc_data name of the addition)
+limit_rules = {
+    'DOE': (ContentSplit.NONE, None, None),
+    'AEM': (ContentSplit.NONE, None, None),
+    'PFA': (ContentSplit.EFFICIENCY, 'wcf', 'F'),
+    'GGBS': (ContentSplit.PROPORTION, 'wcg', 'G')
+}
+
+
+class LimitStatus(IntFlag):
+    """
+    Outcome of the limits for a design, stored per row as a uint16 of these bits.
+    WITHIN_RANGE (no outcome bits) means the calculated content was kept as it is.
+    """
+    WITHIN_RANGE = 0
+    BELOW_MINIMUM = 1  # Raised to the minimum cement content
+    RATIO_LIMITED = 2  # Raised to meet the maximum free-water ratio
+    MIN_MORE_THAN_MAX = 4  # Minimum cement content specified above the maximum
+    INFEASIBLE = 8  # The calculated content is above the maximum, the specification can not be met
+    INVALID_ENTRY = 16  # A limit is not a positive number
+    UNDEFINED = 32  # The contents could not be calculated (division by zero)
+
+    # Which limits were specified
+    MIN_SPECIFIED = 64
+    MAX_SPECIFIED = 128
+    RATIO_SPECIFIED = 256
+
+
+def parse_limit_entries(entries) -> tuple:
+    """
+    Parses limit entries as the GUI accepts them: blank, or digits with at most one decimal point
+
+    :param entries: Entry texts, one per design
+    :return: (np.ndarray, np.ndarray): the limits (nan where blank or invalid) & a mask of the invalid entries
+    """
+    entries = [str(entry).strip() for entry in entries]
+    invalid = np.array([not (entry == '' or entry.replace('.', '', 1).isnumeric()) for entry in entries], dtype=bool)
+    values = np.array([np.nan if entry == '' or bad else float(entry) for entry, bad in zip(entries, invalid)],
+                      dtype=np.float64)
+
+    return values, invalid
+
+
+def cement_limits(modes, fw_content, fwc_ratio, min_content, max_content, max_ratio=np.nan, proportion=np.nan,
+                  efficiency=np.nan, invalid_entry=False) -> dict:
+    """
+    Determines the cement contents of many designs, holding them to their specified limits
+
+    Every argument is a column with one value per design (scalars are broadcast); unspecified limits are nan.
+
+    :param modes: (str, list) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode of each design
+    :param fw_content: Free-water contents (kg/m3)
+    :param fwc_ratio: Free-water/cement ratios, the initial ratio for PFA & GGBS designs
+    :param min_content: Minimum cement contents (kg/m3)
+    :param max_content: Maximum cement contents (kg/m3)
+    :param max_ratio: Maximum free-water ratios, nan or 0 for no limit. PFA & GGBS only
+    :param proportion: Proportions of pfa or ggbs (%)
+    :param efficiency: Cementing efficiency factors of pfa
+    :param invalid_entry: Mask of the designs with an invalid limit entry, see `parse_limit_entries`
+    :return: (dict): columns named as the calc_data values they become; 'addition' is the pfa or ggbs,
+             'ratio' the calculated W/(C+F) or W/(C+G) and 'status' the `LimitStatus` bits.
+             Contents are nan wherever the limits could not be met
+    """
+    fw_content = np.asarray(fw_content, dtype=np.float64)
+    size = fw_content.size
+    fw_content = fw_content.reshape(size)
+
+    def column(values) -> np.ndarray:
+        return np.broadcast_to(np.asarray(values, dtype=np.float64), (size,))
+
+    fwc_ratio, min_content, max_content = column(fwc_ratio), column(min_content), column(max_content)
+    max_ratio, p, k = column(max_ratio), column(proportion), column(efficiency)
+    invalid_entry = np.broadcast_to(np.asarray(invalid_entry, dtype=bool), (size,))
+
+    # Rules of each design's mode
+    names, codes = np.unique(np.broadcast_to(np.asarray(modes, dtype=str), (size,)), return_inverse=True)
+    rules = np.array([(limit_rules[name][0], limit_rules[name][1] is not None) for name in names], dtype=np.int8)
+    split, ratio_limited = rules[codes, 0], rules[codes, 1].astype(bool)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Calculated cementitious content and its cement & addition shares
+        total = fw_content / fwc_ratio
+        init_c = np.where(split == ContentSplit.PROPORTION, ((100 - p) / 100) * total, total)
+        init_addition = np.where(split == ContentSplit.PROPORTION, total - init_c, 0.0)
+
+        pfa = split == ContentSplit.EFFICIENCY
+        init_c = np.where(pfa, ((100 - p) * fw_content) / ((100 - ((1 - k) * p)) * fwc_ratio), init_c)
+        init_addition = np.where(pfa, (p * init_c) / (100 - p), init_addition)
+        total = np.where(pfa, init_c + init_addition, total)
+
+        # Minimum & maximum cement contents
+        has_min, has_max = ~np.isnan(min_content), ~np.isnan(max_content)
+        below = has_min & (total < min_content)
+        infeasible = has_max & (total > max_content) & ~below
+
+        cement = np.where(below, min_content, total)
+        diff = cement - total
+        share = np.where(split == ContentSplit.NONE, 0.0, p / 100)
+        init_ii_c = init_c + ((1 - share) * diff)
+        init_ii_addition = init_addition + (share * diff)
+
+        # Maximum free-water ratio, W/(C+F) or W/(C+G)
+        ratio = fw_content / cement
+        has_limit = ratio_limited & ~np.isnan(max_ratio) & (max_ratio != 0)
+        over = has_limit & (ratio > max_ratio) & ~infeasible
+
+        modified_ratio = np.where(over, max_ratio, ratio)
+        final = np.where(over, fw_content / max_ratio, cement)
+        diff = final - cement
+        c = init_ii_c + ((1 - share) * diff)
+        addition = init_ii_addition + (share * diff)
+
+    undefined = ~(np.isfinite(total) & np.isfinite(init_c) & np.isfinite(init_addition))
+    failed = infeasible | invalid_entry | undefined
+
+    status = np.zeros(size, dtype=np.uint16)
+    outcomes = ((below, LimitStatus.BELOW_MINIMUM), (over, LimitStatus.RATIO_LIMITED),
+                (has_min & has_max & (min_content > max_content), LimitStatus.MIN_MORE_THAN_MAX),
+                (infeasible, LimitStatus.INFEASIBLE), (invalid_entry, LimitStatus.INVALID_ENTRY),
+                (undefined, LimitStatus.UNDEFINED), (has_min, LimitStatus.MIN_SPECIFIED),
+                (has_max, LimitStatus.MAX_SPECIFIED), (has_limit, LimitStatus.RATIO_SPECIFIED))
+
+    for mask, flag in outcomes:
+        status[mask] |= np.uint16(flag)
+
+    def met(values: np.ndarray) -> np.ndarray:
+        return np.where(failed, np.nan, values)
+
+    return {
+        'calc_cement_content': total,
+        'init_C': init_c,
+        'init_addition': init_addition,
+        'cement_content': met(cement),
+        'init_ii_C': met(init_ii_c),
+        'init_ii_addition': met(init_ii_addition),
+        'ratio': met(ratio),
+        'modified_fwc_ratio': met(modified_ratio),
+        'final_cementitious_content': met(final),
+        'C': met(c),
+        'addition': met(addition),
+        'status': status
+    }
+
+
+def limit_report(mode: str, status: int) -> dict:
+    """
+    Describes a design's limit status as the results pages report it, `MixDesignAnalyzer.cc_status`
+
+    :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+    :param status: (int): The design's `LimitStatus` bits
+    :return: (dict): Whether each limit was specified & how the cement content and free-water ratio compare to them
+    """
+    status = LimitStatus(int(status))
+    ratio_name = limit_rules[mode][1]
+
+    def specified(flag: LimitStatus) -> str:
+        return 'Specified' if flag in status else 'Unspecified'
+
+    report = {'max_content': specified(LimitStatus.MAX_SPECIFIED),
+              'min_content': specified(LimitStatus.MIN_SPECIFIED)}
+
+    if LimitStatus.INFEASIBLE in status:
+        return report
+
+    if status & (LimitStatus.MIN_SPECIFIED | LimitStatus.MAX_SPECIFIED):
+        report['cement_content'] = 'Below Minimum' if LimitStatus.BELOW_MINIMUM in status else 'Within Range'
+
+    if ratio_name is not None:
+        report[f'limiting {ratio_name}'] = specified(LimitStatus.RATIO_SPECIFIED)
+
+        if LimitStatus.RATIO_LIMITED in status:
+            report[f'{ratio_name}_status'] = 'More than Maximum'
+        elif LimitStatus.RATIO_SPECIFIED in status:
+            report[f'{ratio_name}_status'] = 'Less than Maximum'
+        else:
+            report[f'{ratio_name}_status'] = 'No Limits'
+
+    return report
@@ -0,0 +1,57 @@
+"""curve.py
+
+Lightweight curve type for the chart lines the design engine reads and interpolates on.
+"""
+import numpy as np
+import pandas as pd
+
+
+class Curve:
+    """
+    A chart line as an (x, y) pair of contiguous float64 arrays.
+
+    The engine works on curves directly; DataFrames are only made at the plotting & export boundary with `to_frame`.
+    Curves can be unpacked, `x, y = curve`.
+
+    Attributes:
+        - x `np.ndarray`: x-coordinates
+        - y `np.ndarray`: y-coordinates, one per x-coordinate
+    """
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x, y):
+        """
+        :param x: (np.ndarray, pd.Series, list): x-coordinates, not copied if already contiguous float64
+        :param y: (np.ndarray, pd.Series, list): y-coordinates, not copied if already contiguous float64
+        """
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+
+        if self.x.ndim != 1 or self.x.shape != self.y.shape:
+            raise ValueError(f"x and y must be 1-D and of the same length, got {self.x.shape} and {self.y.shape}")
+
+    @classmethod
+    def from_rows(cls, array: np.ndarray) -> 'Curve':
+        """
+        Views a (2, n) array of x & y rows, as stored in the reference pack & shared block, without copying
+
+        :param array: (np.ndarray): Row 0 the x-coordinates, row 1 the y-coordinates
+        """
+        return cls(array[0], array[1])
+
+    def to_rows(self) -> np.ndarray:
+        """The curve as a (2, n) array of x & y rows"""
+        return np.stack((self.x, self.y))
+
+    def to_frame(self) -> pd.DataFrame:
+        """The curve as a DataFrame of 'x' & ' y' columns, the reference CSVs' layout"""
+        return pd.DataFrame({'x': self.x, ' y': self.y})
+
+    def __len__(self) -> int:
+        return self.x.size
+
+    def __iter__(self):
+        return iter((self.x, self.y))
+
+    def __repr__(self) -> str:
+        return f'Curve({self.x.size} points, x {self.x[0]:g}..{self.x[-1]:g})' if self.x.size else 'Curve(empty)'
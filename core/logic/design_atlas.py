@@ -0,0 +1,418 @@
+"""design_atlas.py
+
+Precomputed grid of designs over the main inputs, answering what-if questions approximately in well under a millisecond.
+
+Build (offline, a few minutes):
+    python -m core.logic.design_atlas --samples 500
+
+An atlas is a folder holding `values.npy`, a dense float64 array that is memory-mapped when opened, laid out as
+    [characteristic strength, curing age, defective rate, percentage passing, ssd,
+     slump category, max aggregate size, coarse aggregate type, fine aggregate type, quantity]
+and `manifest.json`, with the axes, the inputs held fixed, and an accuracy report against the exact engine.
+Numeric axes are interpolated multilinearly; categorical axes are looked up by their codes, never interpolated.
+Designs that can not be completed are nan, as is any answer that needs them.
+
+Answers are approximate, final designs are made with `MixDesignAnalyzer` as always.
+"""
+import copy
+import json
+import time
+import argparse
+import itertools
+from pathlib import Path
+
+import numpy as np
+
+from core.logic.mix_design import MixDesignAnalyzer
+from core.logic.cement_limits import cement_limits
+from core.logic.fine_agg_portioner import figure_vi_agg_sizes
+from core.logic.reference_data import slump_categories, aggregate_types, category_codes
+from core.utils.file_paths import optimix_paths
+
+# Version of the atlas layout, atlases of any other version have to be rebuilt
+atlas_version = 1
+
+# Mode the atlas is built for
+atlas_mode = 'DOE'
+
+# Interpolated inputs and their grid points, named as the columns of `stream_helpers.input_fields`
+numeric_axes = {
+    'characteristic_strength': (15, 20, 25, 30, 35, 40, 45, 50, 55, 60),
+    'curing_days': (3, 7, 28, 91),
+    'defective_rate': (1, 2.5, 5, 10),
+    'perc_passing_600um': (15, 40, 60, 80, 100),
+    'ssd_relative_density': (2.4, 2.5, 2.6, 2.7, 2.8, 2.9)
+}
+
+# Looked up inputs and their categories
+categorical_axes = {
+    'slump': slump_categories,
+    'max_agg_size': figure_vi_agg_sizes,
+    'coarse_agg_type': aggregate_types,
+    'fine_agg_type': aggregate_types
+}
+
+# Inputs held at one value across the atlas: analyzer data (category, key) -> value
+fixed_inputs = {
+    ('Specified variables', 'Cement Type'): 'OPC',
+    ('Specified variables', 'Less Than 20 Results'): 1
+}
+
+# Results stored at every grid point: name -> where the exact design keeps it
+atlas_quantities = {
+    'cement': ('design_results', 'cement'),
+    'water': ('design_results', 'water'),
+    'fine_agg': ('design_results', 'fagg'),
+    'coarse_agg': ('design_results', 'cagg'),
+    'fwc_ratio': ('calc_data', 'modified_fwc_ratio'),
+    'wet_density': ('calc_data', 'wet_conc_density')
+}
+
+
+def atlas_analyzer(characteristic_strength, curing_days, defective_rate, perc_passing_600um, ssd_relative_density,
+                   slump, max_agg_size, coarse_agg_type='Crushed', fine_agg_type='Crushed') -> MixDesignAnalyzer:
+    """
+    Makes the analyzer of a point of the atlas, the exact design it approximates
+
+    :param characteristic_strength: (float): Characteristic strength (N/mm2)
+    :param curing_days: (float): Curing age (days)
+    :param defective_rate: (float): Proportion defective (%)
+    :param perc_passing_600um: (float): Percentage of fine aggregate passing the 600um sieve
+    :param ssd_relative_density: (float): Relative density of the aggregate at SSD
+    :param slump: (str): Slump category, e.g. '30-60mm'
+    :param max_agg_size: (int): 10, 20 or 40 (mm), the coarse aggregate sizes up to it are used
+    :param coarse_agg_type: (str): Crushed/Uncrushed
+    :param fine_agg_type: (str): Crushed/Uncrushed
+    :return: (MixDesignAnalyzer): analyzer ready for `run_headless(atlas_mode)`
+    """
+    analyzer = MixDesignAnalyzer()
+    specified, additional = analyzer.data['Specified variables'], analyzer.data['Additional info']
+
+    specified['Characteristic Strength'] = str(characteristic_strength)
+    specified['Curing Days'] = str(curing_days)
+    specified['Defective Rate'] = str(defective_rate)
+    specified['Slump'] = slump
+
+    for size in figure_vi_agg_sizes:
+        specified[f'{size}mm'] = size if size <= int(max_agg_size) else 0
+
+    additional['Percentage passing 600um sieve'] = str(perc_passing_600um)
+    additional['Relative density of agg'] = str(ssd_relative_density)
+    additional['Coarse Aggregate Type'] = coarse_agg_type
+    additional['Fine Aggregate Type'] = fine_agg_type
+
+    for (category, key), value in fixed_inputs.items():
+        analyzer.data[category][key] = value
+
+    return analyzer
+
+
+def design_quantities(analyzer: MixDesignAnalyzer, status: str) -> np.ndarray:
+    """The atlas quantities of a design, nan if it could not be completed"""
+    if status != 'ok':
+        return np.full(len(atlas_quantities), np.nan)
+
+    values = []
+
+    for source, key in atlas_quantities.values():
+        value = getattr(analyzer, source)[key]
+        values.append(float(value[0] if source == 'design_results' else value))
+
+    return np.array(values)
+
+
+def clone_design(analyzer: MixDesignAnalyzer) -> MixDesignAnalyzer:
+    """Copies an analyzer part way through its design, so the copy can be finished with other inputs"""
+    clone = copy.copy(analyzer)
+    clone.data = {category: dict(values) for category, values in analyzer.data.items()}
+    clone.calc_data = dict(analyzer.calc_data)
+    clone.graph_temp = dict(analyzer.graph_temp)
+    clone.tac_content = dict(analyzer.tac_content)
+    clone.cc_status = None if analyzer.cc_status is None else dict(analyzer.cc_status)
+
+    return clone
+
+
+def exact_design(**point) -> np.ndarray:
+    """
+    Designs a point of the atlas with the exact engine
+
+    :param point: The arguments of `atlas_analyzer`
+    :return: (np.ndarray): The design's atlas quantities, nan if it could not be completed
+    """
+    analyzer = atlas_analyzer(**point)
+
+    try:
+        status = analyzer.run_headless(atlas_mode)
+    except (ValueError, KeyError, TypeError, ZeroDivisionError):
+        status = 'error'
+
+    return design_quantities(analyzer, status)
+
+
+def build_atlas(path=None, samples: int = 500, progress=None) -> dict:
+    """
+    Designs every point of the grid into an atlas, then measures it against the exact engine
+
+    The cement contents of every design are limited in one `cement_limits` call. Percentage passing & ssd only
+    affect stages four & five, so each design is taken that far once and then finished for each of their values.
+
+    :param path: Folder of the atlas, `optimix_paths.design_atlas_dir` by default
+    :param samples: (int): Random points the accuracy report compares with the exact engine
+    :param progress: Called with the share of the grid designed, from 0 to 1
+    :return: (dict): The atlas manifest
+    """
+    path = optimix_paths.design_atlas_dir if path is None else Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+
+    names = list(numeric_axes) + list(categorical_axes)
+    shape = tuple(len(axis) for axis in numeric_axes.values()) + tuple(len(axis) for axis in categorical_axes.values())
+
+    # Written to a temporary file first, so a failed build never leaves a half-written atlas behind
+    temp_path = path / 'values.npy.tmp'
+    values = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.float64, shape=shape + (len(atlas_quantities),))
+    values[:] = np.nan
+
+    # Grid points up to the cement content, every input but percentage passing & ssd
+    outer_names = [name for name in names if name not in ('perc_passing_600um', 'ssd_relative_density')]
+    axes = {**numeric_axes, **categorical_axes}
+    outer_points = list(itertools.product(*(range(len(axes[name])) for name in outer_names)))
+    analyzers, statuses, inputs = [], [], []
+
+    for indices in outer_points:
+        point = {name: axes[name][index] for name, index in zip(outer_names, indices)}
+        analyzer = atlas_analyzer(perc_passing_600um='', ssd_relative_density='', **point)
+
+        try:
+            status = analyzer.headless_mix_parameters(atlas_mode)
+            row_inputs = analyzer.cement_limit_inputs(atlas_mode) if status is None else None
+        except (ValueError, KeyError, TypeError, ZeroDivisionError):
+            status, row_inputs = 'error', None
+
+        analyzers.append(analyzer)
+        statuses.append(status)
+        inputs.append(row_inputs)
+
+    # Stage three for the whole grid at once
+    designed = [row for row, row_inputs in enumerate(inputs) if row_inputs is not None]
+    limits = cement_limits(atlas_mode, **{name: [inputs[row][name] for row in designed]
+                                          for name in (inputs[designed[0]] if designed else ['fw_content'])})
+
+    for position, row in enumerate(designed):
+        try:
+            analyzers[row].apply_cement_limits(atlas_mode, limits, position)
+        except ValueError:
+            statuses[row] = 'error'
+
+    # Stages four & five for every percentage passing & ssd
+    perc_index, ssd_index = names.index('perc_passing_600um'), names.index('ssd_relative_density')
+
+    for count, (indices, analyzer, status) in enumerate(zip(outer_points, analyzers, statuses), start=1):
+        if status is not None:
+            continue
+
+        for i, perc_passing in enumerate(numeric_axes['perc_passing_600um']):
+            for j, ssd in enumerate(numeric_axes['ssd_relative_density']):
+                clone = clone_design(analyzer)
+                clone.data['Additional info']['Percentage passing 600um sieve'] = str(perc_passing)
+                clone.data['Additional info']['Relative density of agg'] = str(ssd)
+
+                try:
+                    clone_status = clone.headless_aggregates(atlas_mode)
+                except (ValueError, KeyError, TypeError, ZeroDivisionError):
+                    clone_status = 'error'
+
+                index = list(indices)
+                index[perc_index:perc_index] = [i]
+                index[ssd_index:ssd_index] = [j]
+                values[tuple(index)] = design_quantities(clone, clone_status)
+
+        if progress and count % 100 == 0:
+            progress(count / len(outer_points))
+
+    values.flush()
+    del values
+    temp_path.replace(path / 'values.npy')
+
+    manifest = {
+        'version': atlas_version,
+        'mode': atlas_mode,
+        'numeric_axes': numeric_axes,
+        'categorical_axes': categorical_axes,
+        'fixed_inputs': {f'{category}/{key}': value for (category, key), value in fixed_inputs.items()},
+        'quantities': list(atlas_quantities),
+        'build_seconds': round(time.perf_counter() - start, 1)
+    }
+
+    with open(path / 'manifest.json', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+
+    manifest['accuracy'] = accuracy_report(DesignAtlas(path), samples)
+
+    with open(path / 'manifest.json', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+
+    return manifest
+
+
+def random_points(samples: int, seed: int = 0) -> dict:
+    """
+    Random points within the atlas, numeric inputs uniform between their ends
+
+    :param samples: (int): Number of points
+    :param seed: (int): Seed of the random generator, the report is repeatable
+    :return: (dict): input name -> array of values
+    """
+    generator = np.random.default_rng(seed)
+    points = {name: generator.uniform(min(axis), max(axis), samples).round(2) for name, axis in numeric_axes.items()}
+
+    for name, categories in categorical_axes.items():
+        points[name] = np.array(categories)[generator.integers(len(categories), size=samples)]
+
+    return points
+
+
+def accuracy_report(atlas: 'DesignAtlas', samples: int = 500) -> dict:
+    """
+    Compares the atlas with the exact engine at random points
+
+    :param atlas: (DesignAtlas): The atlas
+    :param samples: (int): Number of points compared
+    :return: (dict): samples, the share of points both answered (coverage), the points only one of them answered,
+             and per quantity the mean, 95th percentile & largest absolute and relative (%) errors
+    """
+    points = random_points(samples)
+    approximate = atlas.query(**points)
+
+    exact = np.array([exact_design(**{name: values[row].item() for name, values in points.items()})
+                      for row in range(samples)])
+    approximate = np.stack([approximate[name] for name in atlas.quantities], axis=-1)
+
+    answered = ~np.isnan(exact).any(axis=1) & ~np.isnan(approximate).any(axis=1)
+    report = {
+        'samples': samples,
+        'coverage': float(answered.mean()),
+        'exact_only': int((~np.isnan(exact).any(axis=1) & ~answered).sum()),
+        'atlas_only': int((~np.isnan(approximate).any(axis=1) & ~answered).sum()),
+        'errors': {}
+    }
+
+    for column, name in enumerate(atlas.quantities):
+        error = np.abs(approximate[answered, column] - exact[answered, column])
+        relative = 100 * error / np.abs(exact[answered, column])
+
+        report['errors'][name] = {
+            'mean_abs': float(error.mean()) if error.size else None,
+            'p95_abs': float(np.percentile(error, 95)) if error.size else None,
+            'max_abs': float(error.max()) if error.size else None,
+            'mean_rel_percent': float(relative.mean()) if error.size else None,
+            'max_rel_percent': float(relative.max()) if error.size else None
+        }
+
+    return report
+
+
+class DesignAtlas:
+    """
+    A built design atlas, memory-mapped
+
+    Attributes:
+        - axes `dict`: numeric input name -> its grid points
+        - categories `dict`: categorical input name -> its categories
+        - quantities `list`: names of the stored results, the keys of `query`'s answer
+        - accuracy `dict`: The accuracy report made when it was built, see `accuracy_report`
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: Folder of the atlas, `optimix_paths.design_atlas_dir` by default
+        :raises FileNotFoundError: If the atlas has not been built
+        :raises ValueError: If it was built by another version and has to be rebuilt
+        """
+        path = optimix_paths.design_atlas_dir if path is None else Path(path)
+
+        with open(path / 'manifest.json', encoding='utf-8') as file:
+            manifest = json.load(file)
+
+        if manifest['version'] != atlas_version:
+            raise ValueError(f"The atlas at {path} is version {manifest['version']}, rebuild it with "
+                             f"`python -m core.logic.design_atlas`")
+
+        self.mode = manifest['mode']
+        self.axes = {name: np.array(axis, dtype=np.float64) for name, axis in manifest['numeric_axes'].items()}
+        self.categories = {name: tuple(categories) for name, categories in manifest['categorical_axes'].items()}
+        self.quantities = manifest['quantities']
+        self.accuracy = manifest.get('accuracy')
+        self.values = np.load(path / 'values.npy', mmap_mode='r')
+        self.flat_values = self.values.reshape(-1, self.values.shape[-1])
+
+        # Offsets of a grid cell's corners along the numeric axes
+        self.corners = np.array(list(itertools.product((0, 1), repeat=len(self.axes))))
+
+    def query(self, characteristic_strength, curing_days, defective_rate, perc_passing_600um, ssd_relative_density,
+              slump, max_agg_size, coarse_agg_type='Crushed', fine_agg_type='Crushed') -> dict:
+        """
+        Approximates the designs at one or many points, every argument is a value or an array of them
+
+        :param characteristic_strength: Characteristic strength (N/mm2)
+        :param curing_days: Curing age (days)
+        :param defective_rate: Proportion defective (%)
+        :param perc_passing_600um: Percentage of fine aggregate passing the 600um sieve
+        :param ssd_relative_density: Relative density of the aggregate at SSD
+        :param slump: Slump category, e.g. '30-60mm'
+        :param max_agg_size: 10, 20 or 40 (mm)
+        :param coarse_agg_type: Crushed/Uncrushed
+        :param fine_agg_type: Crushed/Uncrushed
+        :return: (dict): quantity -> approximate values, nan outside the grid or next to designs that can not be made
+        :raises KeyError: For a category the atlas does not have
+        """
+        numeric = [characteristic_strength, curing_days, defective_rate, perc_passing_600um, ssd_relative_density]
+        categorical = [slump, max_agg_size, coarse_agg_type, fine_agg_type]
+
+        numeric = np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in numeric])
+        scalar = numeric[0].ndim == 0
+        numeric = [value.reshape(-1) for value in np.broadcast_arrays(*numeric)]
+        size = numeric[0].size
+
+        codes = [np.broadcast_to(category_codes(value, categories), (size,))
+                 for value, categories in zip(categorical, self.categories.values())]
+
+        # Grid cell of each point & its position within it, per numeric axis
+        lows, fractions = [], []
+        outside = np.zeros(size, dtype=bool)
+
+        for value, axis in zip(numeric, self.axes.values()):
+            low = np.clip(np.searchsorted(axis, value, side='right') - 1, 0, axis.size - 2)
+            lows.append(low)
+            fractions.append((value - axis[low]) / (axis[low + 1] - axis[low]))
+            outside |= (value < axis[0]) | (value > axis[-1]) | np.isnan(value)
+
+        # Every corner of each point's cell: [point, corner]
+        lows, fractions = np.stack(lows, axis=-1)[:, np.newaxis], np.stack(fractions, axis=-1)[:, np.newaxis]
+        weights = np.where(self.corners, fractions, 1 - fractions).prod(axis=-1)
+        corner_index = lows + self.corners
+        flat_index = np.ravel_multi_index(
+            tuple(np.moveaxis(corner_index, -1, 0)) + tuple(code[:, np.newaxis] for code in codes),
+            self.values.shape[:-1])
+
+        # Weighted sum over the corners, corners of zero weight are skipped so their nan does not spread
+        corner_values = self.flat_values[flat_index]
+        answer = np.where(weights[..., np.newaxis] > 0, weights[..., np.newaxis] * corner_values, 0).sum(axis=1)
+        answer[outside] = np.nan
+
+        return {name: answer[0, column] if scalar else answer[:, column]
+                for column, name in enumerate(self.quantities)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the OptiMix design atlas")
+    parser.add_argument('path', nargs='?', help="Folder of the atlas, assets/data/design_atlas by default")
+    parser.add_argument('--samples', type=int, default=500,
+                        help="Random points compared with the exact engine for the accuracy report")
+    args = parser.parse_args()
+
+    built = build_atlas(args.path, args.samples,
+                        progress=lambda share: print(f"\r{share:.0%} designed", end='', flush=True))
+    print(f"\nBuilt in {built['build_seconds']} s, accuracy against the exact engine:")
+    print(json.dumps(built['accuracy'], indent=2))
@@ -0,0 +1,337 @@
+"""design_records.py
+
+Typed, immutable records of a design's inputs and results.
+
+`MixDesignAnalyzer.data` keeps every input as the text typed into the GUI, and the results are spread over
+`calc_data`, `design_results` and the analyzer's status attributes. These records hold the same values parsed once:
+numbers as floats, choices as enums. They are frozen & slotted, so they are hashable (design cache keys),
+small, and cheap to pickle between processes. `from_data`/`to_data` and `from_analyzer`/`to_analyzer` convert
+to and from the dicts the GUI works with.
+"""
+from dataclasses import dataclass, replace
+from enum import Enum
+from typing import Tuple
+
+import numpy as np
+
+from core.logic.helpers.stream_helpers import input_fields, status_flags
+
+
+class DesignMode(str, Enum):
+    """Concrete mix design modes"""
+    DOE = 'DOE'
+    AEM = 'AEM'
+    PFA = 'PFA'
+    GGBS = 'GGBS'
+
+
+class CementType(str, Enum):
+    """Ordinary, sulphate-resisting & rapid-hardening Portland cement"""
+    OPC = 'OPC'
+    SRPC = 'SRPC'
+    RHPC = 'RHPC'
+
+
+class AggregateType(str, Enum):
+    CRUSHED = 'Crushed'
+    UNCRUSHED = 'Uncrushed'
+
+
+class SlumpCategory(str, Enum):
+    """Workability, as the slump ranges of table 3"""
+    VERY_LOW = '0-10mm'
+    LOW = '10-30mm'
+    MEDIUM = '30-60mm'
+    HIGH = '60-180mm'
+
+
+class BatchUnit(str, Enum):
+    CUBIC_METRE = 'm³'
+    LITRE = 'ℓ'
+
+
+# Where each input is kept in `MixDesignAnalyzer.data`: field -> (category, key)
+input_locations = {name: (category, key) for name, (category, key, _) in input_fields.items()}
+input_locations['margin'] = ('Mix Parameters', 'Margin')
+
+# Inputs stored as the GUI's option menu choices, and as its checkbutton values
+choice_fields = {'cement_type': CementType, 'slump': SlumpCategory, 'coarse_agg_type': AggregateType,
+                 'fine_agg_type': AggregateType, 'batch_unit': BatchUnit}
+checkbutton_fields = ('less_than_20_results', 'agg_10mm', 'agg_20mm', 'agg_40mm')
+
+
+def parse_number(name: str, value) -> float | None:
+    """
+    Parses a numeric entry
+
+    :param name: (str): The input's field name, for the error message
+    :param value: The entry's text
+    :return: (float): None when the entry is empty
+    """
+    if value is None or str(value).strip() == '':
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a number, got {value!r}") from None
+
+
+def format_number(value: float | None) -> str:
+    """Writes a parsed number back as entry text, '' when unspecified"""
+    if value is None:
+        return ''
+
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+@dataclass(frozen=True, slots=True)
+class DesignInput:
+    """
+    Every input of a design, parsed. Unspecified optional inputs are None; defaults are the GUI's.
+    Field names are the specification columns of `stream_helpers.input_fields`.
+    """
+    # Specified variables
+    characteristic_strength: float | None = None
+    curing_days: float | None = None
+    defective_rate: float | None = None
+    air_content: float | None = None
+    strength_loss: float | None = 5.5
+    less_than_20_results: int = 1
+    cement_type: CementType = CementType.OPC
+    specified_margin: float | None = None
+    max_fwc_ratio: float | None = None
+    slump: SlumpCategory = SlumpCategory.VERY_LOW
+    agg_10mm: int = 10
+    agg_20mm: int = 20
+    agg_40mm: int = 40
+    max_cement_content: float | None = None
+    min_cement_content: float | None = None
+    pfa_proportion: float | None = None
+    ggbs_proportion: float | None = None
+
+    # Additional info
+    specified_sd: float | None = None
+    specified_k: float | None = None
+    coarse_agg_type: AggregateType = AggregateType.CRUSHED
+    fine_agg_type: AggregateType = AggregateType.CRUSHED
+    ssd_relative_density: float | None = None
+    perc_passing_600um: float | None = None
+    fagg_absorption: float | None = None
+    cagg_absorption: float | None = None
+    fagg_reduction: float | None = 5.0
+    cementing_efficiency: float | None = 0.3
+    water_content_reduction: float | None = 5.0
+
+    # Mix parameters
+    margin: float | None = None
+    specified_concrete_density: float | None = None
+
+    # Result tuning
+    batch_volume: float | None = None
+    batch_unit: BatchUnit = BatchUnit.CUBIC_METRE
+
+    @classmethod
+    def from_data(cls, data: dict) -> 'DesignInput':
+        """
+        Parses the inputs held in an analyzer's `data`
+
+        :param data: (dict): `MixDesignAnalyzer.data`
+        :raises ValueError: If a number or choice is malformed
+        """
+        values = {}
+
+        for name, (category, key) in input_locations.items():
+            value = data[category].get(key)
+
+            if name in choice_fields:
+                try:
+                    values[name] = choice_fields[name](value)
+                except ValueError:
+                    raise ValueError(f"'{name}' must be one of {[choice.value for choice in choice_fields[name]]}, "
+                                     f"got {value!r}") from None
+
+            elif name in checkbutton_fields:
+                try:
+                    values[name] = int(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"'{name}' must be a checkbutton value, got {value!r}") from None
+
+            else:
+                values[name] = parse_number(name, value)
+
+        return cls(**values)
+
+    def to_data(self) -> dict:
+        """
+        The inputs as `MixDesignAnalyzer.data`, numbers as entry text
+        """
+        data = {}
+
+        for name, (category, key) in input_locations.items():
+            value = getattr(self, name)
+
+            if name in choice_fields:
+                value = value.value
+            elif name not in checkbutton_fields:
+                value = format_number(value)
+
+            data.setdefault(category, {})[key] = value
+
+        return data
+
+    def without_batching(self) -> 'DesignInput':
+        """The inputs that decide a design; the batch volume & unit only scale the finished design"""
+        return replace(self, batch_volume=None, batch_unit=BatchUnit.CUBIC_METRE)
+
+
+# A final quantity per cubic metre: (exact, snapped to the nearest five)
+Quantity = Tuple[float, int]
+
+# `design_results` keys of the quantities -> DesignResult fields, in the order `summarize_results` writes them
+quantity_keys = {'cement': 'cement', 'water': 'water', 'fagg': 'fine_agg', 'cagg': 'coarse_agg'}
+binder_keys = {'pfa': 'pfa', 'ggbs': 'ggbs'}
+
+# Status attributes kept as frozen (key, value) pairs, they are dicts on the analyzer
+dict_flags = ('cc_status', 'tac_content')
+
+
+def freeze(value):
+    """Makes a calc_data value hashable: numbers as Python scalars, lists & arrays as tuples"""
+    if isinstance(value, (list, tuple)) or (isinstance(value, np.ndarray) and value.ndim):
+        return tuple(freeze(item) for item in value)
+
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+
+    if isinstance(value, (float, np.floating, np.ndarray)):
+        return float(value)
+
+    return value
+
+
+def thaw(value):
+    """Restores a frozen calc_data value to the types the analyzer works with"""
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+
+    if isinstance(value, float):
+        return np.float64(value)
+
+    return value
+
+
+@dataclass(frozen=True, slots=True)
+class DesignResult:
+    """
+    The outcome of a design: its status, final quantities per cubic metre, how it was arrived at
+    (the analyzer's status attributes) and every intermediate value (`calc`, as frozen (name, value) pairs).
+    Quantities are None for designs stopped before the final stage.
+    """
+    mode: DesignMode
+    status: str
+
+    # Final quantities (kg/m3)
+    cement: Quantity | None = None
+    water: Quantity | None = None
+    fine_agg: Quantity | None = None
+    coarse_agg: Quantity | None = None
+    pfa: Quantity | None = None
+    ggbs: Quantity | None = None
+    cagg_proportioning: Tuple[Tuple[float, ...], Tuple[int, ...]] | None = None
+    cagg_sizes: str | None = None
+    odb_batching: str | None = None
+
+    # Status attributes of the analyzer
+    empty_defective_rate_and_k: bool = False
+    calculated_k: bool = False
+    innaprop_spec_sd: bool = False
+    fwc_is_larger: bool = False
+    different_agg_types: bool = False
+    invalid_cc_entry: bool = False
+    min_is_more_than_max: bool = False
+    feasibility_status: bool = True
+    cc_status: Tuple[Tuple[str, str], ...] | None = None
+    ssd_value_error: bool | None = None
+    invalid_ssd: bool = False
+    tac_content: Tuple[Tuple[str, str], ...] = ()
+    specified_conc_density: bool = False
+    perc_pass_aberration: bool = False
+    odb_status: str | None = None
+
+    # Intermediate values, `calc_data`
+    calc: Tuple[Tuple[str, object], ...] = ()
+
+    @classmethod
+    def from_analyzer(cls, analyzer, mode: str, status: str) -> 'DesignResult':
+        """
+        Records the outcome of an analyzer's design
+
+        :param analyzer: (MixDesignAnalyzer): The designed analyzer
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :param status: (str): 'ok' or why the design could not be completed
+        """
+        values = {'mode': DesignMode(mode), 'status': status,
+                  'calc': tuple((name, freeze(value)) for name, value in analyzer.calc_data.items())}
+
+        for key, name in {**quantity_keys, **binder_keys}.items():
+            if key in analyzer.design_results:
+                exact, snapped = analyzer.design_results[key]
+                values[name] = (freeze(exact), int(snapped))
+
+        if 'cagg_proportioning' in analyzer.design_results:
+            exact, snapped = analyzer.design_results['cagg_proportioning']
+            values['cagg_proportioning'] = (freeze(np.atleast_1d(exact)), freeze(np.atleast_1d(snapped)))
+            values['cagg_sizes'] = analyzer.design_results['cagg_sizes']
+            values['odb_batching'] = analyzer.design_results['odb_batching']
+
+        for flag in status_flags:
+            value = getattr(analyzer, flag)
+
+            if flag in dict_flags:
+                values[flag] = None if value is None else tuple(value.items())
+            elif flag != 'odb_status' and value is not None:
+                values[flag] = bool(value)
+            else:
+                values[flag] = value
+
+        return cls(**values)
+
+    def to_analyzer(self, analyzer) -> None:
+        """
+        Fills an analyzer in with this design, as if it had designed it; its inputs are left as they are
+
+        :param analyzer: (MixDesignAnalyzer): The analyzer holding the design's inputs
+        """
+        analyzer.calc_data = {name: thaw(value) for name, value in self.calc}
+
+        if 'max_agg_size' in analyzer.calc_data:
+            analyzer.data['Specified variables']['Max Agg Size'] = analyzer.calc_data['max_agg_size']
+
+        def quantity(pair: Quantity) -> list:
+            exact, snapped = pair
+            return [np.float64(exact) if isinstance(exact, float) else np.int64(exact), np.int64(snapped)]
+
+        analyzer.design_results = {key: quantity(getattr(self, name)) for key, name in quantity_keys.items()
+                                   if getattr(self, name) is not None}
+
+        if self.cagg_proportioning is not None:
+            analyzer.design_results['odb_batching'] = self.odb_batching
+            analyzer.design_results['cagg_sizes'] = self.cagg_sizes
+            analyzer.design_results['cagg_proportioning'] = [np.array(self.cagg_proportioning[0]),
+                                                             np.array(self.cagg_proportioning[1])]
+
+        for key, name in binder_keys.items():
+            if getattr(self, name) is not None:
+                analyzer.design_results[key] = quantity(getattr(self, name))
+
+        for flag in status_flags:
+            value = getattr(self, flag)
+            setattr(analyzer, flag, dict(value) if flag in dict_flags and value is not None else value)
+
+    def calc_value(self, name: str, default=None):
+        """An intermediate value by its `calc_data` name"""
+        return next((value for key, value in self.calc if key == name), default)
@@ -2,15 +2,238 @@
 Determines the fine aggregate proportion in the concrete mixture.
 """
 
+from functools import lru_cache
+
 import numpy as np
-import pandas as pd
 import plotly.graph_objects as go
 
-from core.logic.helpers.computation_helpers import interpolate, create_linear_points, fit_linreg
+from core.logic.curve import Curve
+from core.logic.helpers.computation_helpers import create_linear_points, fit_linreg
+from core.logic.shared_reference import attached_reference
+from core.logic.reference_pack import read_reference_curve
+from core.logic.reference_data import category_codes, slump_categories
 from core.utils.file_paths import optimix_paths
 from core.utils.themes import fig_vi_colors, white_color, graph_colors, BG, transparent, calibri
 
 
+# Maximum aggregate sizes (mm) figure 6 has lines for
+figure_vi_agg_sizes = (10, 20, 40)
+
+# Percentages passing a 600um sieve of figure 6's lines
+figure_vi_passing = (15, 40, 60, 80, 100)
+
+
+def fit_figure_vi() -> dict:
+    """
+    Fits figure 6's lines to their datapoints
+
+    - Reads plot data from the reference pack, or the CSV files (hardcoded paths) when it is out of date
+    - Organizes data into nested dictionaries
+    - Performs linear regression to calculate coefficients
+    - Creates plot lines using create_linear_points
+
+    :return: (dict): {agg_size: {slump_category: [l15, l40, l60, l80, l100]}}, each line a Curve
+    """
+    # Retrieve the paths for figure 6's datapoints
+    plot_paths = optimix_paths.fagg_prop_plot_paths
+
+    # Figure 6 Recommended proportions of fine aggregate according to percentage passing a 600um sieve
+    fig_vi_points = {
+        10: {
+            '0-10mm': [read_reference_curve(plot) for plot in plot_paths[0]],
+            '10-30mm': [read_reference_curve(plot) for plot in plot_paths[1]],
+            '30-60mm': [read_reference_curve(plot) for plot in plot_paths[2]],
+            '60-180mm': [read_reference_curve(plot) for plot in plot_paths[3]]
+        },
+        20: {
+            '0-10mm': [read_reference_curve(plot) for plot in plot_paths[4]],
+            '10-30mm': [read_reference_curve(plot) for plot in plot_paths[5]],
+            '30-60mm': [read_reference_curve(plot) for plot in plot_paths[6]],
+            '60-180mm': [read_reference_curve(plot) for plot in plot_paths[7]]
+        },
+        40: {
+            '0-10mm': [read_reference_curve(plot) for plot in plot_paths[8]],
+            '10-30mm': [read_reference_curve(plot) for plot in plot_paths[9]],
+            '30-60mm': [read_reference_curve(plot) for plot in plot_paths[10]],
+            '60-180mm': [read_reference_curve(plot) for plot in plot_paths[11]]
+        }
+    }
+
+    # free water to cement ratio range
+    fwc_range = [
+        [
+            [0.2, 0.8999998527660982],
+            [0.2, 1],
+            [0.2, 1],
+            [0.2, 1]
+        ],
+        [
+            [0.2, 0.8999998527660982],
+            [0.2, 1],
+            [0.2, 1],
+            [0.2, 1]
+        ],
+        [
+            [0.2, 0.8999998527660982],
+            [0.2, 1],
+            [0.2, 1],
+            [0.2, 1]
+        ]
+    ]
+
+    # Organize the coefficients for the 60 linear functions into a multidimensional list for clarity
+    coefficients = []
+    for agg_size_index, (category, slump_group) in enumerate(fig_vi_points.items()):
+        category_coeffs = []  # Initialize list for coefficients within this category
+
+        # Iterate through each group within the category
+        for group_index, (group_name, curves) in enumerate(slump_group.items()):
+            group_coeffs = []  # Initialize list for coefficients within this group
+
+            # Iterate through each curve in the group
+            for curve_index, curve in enumerate(curves):
+                y = curve.y  # Extract y values from the curve
+
+                # Access the correct x_range for this curve
+                fwc_range_pair = fwc_range[agg_size_index][group_index]
+
+                # Apply linear regression using the extracted x_range
+                equation_coeffs = fit_linreg(fwc_range_pair, y)
+
+                # Append the calculated coefficients to the group's list
+                group_coeffs.append(equation_coeffs)
+
+            # Append the group's coefficients to the category's list
+            category_coeffs.append(group_coeffs)
+
+        # Append the category's coefficients to the main list
+        coefficients.append(category_coeffs)
+
+    # Slump categories
+    slump_categories = ['0-10mm', '10-30mm', '30-60mm', '60-180mm']
+
+    # Aggregate sizes
+    agg_sizes = [10, 20, 40]
+
+    # Apply linear regression on the datapoints, the straight lines will be used for further calculations
+    figure_vi = {
+        agg_size: {
+            slump_cat: [
+                create_linear_points(fwc_range[agg_index][group_index], coeffs)
+                for coeffs in coeffs_group
+            ]
+            for group_index, (slump_cat, coeffs_group) in enumerate(zip(slump_categories, coeffs_group))
+        }
+        for agg_index, (agg_size, coeffs_group) in enumerate(zip(agg_sizes, coefficients))
+    }
+
+    return figure_vi
+
+
+@lru_cache(maxsize=None)
+def load_figure_vi() -> dict:
+    """
+    Figure 6's lines, fitted once per process, or taken zero-copy from the shared reference block when attached.
+    The lines are shared between portioners and must not be modified.
+
+    :return: (dict): {agg_size: {slump_category: [l15, l40, l60, l80, l100]}}, each line a Curve
+    """
+    shared = attached_reference()
+
+    if shared is None:
+        return fit_figure_vi()
+
+    return {
+        agg_size: {
+            slump_category: [Curve.from_rows(line) for line in shared.group(f'figure_vi/{agg_size}/{slump_category}')]
+            for slump_category in slump_categories
+        }
+        for agg_size in figure_vi_agg_sizes
+    }
+
+
+@lru_cache(maxsize=None)
+def figure_vi_array() -> np.ndarray:
+    """
+    Figure 6's lines as one array: [max aggregate size code, slump category code, line, x/y row, point].
+    Sizes are coded by their position in (10, 20, 40), slump categories by `reference_data.slump_categories`.
+    """
+    lines = load_figure_vi()
+
+    return np.array([[[line.to_rows() for line in lines[agg_size][slump_category]]
+                      for slump_category in slump_categories]
+                     for agg_size in figure_vi_agg_sizes])
+
+
+def figure_vi_groups(max_agg_size, slump_category) -> np.ndarray:
+    """
+    Selects the figure 6 line group of many designs at once, as `generate_appropriate_plots` does for one
+
+    :param max_agg_size: (10, 20, 40) maximum aggregate size (mm) of each design
+    :param slump_category: Slump category of each design
+    :return: (np.ndarray): [design, line, x/y row, point], lines as in `load_figure_vi`
+    """
+    return figure_vi_array()[category_codes(max_agg_size, figure_vi_agg_sizes),
+                             category_codes(slump_category, slump_categories)]
+
+
+@lru_cache(maxsize=None)
+def figure_vi_coefficients() -> np.ndarray:
+    """
+    Figure 6's lines as their coefficients: [max aggregate size code, slump category code, line, (a, b)],
+    a & b in proportion = a * fwc_ratio + b, read off each fitted line's ends
+    """
+    lines = figure_vi_array()
+    x, y = lines[..., 0, :], lines[..., 1, :]
+
+    slope = (y[..., -1] - y[..., 0]) / (x[..., -1] - x[..., 0])
+
+    return np.stack((slope, y[..., 0] - slope * x[..., 0]), axis=-1)
+
+
+def passing_lines(coefficients: np.ndarray, perc_passing) -> tuple:
+    """
+    The line of each percentage passing, its coefficients interpolated linearly across the two lines either side.
+    Below 15% the 15% line is used, above 100% the 80 & 100% lines are extrapolated.
+
+    :param coefficients: (np.ndarray): Line groups, [..., line, (a, b)] as in `figure_vi_coefficients`
+    :param perc_passing: Percentage of fine aggregate passing a 600um sieve
+    :return: (np.ndarray, np.ndarray): a & b in proportion = a * fwc_ratio + b
+    """
+    perc_passing = np.maximum(np.asarray(perc_passing, dtype=np.float64), figure_vi_passing[0])
+
+    # The two lines either side of each percentage passing, and the share of the upper one
+    passing = np.array(figure_vi_passing, dtype=np.float64)
+    lower = np.clip(np.searchsorted(passing, perc_passing, side='right') - 1, 0, passing.size - 2)
+    share = (perc_passing - passing[lower]) / (passing[lower + 1] - passing[lower])
+
+    shape = np.broadcast_shapes(lower.shape, coefficients.shape[:-2])
+    coefficients = np.broadcast_to(coefficients, shape + coefficients.shape[-2:])
+    lower = np.broadcast_to(lower, shape)[..., np.newaxis, np.newaxis]
+
+    below = np.take_along_axis(coefficients, lower, axis=-2)[..., 0, :]
+    above = np.take_along_axis(coefficients, lower + 1, axis=-2)[..., 0, :]
+    a, b = np.moveaxis(below + share[..., np.newaxis] * (above - below), -1, 0)
+
+    return a, b
+
+
+def fine_agg_proportions(max_agg_size, slump_category, perc_passing, fwc_ratio) -> np.ndarray:
+    """
+    Determines the fine aggregate proportions of many designs at once, as `determine_proportion` does for one
+
+    :param max_agg_size: (10, 20, 40) maximum aggregate size (mm) of each design
+    :param slump_category: Slump category of each design
+    :param perc_passing: Percentage of fine aggregate passing a 600um sieve, see `passing_lines`
+    :param fwc_ratio: Free-water/cement ratio
+    :return: (np.ndarray): Fine aggregate proportions (%)
+    """
+    a, b = passing_lines(figure_vi_coefficients()[category_codes(max_agg_size, figure_vi_agg_sizes),
+                                                  category_codes(slump_category, slump_categories)], perc_passing)
+
+    return a * np.asarray(fwc_ratio, dtype=np.float64) + b
+
+
 class FineAggPortioner:
     """
     Determines the right proportion of fine aggregate in a concrete mixture based on maximum aggregate size,
@@ -80,10 +303,7 @@ class FineAggPortioner:
     def generate_appropriate_plots(self):
         """Generates the appropriate plot lines based on the specified maximum aggregate size & slump category
 
-        - Reads plot data from CSV files (hardcoded paths)
-        - Organizes data into nested dictionaries
-        - Performs linear regression to calculate coefficients
-        - Creates plot lines using create_linear_points
+        - Takes figure 6's lines from `load_figure_vi`, fitted once per process
         - Selects the appropriate plot and stores it in self.recommended_plot
 
         self.recommended plot is a dictionary containing this structure:
@@ -107,183 +327,28 @@ class FineAggPortioner:
                 '60-180mm': [l15, l40, l60, l80, l100]
             }}
         """
-        # Retrieve the paths for figure 6's datapoints
-        plot_paths = optimix_paths.fagg_prop_plot_paths
-
-        # Figure 6 Recommended proportions of fine aggregate according to percentage passing a 600um sieve
-        fig_vi_points = {
-            10: {
-                '0-10mm': [pd.read_csv(plot) for plot in plot_paths[0]],
-                '10-30mm': [pd.read_csv(plot) for plot in plot_paths[1]],
-                '30-60mm': [pd.read_csv(plot) for plot in plot_paths[2]],
-                '60-180mm': [pd.read_csv(plot) for plot in plot_paths[3]]
-            },
-            20: {
-                '0-10mm': [pd.read_csv(plot) for plot in plot_paths[4]],
-                '10-30mm': [pd.read_csv(plot) for plot in plot_paths[5]],
-                '30-60mm': [pd.read_csv(plot) for plot in plot_paths[6]],
-                '60-180mm': [pd.read_csv(plot) for plot in plot_paths[7]]
-            },
-            40: {
-                '0-10mm': [pd.read_csv(plot) for plot in plot_paths[8]],
-                '10-30mm': [pd.read_csv(plot) for plot in plot_paths[9]],
-                '30-60mm': [pd.read_csv(plot) for plot in plot_paths[10]],
-                '60-180mm': [pd.read_csv(plot) for plot in plot_paths[11]]
-            }
-        }
-
-        # free water to cement ratio range
-        fwc_range = [
-            [
-                [0.2, 0.8999998527660982],
-                [0.2, 1],
-                [0.2, 1],
-                [0.2, 1]
-            ],
-            [
-                [0.2, 0.8999998527660982],
-                [0.2, 1],
-                [0.2, 1],
-                [0.2, 1]
-            ],
-            [
-                [0.2, 0.8999998527660982],
-                [0.2, 1],
-                [0.2, 1],
-                [0.2, 1]
-            ]
-        ]
-
-        # Organize the coefficients for the 60 linear functions into a multidimensional list for clarity
-        coefficients = []
-        for agg_size_index, (category, slump_group) in enumerate(fig_vi_points.items()):
-            category_coeffs = []  # Initialize list for coefficients within this category
-
-            # Iterate through each group within the category
-            for group_index, (group_name, dataframes) in enumerate(slump_group.items()):
-                group_coeffs = []  # Initialize list for coefficients within this group
-
-                # Iterate through each DataFrame in the group
-                for df_index, df in enumerate(dataframes):
-                    y = df[' y']  # Extract y values from the DataFrame
-
-                    # Access the correct x_range for this DataFrame
-                    fwc_range_pair = fwc_range[agg_size_index][group_index]
-
-                    # Apply linear regression using the extracted x_range
-                    equation_coeffs = fit_linreg(fwc_range_pair, y)
-
-                    # Append the calculated coefficients to the group's list
-                    group_coeffs.append(equation_coeffs)
-
-                # Append the group's coefficients to the category's list
-                category_coeffs.append(group_coeffs)
-
-            # Append the category's coefficients to the main list
-            coefficients.append(category_coeffs)
-
-        # Slump categories
-        slump_categories = ['0-10mm', '10-30mm', '30-60mm', '60-180mm']
-
-        # Aggregate sizes
-        agg_sizes = [10, 20, 40]
-
-        # Apply linear regression on the datapoints, the straight lines will be used for further calculations
-        figure_vi = {
-            agg_size: {
-                slump_cat: [
-                    create_linear_points(fwc_range[agg_index][group_index], coeffs)
-                    for coeffs in coeffs_group
-                ]
-                for group_index, (slump_cat, coeffs_group) in enumerate(zip(slump_categories, coeffs_group))
-            }
-            for agg_index, (agg_size, coeffs_group) in enumerate(zip(agg_sizes, coefficients))
-        }
-
         # Pick the appropriate plot
-        self.recommended_plot = figure_vi[self.max_agg][self.slump_category]
+        self.recommended_plot = load_figure_vi()[self.max_agg][self.slump_category]
 
     def determine_proportion(self):
         """
-        Calculates the fine aggregate proportion of the concrete mix using figure 6
+        Calculates the fine aggregate proportion of the concrete mix using figure 6, see `passing_lines`
         """
-        # Percentage passing line tags
-        percentage_tags = [15, 40, 60, 80, 100]
-
-        if self.perc_passing < 15:
-            line_df = self.recommended_plot[0]
-            self.new_line = line_df
-
-            # Determine the fine aggregate proportion
-            self.fine_agg_proportion = interpolate(
-                x=line_df['x'],
-                y=line_df[' y'],
-                target_var=self.fwc_ratio
-            )
+        coefficients = figure_vi_coefficients()[figure_vi_agg_sizes.index(self.max_agg),
+                                                slump_categories.index(self.slump_category)]
+        a, b = passing_lines(coefficients, self.perc_passing)
+
+        # Determine the fine aggregate proportion
+        self.fine_agg_proportion = a * self.fwc_ratio + b
+
+        if self.perc_passing in figure_vi_passing or self.perc_passing < figure_vi_passing[0]:
+            # The line of the percentage passing, or the 15% line below it
+            self.new_line = self.recommended_plot[figure_vi_passing.index(max(self.perc_passing, 15))]
 
         else:
-            # Check if the percentage passing is 15, 40, 60, 80 or 100%
-            if self.perc_passing in [15, 40, 60, 80, 100]:
-
-                # Create a dictionary to map self.perc_passing to index in self.recommended_plot
-                percent_passing_map = {
-                    15: 0,
-                    40: 1,
-                    60: 2,
-                    80: 3,
-                    100: 4
-                }
-
-                # Get the index corresponding to self.perc_passing
-                index = percent_passing_map[int(self.perc_passing)]
-
-                # Get the line_df directly using the index
-                line_df = self.recommended_plot[index]
-
-                # Determine the fine aggregate proportion
-                self.fine_agg_proportion = interpolate(
-                    x=line_df['x'],
-                    y=line_df[' y'],
-                    target_var=self.fwc_ratio
-                )
-                self.new_line = line_df
-
-            else:
-                # Define the starting and ending x points of the proposed new line
-                x_start = 0.2
-                x_end = np.max([x_point['x'].max() for x_point in self.recommended_plot])
-
-                # Extract the first and last y values from each dataframe
-                first_y_values = [df[' y'].iloc[0] for df in self.recommended_plot]
-                last_y_values = [df[' y'].iloc[-1] for df in self.recommended_plot]
-
-                # Calculate the corresponding starting y-value of the specified percentage passing with interpolation
-                y_start = interpolate(
-                    target_var=self.perc_passing,
-                    x=percentage_tags,
-                    y=first_y_values
-                )
-
-                # Calculate the corresponding ending y-value of the specified percentage passing with interpolation
-                y_end = interpolate(
-                    target_var=self.perc_passing,
-                    x=percentage_tags,
-                    y=last_y_values
-                )
-
-                # The x coordinates of the new specified percentage passing line
-                x_coords = np.linspace(x_start, x_end, 50)
-                y_coords = np.linspace(y_start, y_end, 50)
-
-                # Store the new datapoints of the new line for further referencing
-                self.new_line = pd.DataFrame({'x': x_coords, ' y': y_coords})
-
-                # Determine the fine aggregate proportion
-                self.fine_agg_proportion = interpolate(
-                    x=x_coords,
-                    y=y_coords,
-                    target_var=self.fwc_ratio
-                )
+            # The line of the specified percentage passing, across the lines' fwc range
+            x_coords = np.array([self.recommended_plot[0].x[0], self.recommended_plot[0].x[-1]])
+            self.new_line = Curve(x_coords, a * x_coords + b)
 
     def plot(self):
         """
@@ -298,8 +363,8 @@ class FineAggPortioner:
         traces = []
         for i in range(5):
             trace = go.Scatter(
-                x=self.recommended_plot[i]['x'],
-                y=self.recommended_plot[i][' y'],
+                x=self.recommended_plot[i].x,
+                y=self.recommended_plot[i].y,
                 mode='lines',
                 name=legend[i],
                 line=dict(color=fig_vi_colors[i], width=2))
@@ -312,8 +377,8 @@ class FineAggPortioner:
         # Plot the appropriate percent passing line
         fig_vi.add_trace(
             go.Scatter(
-                x=self.new_line['x'],
-                y=self.new_line[' y'],
+                x=self.new_line.x,
+                y=self.new_line.y,
                 mode='lines',
                 name=f'Defined percentage passing ({np.round(self.perc_passing, 2)}%)',
                 line=dict(color=fig_vi_colors[5], width=3)
@@ -346,7 +411,7 @@ class FineAggPortioner:
         xaxis_title = 'Free-water/cement ratio'
         yaxis_title = 'Proportion of fine aggregate (%)'
 
-        max_y_val = max(self.recommended_plot[0][' y']) + 5
+        max_y_val = max(self.recommended_plot[0].y) + 5
 
         # Edit the layout
         fig_vi.update_layout(
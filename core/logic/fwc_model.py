@@ -0,0 +1,271 @@
+"""fwc_model.py
+
+Fitted model of Figure 4, the relationship between compressive strength and free-water/cement ratio.
+
+A design's curve is the chart curve through its approximate strength at a free-water/cement ratio of 0.5: the curve
+above it, moved sideways until it passes through (0.5, approx_strength). The curve above is chosen exactly as the
+offset-curve construction chose it, by the strengths it read off each curve near 0.5 (`figure_iv_thresholds`).
+Each chart curve is fitted as its free-water/cement ratio against the log of strength, a least-squares cubic spline
+with evenly spaced knots, continued beyond the curve's ends along the chord of its last two points as `interpolate`
+extrapolates. With evenly spaced knots the piece a strength falls in is found by arithmetic, so the free-water/cement
+ratio of any target mean strength is a constant-time evaluation,
+
+    fwc = g(fm) - g(approx_strength) + 0.5, g the fitted curve above approx_strength,
+
+that works on whole columns of designs. `figure_iv_strengths` is the inverse, strength from the free-water/cement
+ratio, by Newton's method.
+
+Run `python -m core.logic.fwc_model` to compare the model with the offset-curve construction it replaces.
+"""
+from functools import lru_cache
+
+import numpy as np
+from scipy.interpolate import make_lsq_spline, PPoly
+
+from core.logic.helpers.computation_helpers import sg_filter, interpolate, offset_curve, approximate_strengths
+from core.logic.reference_data import chart_iv, table_ii
+from core.logic.shared_reference import attached_reference
+
+# Free-water/cement ratio the approximate strengths of table 2 are given at
+reference_fwc_ratio = 0.5
+
+# Number of spline pieces fitted to each curve
+figure_iv_pieces = 24
+
+
+@lru_cache(maxsize=None)
+def load_figure_iv() -> tuple:
+    """
+    Figure 4's curves smoothened, once per process. In chart order, strongest curve first.
+    The curves are shared and must not be modified.
+    """
+    return tuple(sg_filter(curve) for curve in chart_iv)
+
+
+# Arrays of the fit in the shared reference block
+figure_iv_fit_arrays = ('thresholds', 'knots', 'coefficients', 'ends')
+
+
+@lru_cache(maxsize=None)
+def fit_figure_iv() -> dict:
+    """
+    The fit of Figure 4's curves, once per process, or taken zero-copy from the shared reference block when attached.
+    The arrays are shared and must not be modified. See `fit_figure_iv_curves`
+    """
+    shared = attached_reference()
+
+    if shared is None or f'figure_iv_fit/{figure_iv_fit_arrays[0]}' not in shared.arrays:
+        return fit_figure_iv_curves()
+
+    return {name: shared[f'figure_iv_fit/{name}'] for name in figure_iv_fit_arrays}
+
+
+def fit_figure_iv_curves() -> dict:
+    """
+    Fits every Figure 4 curve, weakest curve first
+
+    :return: (dict): 'thresholds' the strengths the curves are chosen by, see `figure_iv_thresholds`,
+             'knots' the (first knot, knot spacing) of each curve's spline in the log of strength,
+             'coefficients' the cubic of each piece (highest power first, in the log of strength from its first knot),
+             'ends' the (strength, slope) of each curve's lower & upper chords, one row per curve
+    """
+    curves = load_figure_iv()[::-1]
+    knots, coefficients, ends = [], [], []
+
+    for curve in curves:
+        # The smoothened tail of the weakest curve turns back up, fit the part where strength falls
+        falling = np.diff(curve.y, prepend=np.inf) < 0
+        u, x = np.log(curve.y[falling])[::-1], curve.x[falling][::-1]
+
+        breakpoints = np.linspace(u[0], u[-1], figure_iv_pieces + 1)
+        spline = make_lsq_spline(u, x, np.r_[[u[0]] * 3, breakpoints, [u[-1]] * 3], k=3)
+
+        knots.append((u[0], breakpoints[1] - breakpoints[0]))
+        coefficients.append(PPoly.from_spline(spline).c[:, 3:-3].T)
+
+        # Strengths ascending, as `interpolate` extrapolates them
+        y, x = curve.y[::-1], curve.x[::-1]
+        ends.append((y[0], (x[1] - x[0]) / (y[1] - y[0]), y[-1], (x[-1] - x[-2]) / (y[-1] - y[-2])))
+
+    return {'thresholds': figure_iv_thresholds(), 'knots': np.array(knots), 'coefficients': np.array(coefficients),
+            'ends': np.array(ends)}
+
+
+def figure_iv_thresholds() -> np.ndarray:
+    """
+    The strength of each curve, weakest first, that approximate strengths are compared with to choose a curve
+
+    Read as the offset-curve construction read them: the line through the curve's two points nearest a
+    free-water/cement ratio of 0.5, with their strengths taken in chart order rather than paired with their
+    ratios. They differ from the curves' strengths at 0.5 by up to 0.45 N/mm2, and are kept so that designs near
+    them keep their curve.
+    """
+    thresholds = []
+
+    for curve in load_figure_iv():
+        nearest_x = curve.x[np.argsort(np.abs(curve.x - reference_fwc_ratio))[0:2]]
+        nearest_y = curve.y[np.isin(curve.x, nearest_x)]
+        thresholds.append(float(interpolate(target_var=reference_fwc_ratio, x=nearest_x, y=nearest_y)))
+
+    return np.array(thresholds[::-1])
+
+
+def figure_iv_ranks(approx_strength) -> np.ndarray:
+    """Number of curves whose threshold strength is below each approximate strength, see `figure_iv_thresholds`"""
+    return np.searchsorted(fit_figure_iv()['thresholds'], approx_strength)
+
+
+def figure_iv_curves(approx_strength) -> np.ndarray:
+    """
+    The curve above each approximate strength, the one a design's curve is moved from
+
+    :param approx_strength: Approximate compressive strengths (N/mm2) at a free-water/cement ratio of 0.5
+    :return: (np.ndarray): Positions of the curves, weakest curve 0. Above every curve the weakest curve is used,
+             as the offset-curve construction used it (chart curve 9)
+    """
+    ranks = figure_iv_ranks(approx_strength)
+    curve_count = fit_figure_iv()['thresholds'].size
+
+    return np.where(ranks >= curve_count, curve_count - 1 - 9, ranks)
+
+
+def curve_fwc_ratios(curves: np.ndarray, strength) -> np.ndarray:
+    """
+    Reads free-water/cement ratios off the fitted curves
+
+    :param curves: (np.ndarray): Position of each curve, see `figure_iv_curves`
+    :param strength: Compressive strengths (N/mm2)
+    :return: (np.ndarray): The free-water/cement ratio of each curve at its strength
+    """
+    fit = fit_figure_iv()
+    first, spacing = np.moveaxis(fit['knots'][curves], -1, 0)
+    low, low_slope, high, high_slope = np.moveaxis(fit['ends'][curves], -1, 0)
+
+    strength = np.asarray(strength, dtype=np.float64)
+    within = np.clip(strength, low, high)
+
+    # The spline piece of each strength, then its cubic by Horner's rule
+    u = np.log(within) - first
+    piece = np.clip((u / spacing).astype(np.intp), 0, figure_iv_pieces - 1)
+    u = u - piece * spacing
+    a, b, c, d = np.moveaxis(fit['coefficients'][curves, piece], -1, 0)
+    fwc_ratio = ((a * u + b) * u + c) * u + d
+
+    # Beyond the curve's ends, along its chords
+    slope = np.where(strength < low, low_slope, high_slope)
+
+    return fwc_ratio + slope * (strength - within)
+
+
+def fwc_ratios(fm, approx_strength) -> np.ndarray:
+    """
+    Determines the free-water/cement ratios of many designs at once, as `calculate_fwc_ratio` does for one
+
+    :param fm: Target mean strengths (N/mm2)
+    :param approx_strength: Approximate compressive strengths (N/mm2) at a free-water/cement ratio of 0.5
+    :return: (np.ndarray): The free-water/cement ratio required for each target mean strength
+    """
+    fm, approx_strength = np.broadcast_arrays(np.asarray(fm, dtype=np.float64),
+                                              np.asarray(approx_strength, dtype=np.float64))
+    curves = figure_iv_curves(approx_strength)
+
+    return curve_fwc_ratios(curves, fm) - curve_fwc_ratios(curves, approx_strength) + reference_fwc_ratio
+
+
+def figure_iv_strengths(fwc_ratio, approx_strength, iterations: int = 8) -> np.ndarray:
+    """
+    The compressive strengths of a design's curve at given free-water/cement ratios, the inverse of `fwc_ratios`
+
+    :param fwc_ratio: Free-water/cement ratios
+    :param approx_strength: Approximate compressive strengths (N/mm2) at a free-water/cement ratio of 0.5
+    :param iterations: (int): Newton iterations, in the log of strength
+    :return: (np.ndarray): Compressive strengths (N/mm2)
+    """
+    fwc_ratio, approx_strength = np.broadcast_arrays(np.asarray(fwc_ratio, dtype=np.float64),
+                                                     np.asarray(approx_strength, dtype=np.float64))
+    curves = figure_iv_curves(approx_strength)
+
+    # The chart curve's free-water/cement ratio to match
+    target = fwc_ratio - reference_fwc_ratio + curve_fwc_ratios(curves, approx_strength)
+
+    u = np.log(approx_strength)
+    step = 1e-6
+
+    for _ in range(iterations):
+        g = curve_fwc_ratios(curves, np.exp(u)) - target
+        slope = (curve_fwc_ratios(curves, np.exp(u + step)) - (g + target)) / step
+        u = u - g / slope
+
+    return np.exp(u)
+
+
+def offset_curve_fwc_ratio(fm: float, approx_strength: float) -> float:
+    """
+    The free-water/cement ratio as `calculate_fwc_ratio` determined it before the fitted model, step by step and
+    independent of the model: the curve above is chosen by the strengths read near 0.5, offset along its normals with
+    `offset_curve`, then inverse-interpolated. Kept to validate the model.
+    """
+    figure_iv = load_figure_iv()
+    target_x = reference_fwc_ratio
+
+    # The strength of every curve near 0.5, from its two nearest points
+    y_values = []
+    for plot in figure_iv:
+        nearest_x = plot.x[np.argsort(np.abs(plot.x - target_x))[0:2]]
+        nearest_y = plot.y[np.isin(plot.x, nearest_x)]
+        y_values.append(interpolate(target_var=target_x, x=nearest_x, y=nearest_y))
+
+    # The plot above the approximate strength
+    nearest_index = np.searchsorted(y_values[::-1], approx_strength)
+    nearest_plot = figure_iv[9] if nearest_index >= len(y_values) else figure_iv[::-1][nearest_index]
+
+    x_nearest = interpolate(target_var=approx_strength, x=nearest_plot.x, y=nearest_plot.y, find_x=True)
+    x_parallel, y_parallel = offset_curve(nearest_plot.x, nearest_plot.y, d=x_nearest - target_x)
+
+    return float(interpolate(target_var=fm, x=x_parallel, y=y_parallel, find_x=True))
+
+
+# Curing ages (days) validated, table 2's and ages between them
+validation_curing_ages = (3, 5, 7, 10, 14, 21, 28, 42, 56, 91)
+
+
+def validation_designs(target_strengths=np.arange(10, 101, 0.5)) -> tuple:
+    """
+    Target mean & approximate strengths of designs of every cement & coarse aggregate type, cured to
+    `validation_curing_ages`
+
+    :param target_strengths: Target mean strengths (N/mm2)
+    :return: (tuple): (fm, approx_strength) arrays
+    """
+    approx_strengths = np.unique([approximate_strengths(cement_type, coarse_agg_type, curing_days)
+                                  for cement_type, coarse_agg_type in table_ii
+                                  for curing_days in validation_curing_ages])
+    fm, approx_strength = np.meshgrid(target_strengths, approx_strengths)
+
+    return fm.ravel(), approx_strength.ravel()
+
+
+def validate(target_strengths=np.arange(10, 101, 0.5)) -> dict:
+    """
+    Compares the model with the offset-curve construction, see `validation_designs`
+
+    :param target_strengths: Target mean strengths (N/mm2) to compare at
+    :return: (dict): Mean, 95th percentile & maximum absolute differences in the free-water/cement ratio,
+             and the largest one's design
+    """
+    fm, approx_strength = validation_designs(target_strengths)
+
+    expected = np.array([offset_curve_fwc_ratio(*design) for design in zip(fm, approx_strength)])
+    difference = np.abs(fwc_ratios(fm, approx_strength) - expected)
+    worst = np.argmax(difference)
+
+    return {'designs': difference.size,
+            'mean': float(difference.mean()),
+            'p95': float(np.percentile(difference, 95)),
+            'max': float(difference[worst]),
+            'max at (fm, approx_strength)': (float(fm[worst]), float(approx_strength[worst]))}
+
+
+if __name__ == '__main__':
+    for name, value in validate().items():
+        print(f'{name}: {value}')
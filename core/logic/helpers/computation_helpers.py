@@ -3,12 +3,14 @@
 Helper functions for numerical calculations used across all design modes.
 """
 import numpy as np
-import pandas as pd
 from scipy.stats import norm, linregress
 from scipy.interpolate import splrep, splev, interp1d
 from scipy.signal import savgol_filter
 
-from core.logic.reference_data import table_ii, table_iii_b
+from core.logic.curve import Curve
+from core.logic.reference_data import table_ii_array, table_iii_a_array, table_iii_b_array, category_codes, \
+    slump_categories, cement_types, aggregate_types, max_agg_sizes, curing_ages, pfa_proportions
+from core.logic.shared_reference import attached_reference
 
 from typing import List, Tuple
 
@@ -37,16 +39,16 @@ def compute_risk_factor(defective_rate: float, mean: float = 40, sd: float = 5)
     return z_score
 
 
-def interpolate(x: np.ndarray | pd.DataFrame | list,
-                y: np.ndarray | pd.DataFrame | list,
+def interpolate(x: np.ndarray | list,
+                y: np.ndarray | list,
                 target_var: float,
                 find_x: bool = False,
                 kind: str = 'linear'):
     """
     Interpolate between x and y datapoints
 
-    :param x: (np.ndarray, pd.Dataframe, list) numpy, pandas dataframe or list array containing x values
-    :param y: (np.ndarray, pd.Dataframe, list) numpy, pandas dataframe or list numpy array containing y values
+    :param x: (np.ndarray, list) numpy or list array containing x values, e.g. a curve's `x`
+    :param y: (np.ndarray, list) numpy or list array containing y values, e.g. a curve's `y`
     :param target_var: (float) desired interpolation point
     :param find_x: (bool): Performs inverse interpolation for x-values instead
     :param kind: (str): Type of interpolation to be performed, types are ('linear', 'spline')
@@ -84,6 +86,78 @@ def interpolate(x: np.ndarray | pd.DataFrame | list,
             return float(f)
 
 
+def table_interpolate(xp, rows: np.ndarray, x) -> np.ndarray:
+    """
+    Linear interpolation along the last axis of table rows, one row per target, extrapolating past the ends.
+    Same arithmetic as `interpolate` (interp1d with fill_value='extrapolate'), for many targets at once.
+
+    :param xp: The table's increasing x-values, e.g. `curing_ages`
+    :param rows: (np.ndarray): [..., len(xp)] the table row of each target
+    :param x: The targets, shaped as rows.shape[:-1]
+    :return: (np.ndarray): The interpolated values, shaped as `x`
+    """
+    xp = np.asarray(xp, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+
+    # The segment each target falls in, the first or last one beyond the table's ends
+    hi = np.clip(np.searchsorted(xp, x), 1, xp.size - 1)
+    lo = hi - 1
+
+    y_lo = np.take_along_axis(rows, lo[..., np.newaxis], axis=-1)[..., 0]
+    y_hi = np.take_along_axis(rows, hi[..., np.newaxis], axis=-1)[..., 0]
+    slope = (y_hi - y_lo) / (xp[hi] - xp[lo])
+
+    return np.asarray(slope * (x - xp[lo]) + y_lo)
+
+
+def approximate_strengths(cement_type, coarse_agg_type, curing_days) -> np.ndarray:
+    """
+    Table 2 approximate compressive strengths of many designs, interpolated to their curing ages
+
+    :param cement_type: OPC/RHPC/SRPC of each design
+    :param coarse_agg_type: Crushed/Uncrushed of each design
+    :param curing_days: Desired curing age of each design
+    :return: (np.ndarray): The approximate strengths, shaped as the inputs
+    """
+    rows = table_ii_array[category_codes(cement_type, cement_types), category_codes(coarse_agg_type, aggregate_types)]
+
+    return table_interpolate(curing_ages, rows, curing_days)
+
+
+def free_water_contents(max_agg_size, coarse_agg_type, fine_agg_type, slump_category) -> np.ndarray:
+    """
+    Table 3 free-water contents of many designs, weighted 2/3 fine & 1/3 coarse when the aggregate types differ
+
+    :param max_agg_size: (0, 10, 20, 40) maximum aggregate size (mm) of each design
+    :param coarse_agg_type: Crushed/Uncrushed of each design
+    :param fine_agg_type: Crushed/Uncrushed of each design
+    :param slump_category: Slump category of each design
+    :return: (np.ndarray): The free-water contents (kg/m3), nan for sizes & types the table has no value for
+    """
+    size = category_codes(max_agg_size, max_agg_sizes)
+    slump = category_codes(slump_category, slump_categories)
+    coarse = category_codes(coarse_agg_type, aggregate_types)
+    fine = category_codes(fine_agg_type, aggregate_types)
+
+    wc = table_iii_a_array[size, coarse, slump]
+    wf = table_iii_a_array[size, fine, slump]
+
+    return np.where(coarse == fine, wc, ((2 / 3) * wf) + ((1 / 3) * wc))
+
+
+def fw_reductions(p, slump_category) -> np.ndarray:
+    """
+    Table 3b reductions in free-water content of many cement-pfa mixes, interpolated to their pfa proportions
+
+    :param p: Proportion of pfa (%) of each design
+    :param slump_category: Slump category of each design
+    :return: (np.ndarray): The reductions (kg/m3), shaped as the inputs
+    """
+    rows = table_iii_b_array.T[category_codes(slump_category, slump_categories)]
+
+    return table_interpolate(pfa_proportions, rows, p)
+
+
 def get_approximate_strength(cement_type: str, coarse_agg_type: str, curing_days: float) -> float:
     """
     Determines the approximate compressive strength from
@@ -94,14 +168,8 @@ def get_approximate_strength(cement_type: str, coarse_agg_type: str, curing_days
     :param coarse_agg_type: (str): Crushed/Uncrushed
     :param curing_days: (float):  Desired curing age.
     """
-
-    # Extract the relevant strength data from the table
-    strength_data = table_ii[(cement_type, coarse_agg_type)]
-    ages = np.array(list(strength_data.keys()))  # Curing ages
-    strengths = np.array(list(strength_data.values()))  # Strengths
-
-    # Perform linear interpolation to estimate strength for the given age
-    approximate_strength = interpolate(x=ages, y=strengths, target_var=curing_days)
+    # Linear interpolation in the table's row to estimate strength for the given age
+    approximate_strength = approximate_strengths(cement_type, coarse_agg_type, curing_days)
 
     return approximate_strength
 
@@ -119,30 +187,32 @@ def linear_function(x: np.ndarray, coeffs: list) -> np.ndarray:
     return y
 
 
-def create_linear_points(x_range: list, coeffs: list, number_of_points: int = 400) -> pd.DataFrame:
+def create_linear_points(x_range: list, coeffs: list, number_of_points: int = 400) -> Curve:
     """Makes x-y datapoints for a linear function using the defined range and coefficients
 
     :param x_range: (list): [start, end] list containing starting and ending x points
     :param coeffs: (list): [a, b]: coefficients a & b in y = ax + b
     :param number_of_points: (int): Desired number of points, default is 300. Computation optimum
 
-    :return: (pd.DataFrame): returns a dataframe containing 2 columns, 'x' and 'y'
+    :return: (Curve): the line's x & y datapoints
     """
     # Generate x-value datapoints using the specified range
     x_vals = np.linspace(x_range[0], x_range[1], num=number_of_points)
 
     # Make the plot
-    return pd.DataFrame({
-        'x': pd.Series(x_vals),
-        ' y': pd.Series(linear_function(x_vals, coeffs))
-    })
+    return Curve(x_vals, linear_function(x_vals, coeffs))
 
 
-def generate_figure_v() -> List[pd.DataFrame]:
+def generate_figure_v() -> List[Curve]:
     """
     Generates datapoints for the lines depicting the relative density at ssd in figure 5
-    :return: figure_v: Dataframe containing each line from 2.4 till 2.9
+    :return: figure_v: Curves of each line from 2.4 till 2.9
     """
+    # Worker processes attached to a shared reference block view its lines instead
+    shared = attached_reference()
+    if shared is not None:
+        return [Curve.from_rows(line) for line in shared.group('figure_v')]
+
     # X-axis range (free-water content, from 100 - 260 as seen in figure 5)
     fwc_range = [100, 260]
 
@@ -162,7 +232,7 @@ def generate_figure_v() -> List[pd.DataFrame]:
     return figure_v
 
 
-def fit_linreg(x_range: list, y: pd.Series | np.ndarray) -> list:
+def fit_linreg(x_range: list, y: np.ndarray) -> list:
     """Finds the equation of the best fitting line through linear regression.
 
     :param x_range: (list): [start, end] list containing starting and ending x points
@@ -203,22 +273,14 @@ def compute_fwc_ratio(fm: float, approx_strength: float) -> float:
     return fwc_ratio
 
 
-def sg_filter(data: pd.DataFrame) -> pd.DataFrame:
+def sg_filter(curve: Curve) -> Curve:
     """
-    Smoothens the ' y' column of a Dataframe using the Savitzky-Golay filter.
-    :param data: (pd.DataFrame): Dataframe containing 'x' and ' y' columns.
-    :return: (pd.DataFrame): Dataframe with the same 'x' column and the smoothened ' y' column
+    Smoothens the y-coordinates of a curve using the Savitzky-Golay filter.
+    :param curve: (Curve): The curve to smoothen
+    :return: (Curve): Curve with the same x-coordinates and the smoothened y-coordinates
     """
-    # I want to keep ' y' column as the same title as it is used throughout the backend
-    x = data['x']
-
-    # Apply the Savitzky-Golay filter on the y values
-    y = pd.Series(savgol_filter(data[' y'], window_length=31, polyorder=2))
-
-    # Create the new dataframe
-    df = pd.DataFrame({'x': x, ' y': y})
-
-    return df
+    # Apply the Savitzky-Golay filter on the y values, the x values are shared with the original curve
+    return Curve(curve.x, savgol_filter(curve.y, window_length=31, polyorder=2))
 
 
 def get_fw_reduction(p: float, slump_category: str) -> float:
@@ -230,13 +292,8 @@ def get_fw_reduction(p: float, slump_category: str) -> float:
     :param slump_category: The category in the slump value falls in, supplied by user
     :return: reduction (float): The required reduction in free water content.
     """
-    # Extract needed values
-    standard_pfa_values = np.array(list(table_iii_b.keys()))
-    slump_values = np.array([table_iii_b[pfa_prop][slump_category] for pfa_prop in standard_pfa_values])
-
     # Retrieve the reduction via interpolation
-    reduction = interpolate(x=standard_pfa_values, y=slump_values,
-                            target_var=p, kind='linear')
+    reduction = fw_reductions(p, slump_category)
 
     return reduction
 
@@ -262,7 +319,7 @@ def offset_curve(x: np.ndarray, y: np.ndarray, d: float) -> Tuple[np.ndarray, np
     y_parallel = y + unit_normal_vectors[:, 1] * d
 
     # Smoothen the y-coordinates of the parallel curve
-    # y_parallel = np.array(sg_filter(pd.DataFrame({'x': x_parallel, ' y': y_parallel})[' y']))
+    # y_parallel = sg_filter(Curve(x_parallel, y_parallel)).y
 
     return x_parallel, y_parallel
 
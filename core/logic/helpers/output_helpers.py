@@ -13,6 +13,7 @@ from htmldocx import HtmlToDocx
 
 import numpy as np
 import pandas as pd
+import xlsxwriter
 
 import re
 import io
@@ -187,6 +188,132 @@ def to_xlsx(path: str, sheets: [pd.DataFrame, pd.DataFrame]) -> None:
             writer.sheets["Full Mix Design Results"].set_column(col_idx, col_idx, column_width)
 
 
+# Columns of the index sheet in multi-design workbooks
+index_sheet_labels = ["Design No.", "Mode", "Characteristic Strength (N/mm²)", "Slump",
+                      "Cement (kg/m³)", "Water (kg/m³)", "Fine Aggregate (kg/m³)",
+                      "Coarse Aggregate (kg/m³)", "pfa/ggbs (kg/m³)"]
+
+# Rows in an Excel worksheet
+excel_max_rows = 1_048_576
+
+
+def excel_cell(value):
+    """
+    Converts a mix design value into something an xlsx cell can hold.
+    Numpy scalars are unwrapped, lists & arrays are written as text, as pandas does in `to_xlsx`.
+
+    :param value: The value to be written
+    """
+    if isinstance(value, np.generic) or (isinstance(value, np.ndarray) and value.ndim == 0):
+        return value.item()
+
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        return str(np.asarray(value).tolist())
+
+    elif value is None:
+        return ''
+
+    return value
+
+
+def design_index_row(design_no: int, mode: str, mix_design_results: list, accuracy_switch: int = 0) -> list:
+    """
+    Makes the index sheet row of a single design
+
+    :param design_no: (int): The position of the design in the workbook, starting from 1
+    :param mode: Mix design mode, 'DOE', 'AEM', 'PFA' or 'GGBS'.
+    :param mix_design_results: [a, b, c, d] a list of `analyzer.data`, analyzer.calc_data, analyzer.design_results,
+                               analyzer.design_batch_results
+    :param accuracy_switch: 0 or 1, degree of accuracy needed
+    :return: (list): values in the order of `index_sheet_labels`
+    """
+    data, design_results = mix_design_results[0], mix_design_results[2]
+
+    # Cement replacement content in pfa & ggbs modes
+    if mode == 'PFA':
+        replacement = design_results['pfa'][accuracy_switch]
+    elif mode == 'GGBS':
+        replacement = design_results['ggbs'][accuracy_switch]
+    else:
+        replacement = ''
+
+    row = [design_no,
+           mode,
+           float(data['Specified variables']['Characteristic Strength']),
+           data['Specified variables']['Slump'],
+           design_results['cement'][accuracy_switch],
+           design_results['water'][accuracy_switch],
+           design_results['fagg'][accuracy_switch],
+           design_results['cagg'][accuracy_switch],
+           replacement]
+
+    return [excel_cell(value) for value in row]
+
+
+def to_xlsx_workbook(path: str, designs, accuracy_switch: int = 0, detail_sheets: bool = False) -> int:
+    """Writes a stream of mix designs into one workbook; an index sheet with a row per design,
+    and optionally the full results of every design.
+
+    Rows are flushed to disk as they are written (xlsxwriter's constant memory mode), so only the
+    current design is held in memory no matter how many designs are streamed in. Constant memory mode keeps a temporary
+    file open per worksheet, so the full results go one after another on a single 'Design Details' sheet, keyed by
+    design number, continued on 'Design Details 2' and so on only when a sheet reaches Excel's row limit.
+
+    :param path: The user specified path
+    :param designs: An iterable of (mode, mix_design_results) pairs, where mix_design_results is
+                    [analyzer.data, analyzer.calc_data, analyzer.design_results, analyzer.design_batch_results]
+    :param accuracy_switch: 0 or 1, degree of accuracy needed
+    :param detail_sheets: (bool): Also write the full mix design results of every design on the details sheets
+    :return: (int): The number of designs written
+    """
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True})
+
+    # Index sheet, one row per design
+    index_sheet = workbook.add_worksheet('Mix Design Index')
+    index_sheet.set_column(0, len(index_sheet_labels) - 1, 22)
+    index_sheet.write_row(0, 0, index_sheet_labels, header_format)
+
+    detail_sheet, detail_row, detail_sheet_count = None, 0, 0
+
+    def new_detail_sheet():
+        nonlocal detail_sheet, detail_row, detail_sheet_count
+        detail_sheet_count += 1
+        detail_sheet = workbook.add_worksheet('Design Details' if detail_sheet_count == 1
+                                              else f'Design Details {detail_sheet_count}')
+        detail_sheet.set_column(0, 0, 12)
+        detail_sheet.set_column(1, 2, 60)
+        detail_sheet.write_row(0, 0, ['Design No.', 'Mix Design Parameters', 'Values'], header_format)
+        detail_row = 1
+
+    design_no = 0
+    try:
+        for design_no, (mode, mix_design_results) in enumerate(designs, start=1):
+            index_sheet.write_row(design_no, 0, design_index_row(design_no, mode, mix_design_results,
+                                                                 accuracy_switch))
+
+            if detail_sheets:
+                # Full mix design results, laid out as the 'Full Mix Design Results' sheet in `to_xlsx`
+                odb_status = mix_design_results[2]['odb_batching']
+                labels, values = generate_full_labels_and_values(mode=mode,
+                                                                 mix_design_data=mix_design_results,
+                                                                 odb_status=odb_status)
+                oven_dry_batching(odb_status, labels, values, mix_design_results)
+
+                # A design's results are kept together on one sheet
+                if detail_sheet is None or detail_row + len(labels) > excel_max_rows:
+                    new_detail_sheet()
+
+                for label, value in zip(labels, values):
+                    detail_sheet.write_row(detail_row, 0, [design_no, label, excel_cell(value)])
+                    detail_row += 1
+
+    finally:
+        workbook.close()
+
+    return design_no
+
+
 # Suppress numpy & python equality conflict warning
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
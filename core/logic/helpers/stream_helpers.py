@@ -0,0 +1,423 @@
+"""stream_helpers.py
+
+Writers and readers for streaming large numbers of mix designs to disk in columnar and line-based formats.
+"""
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import io
+import sys
+import json
+import math
+from typing import Iterator, List
+
+# Design inputs stored in `analyzer.data`: column name -> (category, key, arrow type)
+input_fields = {
+    'characteristic_strength': ('Specified variables', 'Characteristic Strength', pa.float64()),
+    'curing_days': ('Specified variables', 'Curing Days', pa.float64()),
+    'defective_rate': ('Specified variables', 'Defective Rate', pa.float64()),
+    'air_content': ('Specified variables', 'Air Content', pa.float64()),
+    'strength_loss': ('Specified variables', 'Strength Loss', pa.float64()),
+    'less_than_20_results': ('Specified variables', 'Less Than 20 Results', pa.int8()),
+    'cement_type': ('Specified variables', 'Cement Type', pa.string()),
+    'specified_margin': ('Specified variables', 'Specified Margin', pa.float64()),
+    'max_fwc_ratio': ('Specified variables', 'Maximum free water-cement ratio', pa.float64()),
+    'slump': ('Specified variables', 'Slump', pa.string()),
+    'agg_10mm': ('Specified variables', '10mm', pa.int8()),
+    'agg_20mm': ('Specified variables', '20mm', pa.int8()),
+    'agg_40mm': ('Specified variables', '40mm', pa.int8()),
+    'max_cement_content': ('Specified variables', 'Maximum cement content', pa.float64()),
+    'min_cement_content': ('Specified variables', 'Minimum cement content', pa.float64()),
+    'pfa_proportion': ('Specified variables', 'pfa Proportion', pa.float64()),
+    'ggbs_proportion': ('Specified variables', 'ggbs Proportion', pa.float64()),
+    'specified_sd': ('Additional info', 'Standard Deviation', pa.float64()),
+    'specified_k': ('Additional info', 'Specified k', pa.float64()),
+    'coarse_agg_type': ('Additional info', 'Coarse Aggregate Type', pa.string()),
+    'fine_agg_type': ('Additional info', 'Fine Aggregate Type', pa.string()),
+    'ssd_relative_density': ('Additional info', 'Relative density of agg', pa.float64()),
+    'perc_passing_600um': ('Additional info', 'Percentage passing 600um sieve', pa.float64()),
+    'fagg_absorption': ('Additional info', 'Absorption of Fine Aggregate', pa.float64()),
+    'cagg_absorption': ('Additional info', 'Absorption of Coarse Aggregate', pa.float64()),
+    'fagg_reduction': ('Additional info', 'Fine Aggregate Reduction', pa.float64()),
+    'cementing_efficiency': ('Additional info', 'Cementing Efficiency Factor', pa.float64()),
+    'water_content_reduction': ('Additional info', 'Water Content Reduction', pa.float64()),
+    'specified_concrete_density': ('Mix Parameters', 'Concrete density', pa.float64()),
+    'batch_volume': ('Result Tuning', 'Batch volume', pa.float64()),
+    'batch_unit': ('Result Tuning', 'Unit', pa.string()),
+}
+
+# Intermediates stored in `analyzer.calc_data`, all numeric unless listed in `calc_text_fields`
+calc_fields = ['perc_def', 'k', 'sd', 'init_sd', 'margin', 'initial_fm', 'fm', 'approx_strength',
+               'initial_fwc_ratio', 'fwc_ratio', 'max_agg_size', 'initial_fw_content', 'fw_reduction', 'wf', 'wc',
+               'fw_content', 'calc_cement_content', 'init_C', 'init_F', 'init_G', 'cement_content',
+               'calc_wcf_ratio', 'calc_wcg_ratio', 'modified_fwc_ratio', 'final_cementitious_content', 'C', 'F', 'G',
+               'ssd_value', 'density_from_plot', 'calc_wet_conc_density', 'wet_conc_density', 'total_agg_content',
+               'perc_passing', 'fine_agg_prop', 'calc_fine_agg_content', 'calc_coarse_agg_content',
+               'fine_agg_content', 'coarse_agg_content', 'odb_fine', 'odb_coarse', 'added_h20_mass',
+               'new_fw_content', 'proportioned_10mm', 'proportioned_20mm', 'proportioned_40mm']
+calc_text_fields = ['modified_slump_value', 'str_agg_sizes']
+
+# Final quantities stored in `analyzer.design_results` & `analyzer.design_batch_results`, as [exact, snapped] pairs
+quantity_fields = ['cement', 'pfa', 'ggbs', 'water', 'fagg', 'cagg']
+
+# Status attributes of `MixDesignAnalyzer` describing how a design was arrived at, or why it failed
+status_flags = ['empty_defective_rate_and_k', 'calculated_k', 'innaprop_spec_sd', 'fwc_is_larger',
+                'different_agg_types', 'invalid_cc_entry', 'min_is_more_than_max', 'feasibility_status', 'cc_status',
+                'ssd_value_error', 'invalid_ssd', 'tac_content', 'specified_conc_density', 'perc_pass_aberration',
+                'odb_status']
+
+design_record_schema = pa.schema(
+    [pa.field('mode', pa.string()),
+     pa.field('row_number', pa.int64()),
+     pa.field('design_status', pa.string())]
+    + [pa.field(name, arrow_type) for name, (_, _, arrow_type) in input_fields.items()]
+    + [pa.field(name, pa.float64()) for name in calc_fields]
+    + [pa.field(name, pa.string()) for name in calc_text_fields]
+    + [pa.field(f'{name}{suffix}', pa.float64())
+       for name in quantity_fields for suffix in ['', '_snapped', '_batch', '_batch_snapped']]
+    + [pa.field('odb_batching', pa.string()),
+       pa.field('cagg_sizes', pa.string()),
+       pa.field('cagg_proportioning', pa.list_(pa.float64())),
+       pa.field('cagg_proportioning_batch', pa.list_(pa.float64()))]
+)
+
+
+def parse_input(value, arrow_type: pa.DataType):
+    """
+    Converts a raw `analyzer.data` entry (mostly strings from the GUI entries) into its column type
+
+    :param value: The stored value
+    :param arrow_type: The arrow type of its column
+    :return: The parsed value, None if empty or not parseable
+    """
+    if pa.types.is_string(arrow_type):
+        return None if value is None else str(value)
+
+    if value is None or (isinstance(value, str) and value.strip() == ''):
+        return None
+
+    try:
+        return int(value) if pa.types.is_integer(arrow_type) else float(value)
+
+    except ValueError:
+        return None
+
+
+def scalar(value):
+    """
+    Unwraps numpy scalars and 0-d arrays (as returned by `interpolate`) into python floats
+
+    :param value: The value to be unwrapped
+    """
+    if value is None or (isinstance(value, str) and value.strip() == ''):
+        return None
+
+    return float(np.asarray(value, dtype=float))
+
+
+def flatten_design(mode: str, mix_design_results: list) -> dict:
+    """
+    Flattens a single design into a row of `design_record_schema`
+
+    :param mode: Mix design mode, 'DOE', 'AEM', 'PFA' or 'GGBS'.
+    :param mix_design_results: [a, b, c, d] a list of `analyzer.data`, analyzer.calc_data, analyzer.design_results,
+                               analyzer.design_batch_results
+    :return: (dict): column name -> value
+    """
+    data, calc_data, design_results, design_batch_results = mix_design_results
+    design_batch_results = design_batch_results or {}
+
+    row = {'mode': mode}
+
+    for name, (category, key, arrow_type) in input_fields.items():
+        row[name] = parse_input(data[category].get(key), arrow_type)
+
+    for name in calc_fields:
+        row[name] = scalar(calc_data.get(name))
+
+    for name in calc_text_fields:
+        row[name] = calc_data.get(name)
+
+    for name in quantity_fields:
+        exact, snapped = design_results.get(name, [None, None])
+        batch_exact, batch_snapped = design_batch_results.get(name, [None, None])
+        row[name] = scalar(exact)
+        row[f'{name}_snapped'] = scalar(snapped)
+        row[f'{name}_batch'] = scalar(batch_exact)
+        row[f'{name}_batch_snapped'] = scalar(batch_snapped)
+
+    row['odb_batching'] = design_results.get('odb_batching')
+    row['cagg_sizes'] = design_results.get('cagg_sizes')
+    row['cagg_proportioning'] = np.atleast_1d(design_results['cagg_proportioning'][0]).tolist() \
+        if 'cagg_proportioning' in design_results else None
+    row['cagg_proportioning_batch'] = np.atleast_1d(design_batch_results['cagg_proportioning'][0]).tolist() \
+        if 'cagg_proportioning' in design_batch_results else None
+
+    return row
+
+
+class DesignParquetWriter:
+    """
+    Appends designs to a Parquet file in row groups, so that only one row group is ever held in memory.
+
+    Usage:
+        with DesignParquetWriter(path) as writer:
+            for mode, mix_design_results in designs:
+                writer.write(mode, mix_design_results)
+    """
+
+    def __init__(self, path, row_group_size: int = 10_000, compression: str = 'zstd'):
+        """
+        :param path: Location of the Parquet file
+        :param row_group_size: (int): Number of designs buffered before a row group is flushed
+        :param compression: Parquet compression codec
+        """
+        self.path = path
+        self.row_group_size = row_group_size
+        self.writer = pq.ParquetWriter(path, design_record_schema, compression=compression)
+        self.columns = {name: [] for name in design_record_schema.names}
+        self.buffered = 0
+        self.rows_written = 0
+
+    def write(self, mode: str, mix_design_results: list, **extra) -> None:
+        """
+        Buffers a single design, flushing a row group when the buffer is full
+
+        :param mode: Mix design mode, 'DOE', 'AEM', 'PFA' or 'GGBS'.
+        :param mix_design_results: [analyzer.data, analyzer.calc_data, analyzer.design_results,
+                                    analyzer.design_batch_results]
+        :param extra: Values of the columns not taken from the design, i.e. `row_number` and `design_status`
+        """
+        row = flatten_design(mode, mix_design_results)
+        row.update(extra)
+
+        self.write_row(row)
+
+    def write_row(self, row: dict) -> None:
+        """
+        Buffers an already flattened design row
+
+        :param row: (dict): A row of `design_record_schema`
+        """
+        for name, column in self.columns.items():
+            column.append(row.get(name))
+        self.buffered += 1
+
+        if self.buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered designs as a row group
+        """
+        if not self.buffered:
+            return
+
+        self.writer.write_batch(pa.RecordBatch.from_pydict(self.columns, schema=design_record_schema))
+        self.rows_written += self.buffered
+
+        self.columns = {name: [] for name in design_record_schema.names}
+        self.buffered = 0
+
+    def close(self) -> None:
+        """
+        Flushes the remaining designs and writes the Parquet footer
+        """
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def concat_design_records(part_paths: List, path, compression: str = 'zstd') -> int:
+    """
+    Joins design record files into a single file, copying them row group by row group
+    so that the joined file has the same row groups as its parts and only one is ever held in memory.
+
+    :param part_paths: (list): Locations of the Parquet files to be joined, in order
+    :param path: Location of the joined Parquet file
+    :param compression: Parquet compression codec
+    :return: (int): Number of designs in the joined file
+    """
+    rows = 0
+
+    with pq.ParquetWriter(path, design_record_schema, compression=compression) as writer:
+        for part_path in part_paths:
+            part = pq.ParquetFile(part_path, memory_map=True)
+
+            for i in range(part.num_row_groups):
+                row_group = part.read_row_group(i)
+                writer.write_table(row_group, row_group_size=max(row_group.num_rows, 1))
+                rows += row_group.num_rows
+
+    return rows
+
+
+def read_design_records(path, columns: List[str] = None) -> pa.Table:
+    """
+    Reads a design record Parquet file through a memory map, only the requested columns are decoded.
+
+    :param path: Location of the Parquet file
+    :param columns: (list): Columns to be read, all columns by default
+    :return: (pa.Table): The design records
+    """
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+
+def scan_design_records(path, columns: List[str] = None, batch_size: int = 65_536) -> Iterator[pa.RecordBatch]:
+    """
+    Iterates over a memory-mapped design record file in record batches, for scans too large to hold at once.
+
+    :param path: Location of the Parquet file
+    :param columns: (list): Columns to be read, all columns by default
+    :param batch_size: (int): Maximum number of designs per batch
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+
+    yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+
+
+def design_status(analyzer) -> dict:
+    """
+    Collects the status flags of a finished (or failed) design from its analyzer
+
+    :param analyzer: (MixDesignAnalyzer): The analyzer used for the design
+    :return: (dict): flag name -> value
+    """
+    return {flag: getattr(analyzer, flag, None) for flag in status_flags}
+
+
+def to_json(value):
+    """
+    `json.dumps` fallback for the numpy values found in the engine's dictionaries
+
+    :param value: A value json cannot serialize by itself
+    """
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def finite_json(value):
+    """
+    Replaces nan & infinite numbers, which are not JSON, with None (null) throughout a record
+
+    :param value: The record, or any value in it
+    """
+    if isinstance(value, dict):
+        return {key: finite_json(item) for key, item in value.items()}
+
+    if isinstance(value, (np.generic, np.ndarray)):
+        value = value.tolist()
+
+    if isinstance(value, (list, tuple)):
+        return [finite_json(item) for item in value]
+
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+
+    return value
+
+
+class JsonlSink:
+    """
+    Streams designs as JSON Lines, one object per design, as soon as each design is finished.
+
+    By default every line is written & flushed straight away. Raising `max_buffer_lines` holds lines back, up to that
+    many or `max_buffer_bytes` of them, for fewer writes; memory use stays constant however many designs pass through.
+    nan & infinite values are written as null, so every line is valid JSON.
+
+    Each line contains:
+        {"mode": ..., "inputs": analyzer.data, "design_results": ..., "design_batch_results": ..., "status": ...}
+    """
+
+    def __init__(self, path=None, max_buffer_bytes: int = 1 << 16, append: bool = False, max_buffer_lines: int = 1):
+        """
+        :param path: Location of the .jsonl file; None or '-' streams to stdout instead
+        :param max_buffer_bytes: (int): Size of serialized lines held before they are flushed
+        :param max_buffer_lines: (int): Number of lines held before they are flushed, 1 writes each line at once
+        :param append: (bool): Add to an existing file instead of starting a new one
+        """
+        if path is None or str(path) == '-':
+            self.file = sys.stdout
+            self.owns_file = False
+        else:
+            self.file = open(path, 'a' if append else 'w', encoding='utf-8', newline='\n')
+            self.owns_file = True
+
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_buffer_lines = max_buffer_lines
+        self.buffered_lines = 0
+        self.buffer = io.StringIO()
+        self.lines_written = 0
+
+    def write(self, mode: str, mix_design_results: list, status: dict = None, **extra) -> None:
+        """
+        Serializes a single design into the buffer
+
+        :param mode: Mix design mode, 'DOE', 'AEM', 'PFA' or 'GGBS'.
+        :param mix_design_results: [analyzer.data, analyzer.calc_data, analyzer.design_results,
+                                    analyzer.design_batch_results]
+        :param status: (dict): Status flags of the design, see `design_status`
+        :param extra: Any other fields to be included in the line, e.g. the row number of a batch run
+        """
+        record = {'mode': mode,
+                  **extra,
+                  'inputs': mix_design_results[0],
+                  'design_results': mix_design_results[2],
+                  'design_batch_results': mix_design_results[3],
+                  'status': status or {}}
+
+        self.write_record(record)
+
+    def write_record(self, record: dict) -> None:
+        """
+        Serializes an already assembled record into the buffer
+
+        :param record: (dict): The JSON object to be written as a line
+        """
+        try:
+            line = json.dumps(record, default=to_json, separators=(',', ':'), allow_nan=False)
+        except ValueError:
+            # nan is not JSON, e.g. the inputs of a failed design
+            line = json.dumps(finite_json(record), default=to_json, separators=(',', ':'), allow_nan=False)
+
+        self.buffer.write(line)
+        self.buffer.write('\n')
+        self.lines_written += 1
+        self.buffered_lines += 1
+
+        if self.buffered_lines >= self.max_buffer_lines or self.buffer.tell() >= self.max_buffer_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered lines out and flushes the underlying file
+        """
+        if self.buffer.tell():
+            self.file.write(self.buffer.getvalue())
+            self.buffer = io.StringIO()
+            self.buffered_lines = 0
+
+        self.file.flush()
+
+    def close(self) -> None:
+        """
+        Flushes the remaining lines and closes the file
+        """
+        self.flush()
+
+        if self.owns_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
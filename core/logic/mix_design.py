@@ -4,14 +4,18 @@ mix_design.py
 This module contains the MixDesignAnalyzer class for performing mix design calculations and analysis.
 """
 import numpy as np
-import pandas as pd
 import plotly.graph_objects as go
 import plotly.figure_factory as ff
 
+from core.logic.cement_limits import ContentSplit, LimitStatus, limit_rules, cement_limits, limit_report, \
+    parse_limit_entries
+from core.logic.curve import Curve
 from core.logic.helpers.computation_helpers import *
 from core.logic.helpers.output_helpers import plotly_image_converter
 from core.logic.reference_data import *
 from core.logic.fine_agg_portioner import FineAggPortioner
+from core.logic.fwc_model import load_figure_iv, reference_fwc_ratio, figure_iv_curves, figure_iv_ranks, \
+    curve_fwc_ratios, fwc_ratios
 from core.utils.themes import *
 from core.utils.file_paths import optimix_paths
 
@@ -39,6 +43,8 @@ class MixDesignAnalyzer:
         - check_max_agg(): Retrieves the maximum aggregate size
         - calculate_fw_content(mode): Determines the free-water content
         - calculate_cement_content(mode): Determines the cement content
+        - cement_limit_inputs(mode): Collects the inputs of the cement content limits
+        - apply_cement_limits(mode, limits, row=0): Stores the cement contents held to their limits
         - ssd_check(): Checks for the relative density of aggregate at SSD condition
         - compute_wet_conc_density(mode): Calculates the wet concrete density of the mix.
         - plot_figure_v(mode): Plots the visualization showing how the concrete density is determined
@@ -51,6 +57,9 @@ class MixDesignAnalyzer:
         - proportion_coarse_agg(): Proportions the coarse aggregates to specified sizes
         - summarize_results(mode): Saves the summary of the design results into a list
         - batch_to_desired_volume(mode, mix_design_data): Adjust the batching volume for trial mixes
+        - run_headless(mode): Performs every design stage in order, without the GUI or plots
+        - headless_mix_parameters(mode): Stages one & two of run_headless
+        - headless_aggregates(mode): Stages four & five of run_headless
     """
 
     def __init__(self):
@@ -360,21 +369,21 @@ class MixDesignAnalyzer:
 
             # Determine sd from figure 3 if less there are less than 20 samples
             if self.data['Specified variables']['Less Than 20 Results'] == 1:
-                sd = interpolate(x=figure_iii['Less than 20']['Characteristic Strength'],
-                                 y=figure_iii['Less than 20']['Standard Deviation'],
+                sd = interpolate(x=figure_iii['Less than 20'].x,
+                                 y=figure_iii['Less than 20'].y,
                                  target_var=x_strength)
 
             else:
-                sd = interpolate(x=figure_iii['More than 20']['Characteristic Strength'],
-                                 y=figure_iii['More than 20']['Standard Deviation'],
+                sd = interpolate(x=figure_iii['More than 20'].x,
+                                 y=figure_iii['More than 20'].y,
                                  target_var=x_strength)
 
             # Store the calculated standard deviation
             self.calc_data['sd'] = sd
 
         else:
-            obtained_sd = interpolate(x=figure_iii['More than 20']['Characteristic Strength'],
-                                      y=figure_iii['More than 20']['Standard Deviation'],
+            obtained_sd = interpolate(x=figure_iii['More than 20'].x,
+                                      y=figure_iii['More than 20'].y,
                                       target_var=x_strength)
 
             specified_sd = float(self.data['Additional info']['Standard Deviation'])
@@ -417,15 +426,15 @@ class MixDesignAnalyzer:
         name_b = 'Minimum <i>s</i> for 20 or<br> more results'
 
         # Make the line depicting relationship between sd and strength for less than 20 results
-        fig_iii.add_trace(go.Scatter(x=figure_iii['Less than 20']['Characteristic Strength'],
-                                     y=figure_iii['Less than 20']['Standard Deviation'],
+        fig_iii.add_trace(go.Scatter(x=figure_iii['Less than 20'].x,
+                                     y=figure_iii['Less than 20'].y,
                                      mode='lines',
                                      name=name_a,
                                      line=dict(color=graph_colors[10], width=4)))
 
         # Make the line depicting relationship between sd and strength for more than 20 results
-        fig_iii.add_trace(go.Scatter(x=figure_iii['More than 20']['Characteristic Strength'],
-                                     y=figure_iii['More than 20']['Standard Deviation'],
+        fig_iii.add_trace(go.Scatter(x=figure_iii['More than 20'].x,
+                                     y=figure_iii['More than 20'].y,
                                      mode='lines',
                                      name=name_b,
                                      line=dict(color=graph_colors[9], width=4)))
@@ -581,75 +590,29 @@ class MixDesignAnalyzer:
 
         :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
         """
-        # Smoothen the plot data
-        figure_iv = [sg_filter(curve) for curve in chart_iv]
-
-        if mode == 'DOE' or mode == 'AEM':
-
-            # Starting line using data from table 2
-            target_x = 0.5
-
-            # y-values for target_x (y-intercept) for every plot line
-            y_values = []
-
-            # loop through the plots in figure 4, append the interception point of target_x to y_values
-            for plot in figure_iv:
-                # find the nearest x values
-                nearest_x = plot['x'].values[np.argsort(np.abs(plot['x'].values - target_x))[0:2]]
-
-                # get the corresponding y-values
-                nearest_y = plot.loc[plot['x'].isin(nearest_x), ' y'].values
-
-                # interpolate the y-value for target x
-                interpolated_y = interpolate(target_var=target_x,
-                                             x=nearest_x,
-                                             y=nearest_y)
-
-                # append the interpolated y values to the results tray
-                y_values.append(interpolated_y)
-
-            # Re-arrange and find the plot above the mean compressive strength
-            nearest_index = np.searchsorted(y_values[::-1], self.calc_data['approx_strength'])
-
-            if nearest_index >= len(y_values[::-1]):
-                nearest_plot = figure_iv[9]
-
-            else:
-                nearest_plot = figure_iv[::-1][nearest_index]
-
-            if nearest_index == 0:
-                index_below = 0
-            else:
-                index_below = nearest_index - 1
-
-            # Determine the distance between the nearest curve and the potential new curve
-            y_nearest = self.calc_data['approx_strength']
-            x_nearest = interpolate(target_var=y_nearest,
-                                    x=nearest_plot['x'],
-                                    y=nearest_plot[' y'],
-                                    find_x=True)
-
-            distance = x_nearest - target_x
-
-            # Determine the x and y values of the new curve
-            x_parallel, y_parallel = offset_curve(nearest_plot['x'], nearest_plot[' y'], d=distance)
+        if mode == 'DOE' or mode == 'AEM' or mode == 'PFA' or mode == 'GGBS':
+            approx_strength = self.calc_data['approx_strength']
 
-            # Determine the free-water to cement ratio
-            fwc_ratio = interpolate(target_var=self.calc_data['fm'],
-                                    x=x_parallel,
-                                    y=y_parallel,
-                                    find_x=True)
+            # Determine the free-water to cement ratio from the fitted curve through approx_strength, see fwc_model
+            fwc_ratio = fwc_ratios(fm=self.calc_data['fm'], approx_strength=approx_strength)[()]
 
             # Keep backup of the free water to cement ratio to show in reporting
             self.calc_data['initial_fwc_ratio'] = fwc_ratio
 
+            # The plot above approx_strength, moved until it passes through (0.5, approx_strength), is the new curve
+            figure_iv = load_figure_iv()[::-1]
+            nearest_index = int(figure_iv_curves(approx_strength))
+            nearest_plot = figure_iv[nearest_index]
+            distance = curve_fwc_ratios(nearest_index, approx_strength) - reference_fwc_ratio
+
             # Save plot points for graphical reports
             self.graph_temp['figure iv plot'] = {
                 'plot above': nearest_plot,
-                'new curve': pd.DataFrame({'x': x_parallel, ' y': y_parallel}),
-                'plot below': figure_iv[::-1][index_below]
+                'new curve': Curve(nearest_plot.x - distance, nearest_plot.y),
+                'plot below': figure_iv[max(int(figure_iv_ranks(approx_strength)) - 1, 0)]
             }
 
+        if mode == 'DOE' or mode == 'AEM':
             # Retrieve the specified free water to cement ratio
             spec_fwc_ratio = self.data['Specified variables']['Maximum free water-cement ratio']
 
@@ -669,72 +632,7 @@ class MixDesignAnalyzer:
                 self.calc_data['fwc_ratio'] = fwc_ratio
                 self.fwc_is_larger = False
 
-        elif mode == 'PFA' or 'GGBS':
-            # Starting line using data from table 2
-            target_x = 0.5
-
-            # y-values for target_x (y-intercept) for every plot line
-            y_values = []
-
-            # loop through the plots in figure 4, append the interception point of target_x to y_values
-            for plot in figure_iv:
-                # find the nearest x values
-                nearest_x = plot['x'].values[np.argsort(np.abs(plot['x'].values - target_x))[0:2]]
-
-                # get the corresponding y-values
-                nearest_y = plot.loc[plot['x'].isin(nearest_x), ' y'].values
-
-                # interpolate the y-value for target x
-                interpolated_y = interpolate(target_var=target_x,
-                                             x=nearest_x,
-                                             y=nearest_y)
-
-                # append the interpolated y values to the results tray
-                y_values.append(interpolated_y)
-
-            # Re-arrange and find the plot above the mean compressive strength
-            nearest_index = np.searchsorted(y_values[::-1], self.calc_data['approx_strength'])
-
-            if nearest_index >= len(y_values[::-1]):
-                nearest_plot = figure_iv[9]
-
-            else:
-                nearest_plot = figure_iv[::-1][nearest_index]
-
-            if nearest_index == 0:
-                index_below = 0
-            else:
-                index_below = nearest_index - 1
-
-            # Determine the distance between the nearest curve and the potential new curve
-            y_nearest = self.calc_data['approx_strength']
-            x_nearest = interpolate(target_var=y_nearest,
-                                    x=nearest_plot['x'],
-                                    y=nearest_plot[' y'],
-                                    find_x=True)
-
-            distance = x_nearest - target_x
-
-            # Determine the x and y values of the new curve
-            x_parallel, y_parallel = offset_curve(nearest_plot['x'], nearest_plot[' y'], d=distance)
-
-            # Determine the free-water to cement ratio
-            fwc_ratio = interpolate(target_var=self.calc_data['fm'],
-                                    x=x_parallel,
-                                    y=y_parallel,
-                                    find_x=True)
-
-            # Keep backup of the free water to cement ratio to show in reporting
-            self.calc_data['initial_fwc_ratio'] = fwc_ratio
-
-            # Save plot points for graphical reports
-            self.graph_temp['figure iv plot'] = {
-                'plot above': nearest_plot,
-                'new curve': pd.DataFrame({'x': x_parallel, ' y': y_parallel}),
-                'plot below': figure_iv[::-1][index_below]
-            }
-
-            # Limit comparison is performed at stage 3
+        # PFA & GGBS: limit comparison is performed at stage 3
 
     def plot_fwc_determination(self):
         """
@@ -744,21 +642,21 @@ class MixDesignAnalyzer:
         fig_iv = go.Figure()
 
         # Make printed line above
-        fig_iv.add_trace(go.Scatter(x=self.graph_temp['figure iv plot']['plot above']['x'],
-                                    y=self.graph_temp['figure iv plot']['plot above'][' y'],
+        fig_iv.add_trace(go.Scatter(x=self.graph_temp['figure iv plot']['plot above'].x,
+                                    y=self.graph_temp['figure iv plot']['plot above'].y,
                                     mode='lines',
                                     line=dict(color=graph_colors[10], width=3.6)))
 
         # Make the new curve
-        fig_iv.add_trace(go.Scatter(x=self.graph_temp['figure iv plot']['new curve']['x'],
-                                    y=self.graph_temp['figure iv plot']['new curve'][' y'],
+        fig_iv.add_trace(go.Scatter(x=self.graph_temp['figure iv plot']['new curve'].x,
+                                    y=self.graph_temp['figure iv plot']['new curve'].y,
                                     mode='lines',
                                     name='Parallel curve',
                                     line=dict(color=white_color, width=2)))
 
         # Make the plot below
-        fig_iv.add_trace(go.Scatter(x=self.graph_temp['figure iv plot']['plot below']['x'],
-                                    y=self.graph_temp['figure iv plot']['plot below'][' y'],
+        fig_iv.add_trace(go.Scatter(x=self.graph_temp['figure iv plot']['plot below'].x,
+                                    y=self.graph_temp['figure iv plot']['plot below'].y,
                                     mode='lines',
                                     line=dict(color=graph_colors[8], width=3.6)))
 
@@ -1021,573 +919,116 @@ class MixDesignAnalyzer:
 
     def calculate_cement_content(self, mode: str):
         """
-        Determines the cement content by dividing the `fw_content` with the `fwc_ratio`
+        Determines the cement content by dividing the `fw_content` with the `fwc_ratio`,
+        then holds it to the specified limits. The rules of each mode are in `cement_limits`
         :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
         """
-        if mode == 'DOE' or mode == 'AEM':
-            # Calculate and store the cement content
-            fw_content = float(self.calc_data['fw_content'])
-            fwc_ratio = float(self.calc_data['fwc_ratio'])
-
-            self.calc_data['calc_cement_content'] = fw_content / fwc_ratio
-
-            # Adjust cement content based on limits
-            max_content = self.data['Specified variables']['Maximum cement content']
-            min_content = self.data['Specified variables']['Minimum cement content']
-            cement_content = self.calc_data['calc_cement_content']
-
-            # Preliminary check for valid inputs
-            confirmation_list = []
-            for entry in [max_content.strip(), min_content.strip()]:
-                if entry.isnumeric() or entry.replace('.', '', 1).isnumeric() or entry == '':
-                    validity = True
-                    confirmation_list.append(validity)
-
-                else:
-                    validity = False
-                    confirmation_list.append(validity)
-
-            if all(confirmation_list):
-                self.invalid_cc_entry = False
-
-            else:
-                self.invalid_cc_entry = True
-
-            if not self.invalid_cc_entry:
-                if min_content and max_content:
-                    # Both min and max values are specified
-                    min_value = float(min_content)
-                    max_value = float(max_content)
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Specified",
-                        "min_content": "Specified"
-                    }
-
-                    if min_value > max_value:
-                        # This brings a warning message when the program is running...
-                        self.min_is_more_than_max = True
-
-                    if min_value <= cement_content <= max_value:
-                        self.calc_data['cement_content'] = cement_content
-
-                        # Update status
-                        self.cc_status["cement_content"] = 'Within Range'
-
-                        # Modify the free water to cement ratio
-                        self.calc_data['modified_fwc_ratio'] = self.calc_data['fw_content'] / cement_content
-
-                    elif cement_content < min_value:
-                        self.calc_data['cement_content'] = min_value
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Below Minimum"
-
-                        # Modify the free water to cement ratio
-                        self.calc_data['modified_fwc_ratio'] = self.calc_data['fw_content'] / self.calc_data[
-                            'cement_content']
-
-                    else:
-                        # Given specifications cannot be met bc cement content is more than maximum
-                        self.feasibility_status = False
-
-                elif min_content:
-                    # Only min value is specified
-                    min_value = float(min_content)
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Unspecified",
-                        "min_content": "Specified"
-                    }
-
-                    if cement_content < min_value:
-                        self.calc_data['cement_content'] = min_value
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Below Minimum"
-
-                        # Modify the free water to cement ratio
-                        self.calc_data['modified_fwc_ratio'] = self.calc_data['fw_content'] / self.calc_data[
-                            'cement_content']
-
-                    else:
-                        self.calc_data['cement_content'] = cement_content
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Within Range"
-
-                        # Modify the free water to cement ratio
-                        self.calc_data['modified_fwc_ratio'] = self.calc_data['fw_content'] / self.calc_data[
-                            'cement_content']
-
-                elif max_content:
-                    # Only max value is specified
-                    max_value = float(max_content)
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Specified",
-                        "min_content": "Unspecified"
-                    }
-
-                    if cement_content > max_value:
-                        # Given specifications cannot be met bc the calculated cement content is more than the maximum value
-                        self.feasibility_status = False
-
-                    else:
-                        self.calc_data['cement_content'] = cement_content
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Within Range"
-
-                        # Modify the free water to cement ratio
-                        self.calc_data['modified_fwc_ratio'] = self.calc_data['fw_content'] / self.calc_data[
-                            'cement_content']
-
-                else:
-                    # No range values specified, return original cement content
-                    self.calc_data['cement_content'] = cement_content
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Unspecified",
-                        "min_content": "Unspecified"
-                    }
-
-                    # Modify the free water to cement ratio
-                    self.calc_data['modified_fwc_ratio'] = self.calc_data['fw_content'] / self.calc_data[
-                        'cement_content']
-
-            else:
-                # Invalid input, do not proceed
-                pass
-
-        elif mode == 'PFA':
-
-            # Calculate and store the cement content
-            fw_content = float(self.calc_data['fw_content'])
-            fwc_ratio = float(self.calc_data['initial_fwc_ratio'])
-            p = float(self.data['Specified variables']['pfa Proportion'])
-            k = float(self.data['Additional info']['Cementing Efficiency Factor'])
-
-            # Calculate portland cement content
-            c = ((100 - p) * fw_content) / ((100 - ((1 - k) * p)) * fwc_ratio)
-            self.calc_data['init_C'] = c
-
-            # Calculate pfa content
-            f = (p * c) / (100 - p)
-            self.calc_data['init_F'] = f
-
-            # (Cement + pfa) content; (C + F)
-            cement_content = c + f
-            self.calc_data['calc_cement_content'] = cement_content
-
-            # Compare the calculated cement contents with the specified limits.
-            max_content = self.data['Specified variables']['Maximum cement content']
-            min_content = self.data['Specified variables']['Minimum cement content']
-            max_wcf_ratio = self.data['Specified variables']['Maximum free water-cement ratio']
-
-            # Preliminary check for valid inputs
-            confirmation_list = []
-            for entry in [max_content.strip(), min_content.strip(), max_wcf_ratio.strip()]:
-                if entry.isnumeric() or entry.replace('.', '', 1).isnumeric() or entry == '':
-                    validity = True
-                    confirmation_list.append(validity)
-
-                else:
-                    validity = False
-                    confirmation_list.append(validity)
-
-            if all(confirmation_list):
-                self.invalid_cc_entry = False
-
-            else:
-                self.invalid_cc_entry = True
-
-            if not self.invalid_cc_entry:
-                if min_content and max_content:
-
-                    # Both min and max values are specified
-                    min_value = float(min_content)
-                    max_value = float(max_content)
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Specified",
-                        "min_content": "Specified"
-                    }
-
-                    if min_value > max_value:
-                        # This brings a warning message when the program is running...
-                        self.min_is_more_than_max = True
-
-                    if min_value <= cement_content <= max_value:
-                        self.calc_data['cement_content'] = cement_content
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Within Range"
-
-                        # No modifications to the cementitious content
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"]
-                        self.calc_data["init_ii_F"] = self.calc_data["init_F"]
-
-                    elif cement_content < min_value:
-                        self.calc_data['cement_content'] = min_value
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Below Minimum"
-
-                        # Modify cementitious content, share the difference on cement and pfa based on their proportions
-                        diff = min_value - cement_content
-                        self.calc_data['cc_difference'] = diff
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"] + ((1 - (p / 100)) * diff)
-                        self.calc_data["init_ii_F"] = self.calc_data["init_F"] + ((p / 100) * diff)
-
-                    else:
-                        # Given specifications cannot be met bc cement content is more than maximum
-                        self.feasibility_status = False
+        limits = cement_limits(mode, **self.cement_limit_inputs(mode))
+        self.apply_cement_limits(mode, limits)
 
-                elif min_content:
-                    # Only min value is specified
-                    min_value = float(min_content)
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Unspecified",
-                        "min_content": "Specified"
-                    }
-
-                    if cement_content < min_value:
-                        self.calc_data['cement_content'] = min_value
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Below Minimum"
-
-                        # Modify cementitious content, share the difference on cement and pfa based on their proportions
-                        diff = min_value - cement_content
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"] + ((1 - (p / 100)) * diff)
-                        self.calc_data["init_ii_F"] = self.calc_data["init_F"] + ((p / 100) * diff)
-
-                    else:
-                        self.calc_data['cement_content'] = cement_content
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Within Range"
-
-                        # No modifications to the cementitious content
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"]
-                        self.calc_data["init_ii_F"] = self.calc_data["init_F"]
-
-                elif max_content:
-                    # Only max value is specified
-                    max_value = float(max_content)
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Specified",
-                        "min_content": "Unspecified"
-                    }
-
-                    if cement_content > max_value:
-                        # Given specifications cannot be met bc the calculated cement content is more than the maximum value
-                        self.feasibility_status = False
-
-                    else:
-                        self.calc_data['cement_content'] = cement_content
-
-                        # Update status
-                        self.cc_status["cement_content"] = 'Within Range'
-
-                        # No modifications to the cementitious content
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"]
-                        self.calc_data["init_ii_F"] = self.calc_data["init_F"]
-
-                else:
-                    # No range values specified, return original cement content
-                    self.calc_data['cement_content'] = cement_content
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Unspecified",
-                        "min_content": "Unspecified"
-                    }
-
-                    # No modifications to the cementitious content
-                    self.calc_data["init_ii_C"] = self.calc_data["init_C"]
-                    self.calc_data["init_ii_F"] = self.calc_data["init_F"]
-
-                if self.feasibility_status:
-
-                    # Determine W / (C + F) ratio;
-                    wcf_ratio = fw_content / self.calc_data['cement_content']
-                    self.calc_data['calc_wcf_ratio'] = wcf_ratio
-
-                    if max_wcf_ratio == '' or float(max_wcf_ratio) == float(0):
-                        limit = 0
-                        self.cc_status['limiting wcf'] = 'Unspecified'
-
-                    else:
-                        limit = float(max_wcf_ratio)
-                        self.cc_status['limiting wcf'] = 'Specified'
-
-                    # Compare to a specified maximum free-water ratio
-                    if self.cc_status['limiting wcf'] == 'Specified' and wcf_ratio > limit:
-                        # Update the status dict, for reporting
-                        self.cc_status['wcf_status'] = 'More than Maximum'
-
-                        # Save to the calc_data dictionary
-                        self.calc_data['modified_fwc_ratio'] = limit
-
-                        # Re-calculate the cementitious content.
-                        self.calc_data['final_cementitious_content'] = fw_content / self.calc_data['modified_fwc_ratio']
-                        diff = self.calc_data['final_cementitious_content'] - self.calc_data['cement_content']
-                        self.calc_data["C"] = self.calc_data["init_ii_C"] + ((1 - (p / 100)) * diff)
-                        self.calc_data["F"] = self.calc_data["init_ii_F"] + ((p / 100) * diff)
-
-                    elif self.cc_status['limiting wcf'] == 'Specified' and wcf_ratio < limit:
-                        # Update the status dict, for reporting
-                        self.cc_status['wcf_status'] = 'Less than Maximum'
+    def cement_limit_inputs(self, mode: str) -> dict:
+        """
+        Collects the inputs of `cement_limits` for this design, after the free-water content is determined
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :return: (dict): keyword arguments of `cement_limits`, one value each
+        """
+        split, ratio_name, _ = limit_rules[mode]
 
-                        # Save the calc_data dictionary
-                        self.calc_data['modified_fwc_ratio'] = wcf_ratio
+        # Limits entered, the free-water ratio limit is only used alongside pfa & ggbs
+        entries = [self.data['Specified variables']['Maximum cement content'],
+                   self.data['Specified variables']['Minimum cement content']]
 
-                        # No modifications to the cementitious content, store data as it is.
-                        self.calc_data['final_cementitious_content'] = self.calc_data['cement_content']
-                        self.calc_data["C"] = self.calc_data["init_ii_C"]
-                        self.calc_data["F"] = self.calc_data["init_ii_F"]
+        if ratio_name is not None:
+            entries.append(self.data['Specified variables']['Maximum free water-cement ratio'])
 
-                    elif self.cc_status['limiting wcf'] == 'Unspecified':
-                        # Update the status dict, for reporting
-                        self.cc_status['wcf_status'] = 'No Limits'
+        values, invalid = parse_limit_entries(entries)
 
-                        # Save the calc_data dictionary
-                        self.calc_data['modified_fwc_ratio'] = wcf_ratio
+        inputs = {
+            'fw_content': float(self.calc_data['fw_content']),
+            'fwc_ratio': float(self.calc_data['fwc_ratio' if split == ContentSplit.NONE else 'initial_fwc_ratio']),
+            'max_content': values[0],
+            'min_content': values[1],
+            'invalid_entry': invalid.any()
+        }
 
-                        # No modifications to the cementitious content, store data as it is.
-                        self.calc_data['final_cementitious_content'] = self.calc_data['cement_content']
-                        self.calc_data["C"] = self.calc_data["init_ii_C"]
-                        self.calc_data["F"] = self.calc_data["init_ii_F"]
+        if ratio_name is not None:
+            inputs['max_ratio'] = values[2]
 
-                else:
-                    # I don't want to go on with the calculations if self.feasibility_status is True
-                    pass
-            else:
-                # Invalid input, do not proceed
-                pass
+        if mode == 'PFA':
+            inputs['proportion'] = float(self.data['Specified variables']['pfa Proportion'])
+            inputs['efficiency'] = float(self.data['Additional info']['Cementing Efficiency Factor'])
 
         elif mode == 'GGBS':
+            inputs['proportion'] = float(self.data['Specified variables']['ggbs Proportion'])
 
-            # Calculate and store the cement content
-            fw_content = float(self.calc_data['fw_content'])
-            fwc_ratio = float(self.calc_data['initial_fwc_ratio'])
-            ggbs_prop = float(self.data['Specified variables']['ggbs Proportion'])
-
-            # (Cement + ggbs) content; (C + G)
-            cement_content = fw_content / fwc_ratio
-            self.calc_data['calc_cement_content'] = cement_content
-
-            # Calculate portland cement content
-            c = ((100 - ggbs_prop) / 100) * cement_content
-            self.calc_data['init_C'] = c
-
-            # Calculate ggbs content
-            g = cement_content - c
-            self.calc_data['init_G'] = g
-
-            # Compare the calculated cement contents with the specified limits.
-            max_content = self.data['Specified variables']['Maximum cement content']
-            min_content = self.data['Specified variables']['Minimum cement content']
-            max_wcg_ratio = self.data['Specified variables']['Maximum free water-cement ratio']
-
-            # Preliminary check for valid inputs
-            confirmation_list = []
-            for entry in [max_content.strip(), min_content.strip(), max_wcg_ratio.strip()]:
-                if entry.isnumeric() or entry.replace('.', '', 1).isnumeric() or entry == '':
-                    validity = True
-                    confirmation_list.append(validity)
-
-                else:
-                    validity = False
-                    confirmation_list.append(validity)
-
-            if all(confirmation_list):
-                self.invalid_cc_entry = False
-
-            else:
-                self.invalid_cc_entry = True
-
-            if not self.invalid_cc_entry:
-                if min_content and max_content:
-
-                    # Both min and max values are specified
-                    min_value = float(min_content)
-                    max_value = float(max_content)
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Specified",
-                        "min_content": "Specified"
-                    }
-
-                    if min_value > max_value:
-                        # This brings a warning message when the program is running...
-                        self.min_is_more_than_max = True
-
-                    if min_value <= cement_content <= max_value:
-                        self.calc_data['cement_content'] = cement_content
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Within Range"
-
-                        # No modifications to the cementitious content
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"]
-                        self.calc_data["init_ii_G"] = self.calc_data["init_G"]
-
-                    elif cement_content < min_value:
-                        self.calc_data['cement_content'] = min_value
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Below Minimum"
-
-                        # Modify cementitious content, share the difference on cement and pfa based on their proportions
-                        diff = min_value - cement_content
-                        self.calc_data['cc_difference'] = diff
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"] + ((1 - (ggbs_prop / 100)) * diff)
-                        self.calc_data["init_ii_G"] = self.calc_data["init_G"] + ((ggbs_prop / 100) * diff)
-
-                    else:
-                        # Given specifications cannot be met bc cement content is more than maximum
-                        self.feasibility_status = False
+        return inputs
 
-                elif min_content:
-                    # Only min value is specified
-                    min_value = float(min_content)
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Unspecified",
-                        "min_content": "Specified"
-                    }
-
-                    if cement_content < min_value:
-                        self.calc_data['cement_content'] = min_value
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Below Minimum"
-
-                        # Modify cementitious content, share the difference on cement and pfa based on their proportions
-                        diff = min_value - cement_content
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"] + ((1 - (ggbs_prop / 100)) * diff)
-                        self.calc_data["init_ii_G"] = self.calc_data["init_G"] + ((ggbs_prop / 100) * diff)
-
-                    else:
-                        self.calc_data['cement_content'] = cement_content
-
-                        # Update status
-                        self.cc_status["cement_content"] = "Within Range"
-
-                        # No modifications to the cementitious content
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"]
-                        self.calc_data["init_ii_G"] = self.calc_data["init_G"]
-
-                elif max_content:
-                    # Only max value is specified
-                    max_value = float(max_content)
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Specified",
-                        "min_content": "Unspecified"
-                    }
-
-                    if cement_content > max_value:
-                        # Given specifications cannot be met bc the calculated cement content is more than the maximum value
-                        self.feasibility_status = False
-
-                    else:
-                        self.calc_data['cement_content'] = cement_content
-
-                        # Update status
-                        self.cc_status["cement_content"] = 'Within Range'
-
-                        # No modifications to the cementitious content
-                        self.calc_data["init_ii_C"] = self.calc_data["init_C"]
-                        self.calc_data["init_ii_G"] = self.calc_data["init_G"]
-
-                else:
-                    # No range values specified, return original cement content
-                    self.calc_data['cement_content'] = cement_content
-
-                    # Make a status dict, to be used for case specification in reporting
-                    self.cc_status = {
-                        "max_content": "Unspecified",
-                        "min_content": "Unspecified"
-                    }
-
-                    # No modifications to the cementitious content
-                    self.calc_data["init_ii_C"] = self.calc_data["init_C"]
-                    self.calc_data["init_ii_G"] = self.calc_data["init_G"]
-
-                if self.feasibility_status:
-
-                    # Determine W / (C + G) ratio;
-                    wcg_ratio = fw_content / self.calc_data['cement_content']
-                    self.calc_data['calc_wcg_ratio'] = wcg_ratio
-
-                    if max_wcg_ratio == '' or float(max_wcg_ratio) == float(0):
-                        limit = 0
-                        self.cc_status['limiting wcg'] = 'Unspecified'
+    def apply_cement_limits(self, mode: str, limits: dict, row: int = 0):
+        """
+        Stores a design's row of the `cement_limits` columns in `calc_data`, and its status for the results pages
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :param limits: (dict): The columns returned by `cement_limits`
+        :param row: (int): The design's row
+        :raises ValueError: If the contents are undefined, for a zero free-water/cement ratio or only pfa as binder
+        """
+        status = LimitStatus(int(limits['status'][row]))
+        split, ratio_name, addition = limit_rules[mode]
+        value = {name: float(column[row]) for name, column in limits.items() if name != 'status'}
+
+        if LimitStatus.UNDEFINED in status:
+            fwc_ratio = float(self.calc_data['fwc_ratio' if split == ContentSplit.NONE else 'initial_fwc_ratio'])
+            binder = (f" and a pfa proportion of {self.data['Specified variables']['pfa Proportion']}%"
+                      if mode == 'PFA' else '')
+            raise ValueError(f"The cement content can not be calculated from a free-water/cement ratio of "
+                             f"{fwc_ratio:g}{binder}")
+
+        # Calculated (cement + addition) content, and its shares
+        if mode == 'PFA':
+            self.calc_data['init_C'] = value['init_C']
+            self.calc_data['init_F'] = value['init_addition']
 
-                    else:
-                        limit = float(max_wcg_ratio)
-                        self.cc_status['limiting wcg'] = 'Specified'
+        self.calc_data['calc_cement_content'] = value['calc_cement_content']
 
-                    # Compare to a specified maximum free-water ratio
-                    if self.cc_status['limiting wcg'] == 'Specified' and wcg_ratio > limit:
-                        # Update the status dict, for reporting
-                        self.cc_status['wcg_status'] = 'More than Maximum'
+        if mode == 'GGBS':
+            self.calc_data['init_C'] = value['init_C']
+            self.calc_data['init_G'] = value['init_addition']
 
-                        # Save to the calc_data dictionary
-                        self.calc_data['modified_fwc_ratio'] = limit
+        self.invalid_cc_entry = LimitStatus.INVALID_ENTRY in status
+        if self.invalid_cc_entry:
+            # Invalid input, do not proceed
+            return
 
-                        # Re-calculate the cementitious content.
-                        self.calc_data['final_cementitious_content'] = fw_content / self.calc_data['modified_fwc_ratio']
-                        diff = self.calc_data['final_cementitious_content'] - self.calc_data['cement_content']
-                        self.calc_data["C"] = self.calc_data["init_ii_C"] + ((1 - (ggbs_prop / 100)) * diff)
-                        self.calc_data["G"] = self.calc_data["init_ii_G"] + ((ggbs_prop / 100) * diff)
+        # Status dict, to be used for case specification in reporting
+        self.cc_status = limit_report(mode, status)
 
-                    elif self.cc_status['limiting wcg'] == 'Specified' and wcg_ratio < limit:
-                        # Update the status dict, for reporting
-                        self.cc_status['wcg_status'] = 'Less than Maximum'
+        if LimitStatus.MIN_MORE_THAN_MAX in status:
+            # This brings a warning message when the program is running...
+            self.min_is_more_than_max = True
 
-                        # Save the calc_data dictionary
-                        self.calc_data['modified_fwc_ratio'] = wcg_ratio
+        if LimitStatus.INFEASIBLE in status:
+            # Given specifications cannot be met bc cement content is more than maximum
+            self.feasibility_status = False
+            return
 
-                        # No modifications to the cementitious content, store data as it is.
-                        self.calc_data['final_cementitious_content'] = self.calc_data['cement_content']
-                        self.calc_data["C"] = self.calc_data["init_ii_C"]
-                        self.calc_data["G"] = self.calc_data["init_ii_G"]
+        self.calc_data['cement_content'] = value['cement_content']
 
-                    elif self.cc_status['limiting wcg'] == 'Unspecified':
-                        # Update the status dict, for reporting
-                        self.cc_status['wcg_status'] = 'No Limits'
+        if addition is None:
+            self.calc_data['modified_fwc_ratio'] = value['modified_fwc_ratio']
+            return
 
-                        # Save the calc_data dictionary
-                        self.calc_data['modified_fwc_ratio'] = wcg_ratio
+        if LimitStatus.BELOW_MINIMUM in status and LimitStatus.MAX_SPECIFIED in status:
+            # Difference shared on cement and addition based on their proportions
+            self.calc_data['cc_difference'] = value['cement_content'] - value['calc_cement_content']
 
-                        # No modifications to the cementitious content, store data as it is.
-                        self.calc_data['final_cementitious_content'] = self.calc_data['cement_content']
-                        self.calc_data["C"] = self.calc_data["init_ii_C"]
-                        self.calc_data["G"] = self.calc_data["init_ii_G"]
+        self.calc_data['init_ii_C'] = value['init_ii_C']
+        self.calc_data[f'init_ii_{addition}'] = value['init_ii_addition']
 
-                else:
-                    # I don't want to go on with the calculations if self.feasibility_status is True
-                    pass
-            else:
-                # Invalid input, do not proceed
-                pass
+        # W / (C + F) or W / (C + G) ratio, and the cementitious content meeting its limit
+        self.calc_data[f'calc_{ratio_name}_ratio'] = value['ratio']
+        self.calc_data['modified_fwc_ratio'] = value['modified_fwc_ratio']
+        self.calc_data['final_cementitious_content'] = value['final_cementitious_content']
+        self.calc_data['C'] = value['C']
+        self.calc_data[addition] = value['addition']
 
     def ssd_check(self):
         """
@@ -1637,8 +1078,8 @@ class MixDesignAnalyzer:
                     # Assumed for crushed aggregate (2.7)
                     self.calc_data['ssd_value'] = 2.7
                     wet_conc_density = interpolate(
-                        x=figure_5[3]['x'],
-                        y=figure_5[3][' y'],
+                        x=figure_5[3].x,
+                        y=figure_5[3].y,
                         target_var=fw_content
                     )
                     self.calc_data['calc_wet_conc_density'] = wet_conc_density
@@ -1650,8 +1091,8 @@ class MixDesignAnalyzer:
                     # Assumed for crushed aggregate (2.6)
                     self.calc_data['ssd_value'] = 2.6
                     wet_conc_density = interpolate(
-                        x=figure_5[2]['x'],
-                        y=figure_5[2][' y'],
+                        x=figure_5[2].x,
+                        y=figure_5[2].y,
                         target_var=fw_content
                     )
                     self.calc_data['calc_wet_conc_density'] = wet_conc_density
@@ -1664,17 +1105,17 @@ class MixDesignAnalyzer:
                     desired_line = 2.65
                     self.calc_data['ssd_value'] = desired_line
 
-                    # Find the index of the dataframe that contains the line below the desired line (2.6)
+                    # Find the index of the curve that contains the line below the desired line (2.6)
                     lower_index = int((desired_line - 2.4) * 10)
 
-                    # Find the index of the dataframe that contains the line above the desired line (2.7)
+                    # Find the index of the curve that contains the line above the desired line (2.7)
                     upper_index = lower_index + 1 if lower_index < 5 else 5
 
                     # Interpolate the x and y values
-                    x_lower = figure_5[lower_index]['x']
-                    y_lower = figure_5[lower_index][' y']
-                    x_upper = figure_5[upper_index]['x']
-                    y_upper = figure_5[upper_index][' y']
+                    x_lower = figure_5[lower_index].x
+                    y_lower = figure_5[lower_index].y
+                    x_upper = figure_5[upper_index].x
+                    y_upper = figure_5[upper_index].y
 
                     x_desired = x_lower + (desired_line - (lower_index / 10 + 2.4)) / 0.1 * (x_upper - x_lower)
                     y_desired = y_lower + (desired_line - (lower_index / 10 + 2.4)) / 0.1 * (y_upper - y_lower)
@@ -1698,18 +1139,18 @@ class MixDesignAnalyzer:
                 desired_line = float(self.data['Additional info']['Relative density of agg'])
                 self.calc_data['ssd_value'] = desired_line
 
-                # Find the index of the dataframe that contains the line below the desired line
+                # Find the index of the curve that contains the line below the desired line
                 lower_index = int((desired_line - 2.4) * 10)
 
-                # Find the index of the dataframe that contains the line above the desired line
+                # Find the index of the curve that contains the line above the desired line
                 # Handle the upper limit of 2.9
                 upper_index = lower_index + 1 if lower_index < 5 else 5
 
                 # Interpolate the x and y values
-                x_lower = figure_5[lower_index]['x']
-                y_lower = figure_5[lower_index][' y']
-                x_upper = figure_5[upper_index]['x']
-                y_upper = figure_5[upper_index][' y']
+                x_lower = figure_5[lower_index].x
+                y_lower = figure_5[lower_index].y
+                x_upper = figure_5[upper_index].x
+                y_upper = figure_5[upper_index].y
 
                 x_desired = x_lower + (desired_line - (lower_index / 10 + 2.4)) / 0.1 * (x_upper - x_lower)
                 y_desired = y_lower + (desired_line - (lower_index / 10 + 2.4)) / 0.1 * (y_upper - y_lower)
@@ -1735,8 +1176,8 @@ class MixDesignAnalyzer:
                     # Assumed for crushed aggregate (2.7)
                     self.calc_data['ssd_value'] = 2.7
                     wet_conc_density = interpolate(
-                        x=figure_5[3]['x'],
-                        y=figure_5[3][' y'],
+                        x=figure_5[3].x,
+                        y=figure_5[3].y,
                         target_var=fw_content
                     )
 
@@ -1751,8 +1192,8 @@ class MixDesignAnalyzer:
                     # Assumed for crushed aggregate (2.6)
                     self.calc_data['ssd_value'] = 2.6
                     wet_conc_density = interpolate(
-                        x=figure_5[2]['x'],
-                        y=figure_5[2][' y'],
+                        x=figure_5[2].x,
+                        y=figure_5[2].y,
                         target_var=fw_content
                     )
 
@@ -1768,17 +1209,17 @@ class MixDesignAnalyzer:
                     desired_line = 2.65
                     self.calc_data['ssd_value'] = desired_line
 
-                    # Find the index of the dataframe that contains the line below the desired line (2.6)
+                    # Find the index of the curve that contains the line below the desired line (2.6)
                     lower_index = int((desired_line - 2.4) * 10)
 
-                    # Find the index of the dataframe that contains the line above the desired line (2.7)
+                    # Find the index of the curve that contains the line above the desired line (2.7)
                     upper_index = lower_index + 1 if lower_index < 5 else 5
 
                     # Interpolate the x and y values
-                    x_lower = figure_5[lower_index]['x']
-                    y_lower = figure_5[lower_index][' y']
-                    x_upper = figure_5[upper_index]['x']
-                    y_upper = figure_5[upper_index][' y']
+                    x_lower = figure_5[lower_index].x
+                    y_lower = figure_5[lower_index].y
+                    x_upper = figure_5[upper_index].x
+                    y_upper = figure_5[upper_index].y
 
                     x_desired = x_lower + (desired_line - (lower_index / 10 + 2.4)) / 0.1 * (x_upper - x_lower)
                     y_desired = y_lower + (desired_line - (lower_index / 10 + 2.4)) / 0.1 * (y_upper - y_lower)
@@ -1803,18 +1244,18 @@ class MixDesignAnalyzer:
                 desired_line = float(self.data['Additional info']['Relative density of agg'])
                 self.calc_data['ssd_value'] = desired_line
 
-                # Find the index of the dataframe that contains the line below the desired line
+                # Find the index of the curve that contains the line below the desired line
                 lower_index = int((desired_line - 2.4) * 10)
 
-                # Find the index of the dataframe that contains the line above the desired line
+                # Find the index of the curve that contains the line above the desired line
                 # Handle the upper limit of 2.9
                 upper_index = lower_index + 1 if lower_index < 5 else 5
 
                 # Interpolate the x and y values
-                x_lower = figure_5[lower_index]['x']
-                y_lower = figure_5[lower_index][' y']
-                x_upper = figure_5[upper_index]['x']
-                y_upper = figure_5[upper_index][' y']
+                x_lower = figure_5[lower_index].x
+                y_lower = figure_5[lower_index].y
+                x_upper = figure_5[upper_index].x
+                y_upper = figure_5[upper_index].y
 
                 x_desired = x_lower + (desired_line - (lower_index / 10 + 2.4)) / 0.1 * (x_upper - x_lower)
                 y_desired = y_lower + (desired_line - (lower_index / 10 + 2.4)) / 0.1 * (y_upper - y_lower)
@@ -1856,8 +1297,8 @@ class MixDesignAnalyzer:
             traces = []  # List to store each trace for each plot
             for i in range(6):
                 trace = go.Scatter(
-                    x=figure_5[i]['x'],
-                    y=figure_5[i][' y'],
+                    x=figure_5[i].x,
+                    y=figure_5[i].y,
                     mode='lines',
                     name=names[i],
                     line=dict(color=fig_v_colors[i], width=2))
@@ -1988,8 +1429,8 @@ class MixDesignAnalyzer:
             traces = []  # List to store each trace for each plot
             for i in range(6):
                 trace = go.Scatter(
-                    x=figure_5[i]['x'],
-                    y=figure_5[i][' y'],
+                    x=figure_5[i].x,
+                    y=figure_5[i].y,
                     mode='lines',
                     name=names[i],
                     line=dict(color=fig_v_colors[i], width=2))
@@ -2489,3 +1930,78 @@ class MixDesignAnalyzer:
                 self.design_batch_results['odb_batching'] = mix_design_data['odb_batching']
                 self.design_batch_results['cagg_sizes'] = mix_design_data['cagg_sizes']
                 self.data['Result Tuning']['md_unit'] = "L"
+
+    def run_headless(self, mode: str) -> str:
+        """
+        Performs the whole mix design without the GUI, in the same order as the five design stages,
+        stopping wherever a stage would have shown an input error.
+
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :return: (str): 'ok' if the design is complete, otherwise the reason it was stopped
+        """
+        status = self.headless_mix_parameters(mode)
+        if status is not None:
+            return status
+
+        # Stage three, cement content and its limits
+        self.calculate_cement_content(mode)
+
+        return self.headless_aggregates(mode)
+
+    def headless_mix_parameters(self, mode: str) -> str | None:
+        """
+        Stages one & two of `run_headless`, up to the free-water content
+
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :return: (str): None if the cement content can be determined next, otherwise the reason the design was stopped
+        """
+        # Stage one, risk factor, standard deviation, margin & free-water/cement ratio
+        self.special_check(mode)
+        if self.empty_defective_rate_and_k:
+            return 'unspecified margin'
+
+        self.calculate_k()
+        self.calculate_sd()
+        self.calculate_margin(mode)
+        self.calculate_target_mean_strength(mode)
+        self.calculate_approx_strength(mode)
+        self.calculate_fwc_ratio(mode)
+
+        # Stage two, free-water content
+        self.calculate_fw_content(mode)
+
+        return None
+
+    def headless_aggregates(self, mode: str) -> str:
+        """
+        The rest of `run_headless` once the cement content is determined, stages four & five
+
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :return: (str): 'ok' if the design is complete, otherwise the reason it was stopped
+        """
+        if self.invalid_cc_entry:
+            return 'invalid cement content limits'
+
+        if not self.feasibility_status:
+            return 'infeasible'
+
+        # Stage four, wet concrete density & total aggregate content
+        self.ssd_check()
+        if self.ssd_value_error or self.invalid_ssd:
+            return 'invalid ssd'
+
+        self.compute_wet_conc_density(mode)
+        self.override_density()
+        self.compute_total_agg_content(mode)
+
+        # Stage five, fine & coarse aggregate contents
+        self.compute_fine_agg_proportion(mode)
+        if self.perc_pass_aberration:
+            return 'invalid percentage passing'
+
+        self.compute_agg_content(mode)
+        self.oven_dry_batching()
+        self.proportion_coarse_agg()
+        self.summarize_results(mode)
+
+        return 'ok'
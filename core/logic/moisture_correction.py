@@ -0,0 +1,153 @@
+"""moisture_correction.py
+
+Corrects a design's batch weights for the moisture of the aggregates in the stockpiles.
+
+The design's aggregate contents are saturated surface-dry (SSD), or oven-dry where `oven_dry_batching` was used, but
+stockpiled aggregates hold more or less water than that, changing through the day. Given the moisture content of each
+aggregate w (% of its oven-dry mass), as moisture probes report it, and its absorption a (%):
+
+- Weighed-out aggregate: oven-dry mass * (1 + w/100), the oven-dry mass being SSD / (1 + a/100).
+- Water added at the mixer: the design's free water, plus the water the aggregates would absorb from it,
+  less the water the aggregates bring, oven-dry mass * w/100.
+
+Without an absorption the aggregate is taken as SSD batched, and w as its free moisture (% of SSD mass).
+
+Each probe reading only changes its own aggregate's weighed-out mass & water, so `MoistureCorrection` keeps the
+oven-dry masses and the water to be shared out from the design once, and applies any number of readings at a constant
+cost each. It works on `design_results` (per m³) or `design_batch_results` (per batch) alike, both [exact, snapped];
+the corrected values are worked out from the exact ones and snapped again to the nearest five.
+"""
+import math
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+
+from core.logic.helpers.computation_helpers import snap_to_nearest_five
+
+# Aggregates a probe reading can be for
+aggregates = ('fine', 'coarse')
+
+# Results a reading corrects
+corrected_results = ('water', 'fagg', 'cagg', 'cagg_proportioning', 'aggregate_water')
+
+# odb_batching status -> (fine, coarse) oven-dry batched, see `MixDesignAnalyzer.oven_dry_batching`
+oven_dry_aggregates = {
+    'both aggregates': (True, True),
+    'fine aggregate only': (True, False),
+    'coarse aggregate only': (False, True),
+    'none': (False, False)
+}
+
+
+class MoistureCorrection:
+    """
+    Batch weights of a design corrected for the live moisture contents of its aggregates
+
+    Attributes:
+        - results (`dict`): The corrected results, as the results given with 'water', 'fagg', 'cagg' &
+          'cagg_proportioning' corrected after a reading, and 'aggregate_water' the water the aggregates bring beyond
+          their absorption (negative for the water they take up), each [exact, snapped to the nearest five]
+        - moisture (`dict`): 'fine' & 'coarse' latest moisture contents (%), None before a reading
+    """
+
+    def __init__(self, results: dict, fine_absorption: float = None, coarse_absorption: float = None):
+        """
+        :param results: (dict): A design's `design_results` or `design_batch_results`
+        :param fine_absorption: (float): Absorption of the fine aggregate (%), None for SSD batching by free moisture
+        :param coarse_absorption: (float): Absorption of the coarse aggregate (%), None likewise
+        """
+        oven_dry = oven_dry_aggregates[results['odb_batching']]
+        absorptions = (fine_absorption or 0.0, coarse_absorption or 0.0)
+
+        if any(not math.isfinite(absorption) or absorption < 0 for absorption in absorptions):
+            raise ValueError("Absorptions must be non-negative percentages")
+
+        # Oven-dry masses of the fine aggregate, coarse aggregate & each coarse size, as [exact, snapped]
+        masses = (np.asarray(results['fagg'], dtype=np.float64), np.asarray(results['cagg'], dtype=np.float64))
+        self.fine_mass, self.coarse_mass = (mass if dry else mass / (1 + absorption / 100)
+                                            for mass, dry, absorption in zip(masses, oven_dry, absorptions))
+        self.size_masses = np.array([np.atleast_1d(proportion) for proportion in results['cagg_proportioning']],
+                                    dtype=np.float64) * (self.coarse_mass / masses[1])[:, np.newaxis]
+
+        # Water to be shared between the mixer & the aggregates: the design's, plus the SSD aggregates' absorption
+        self.total_water = np.asarray(results['water'], dtype=np.float64) + sum(
+            mass - dry_mass for mass, dry_mass, dry in zip(masses, (self.fine_mass, self.coarse_mass), oven_dry)
+            if not dry)
+
+        # Water each aggregate carries in, the design's own: SSD aggregates their absorption, oven-dry ones none
+        self.absorptions = dict(zip(aggregates, absorptions))
+        self.carried = {aggregate: mass * (0.0 if dry else absorption) / 100
+                        for aggregate, mass, dry, absorption in zip(aggregates, (self.fine_mass, self.coarse_mass),
+                                                                    oven_dry, absorptions)}
+        self.moisture = {'fine': None, 'coarse': None}
+        self.results = dict(results)
+
+    @classmethod
+    def from_analyzer(cls, analyzer, batched: bool = True) -> 'MoistureCorrection':
+        """
+        Corrects a designed analyzer's results, with the absorptions entered for it
+
+        :param analyzer: (MixDesignAnalyzer): The design
+        :param batched: (bool): Correct `design_batch_results`, otherwise `design_results` (per m³)
+        """
+        def absorption(name: str) -> float | None:
+            value = analyzer.data['Additional info'].get(name)
+            return None if value is None or str(value).strip() == '' else float(value)
+
+        return cls(analyzer.design_batch_results if batched else analyzer.design_results,
+                   absorption('Absorption of Fine Aggregate'), absorption('Absorption of Coarse Aggregate'))
+
+    def update(self, aggregate: str, moisture: float) -> dict:
+        """
+        Applies a probe reading
+
+        :param aggregate: (str): 'fine' or 'coarse'
+        :param moisture: (float): The aggregate's moisture content (% of oven-dry mass)
+        :return: (dict): The corrected results, see `results`; a new dict, earlier ones are left as they were
+        :raises ValueError: For an unknown aggregate or a moisture content that is not a non-negative number
+        """
+        if aggregate not in aggregates:
+            raise ValueError(f"aggregate must be one of {list(aggregates)}")
+
+        try:
+            moisture = float(moisture)
+        except (TypeError, ValueError):
+            raise ValueError(f"Moisture content must be a number, got {moisture!r}") from None
+
+        if not math.isfinite(moisture) or moisture < 0:
+            raise ValueError(f"Moisture content must be a non-negative percentage, got {moisture!r}")
+
+        self.moisture[aggregate] = moisture
+        results = dict(self.results)
+
+        if aggregate == 'fine':
+            results['fagg'] = self.fine_mass * (1 + moisture / 100)
+            self.carried['fine'] = self.fine_mass * moisture / 100
+        else:
+            results['cagg'] = self.coarse_mass * (1 + moisture / 100)
+            results['cagg_proportioning'] = self.size_masses * (1 + moisture / 100)
+            self.carried['coarse'] = self.coarse_mass * moisture / 100
+
+        # The mixer adds whatever water the aggregates do not carry in
+        results['water'] = self.total_water - self.carried['fine'] - self.carried['coarse']
+        results['aggregate_water'] = (self.carried['fine'] - self.fine_mass * self.absorptions['fine'] / 100 +
+                                      self.carried['coarse'] - self.coarse_mass * self.absorptions['coarse'] / 100)
+
+        # Only the exact values are corrected, the snapped ones are snapped from them
+        for name in corrected_results:
+            exact = np.asarray(results[name], dtype=np.float64)[0]
+            results[name] = np.stack([exact, snap_to_nearest_five(exact).astype(np.float64)])
+
+        self.results = results
+
+        return results
+
+    def stream(self, readings: Iterable[Tuple[str, float]]) -> Iterator[dict]:
+        """
+        Applies probe readings as they come
+
+        :param readings: (aggregate, moisture content) of each reading, see `update`
+        :return: (Iterator[dict]): The corrected results after each reading
+        """
+        for aggregate, moisture in readings:
+            yield self.update(aggregate, moisture)
@@ -1,25 +1,28 @@
 """reference_data.py
 
-Central storage for diverse reference data in nested dictionaries, dataframes and lists.
+Central storage for diverse reference data in nested dictionaries, curves and lists.
+The tables are also kept as dense arrays indexed by integer category codes, for looking many designs up at once.
 """
 
-import pandas as pd
 from typing import Tuple
+
+import numpy as np
+
 from core.utils.file_paths import optimix_paths
+from core.logic.curve import Curve
+from core.logic.shared_reference import attached_reference
+from core.logic.reference_pack import read_reference_curve
 
-# Figure 3, relationship between standard deviation and characteristic strength.
+# Figure 3, relationship between standard deviation (y) and characteristic strength (x).
 figure_iii = {
-    'More than 20': pd.DataFrame(
-        {
-            'Characteristic Strength': [0, 10, 20, 30, 40, 50, 60, 70],
-            'Standard Deviation': [0, 2, 4, 4, 4, 4, 4, 4]
-        }),
-
-    'Less than 20': pd.DataFrame(
-        {
-            'Characteristic Strength': [0, 5, 10, 15, 20, 30, 40, 50, 60, 70],
-            'Standard Deviation': [0, 2, 4, 6, 8, 8, 8, 8, 8, 8]
-        }
+    'More than 20': Curve(
+        x=[0, 10, 20, 30, 40, 50, 60, 70],
+        y=[0, 2, 4, 4, 4, 4, 4, 4]
+    ),
+
+    'Less than 20': Curve(
+        x=[0, 5, 10, 15, 20, 30, 40, 50, 60, 70],
+        y=[0, 2, 4, 6, 8, 8, 8, 8, 8, 8]
     )
 }
 
@@ -64,7 +67,11 @@ table_ii = {
 }
 
 # Figure 4, relationship between compressive strength and free-water/cement ratio
-chart_iv = [pd.read_csv(plot_path) for plot_path in optimix_paths.fwc_plot_paths]
+# Worker processes attached to a shared reference block view its curves instead of reading the CSVs again
+if attached_reference() is not None:
+    chart_iv = [Curve.from_rows(curve) for curve in attached_reference().group('chart_iv')]
+else:
+    chart_iv = [read_reference_curve(plot_path) for plot_path in optimix_paths.fwc_plot_paths]
 
 # Table 3, Approximate free-water contents (kg/m3) required to give various levels of workability
 table_iii_a = {
@@ -152,6 +159,52 @@ table_iii_b = {
 }
 
 
+# Integer category codes, a category's code is its position in its tuple
+slump_categories = ('0-10mm', '10-30mm', '30-60mm', '60-180mm')
+cement_types = ('OPC', 'SRPC', 'RHPC')
+aggregate_types = ('Crushed', 'Uncrushed')
+max_agg_sizes = (0, 10, 20, 40)
+
+# Table columns & rows that are interpolated between: curing ages (days) of table 2, pfa proportions (%) of table 3b
+curing_ages = (3, 7, 28, 91)
+pfa_proportions = (0, 10, 20, 30, 40, 50)
+
+
+def category_codes(values, categories: tuple) -> np.ndarray:
+    """
+    Encodes category values as their integer codes
+
+    :param values: A category value, or an array of them, e.g. slump categories
+    :param categories: (tuple): The categories, e.g. `slump_categories`
+    :return: (np.ndarray): int8 codes, shaped as `values`
+    :raises KeyError: For a value that is not one of the categories, as the tables' dicts do
+    """
+    values = np.asarray(values)
+    lookup = {category: code for code, category in enumerate(categories)}
+
+    # Each distinct value is looked up once
+    uniques, inverse = np.unique(values, return_inverse=True)
+    codes = np.array([lookup[unique.item()] for unique in uniques], dtype=np.int8)
+
+    return codes[inverse].reshape(values.shape)
+
+
+# Table 2 as an array: [cement type, coarse aggregate type, curing age]
+table_ii_array = np.array([[[table_ii[(cement, agg)][age] for age in curing_ages]
+                            for agg in aggregate_types]
+                           for cement in cement_types], dtype=np.float64)
+
+# Table 3 as an array: [max aggregate size, aggregate type, slump category], nan where the table has no value
+table_iii_a_array = np.array([[[table_iii_a[(size, agg)][slump] if (size, agg) in table_iii_a else np.nan
+                                for slump in slump_categories]
+                               for agg in aggregate_types]
+                              for size in max_agg_sizes], dtype=np.float64)
+
+# Table 3b as an array: [pfa proportion, slump category]
+table_iii_b_array = np.array([[table_iii_b[proportion][slump] for slump in slump_categories]
+                              for proportion in pfa_proportions], dtype=np.float64)
+
+
 # Results to be exported for .xlsx reporting
 def generate_full_labels_and_values(mode: str, mix_design_data: list, odb_status: int) -> Tuple[list, list]:
     """Generate full report labels and values for .xlsx reporting
@@ -0,0 +1,242 @@
+"""reference_pack.py
+
+Compiles every reference curve CSV in `assets/data` into a single versioned, checksummed .npz pack,
+so loading the reference data at start-up is one file open instead of 70 CSV parses.
+
+Build (again after changing any CSV), or check a pack against the CSVs' contents:
+    python -m core.logic.reference_pack
+    python -m core.logic.reference_pack --verify
+
+Curves are indexed by their path relative to `assets/data`, e.g. 'fwc_data/plot-data-l1.csv', in natural order,
+and stored as (2, n) arrays of x & y rows.
+A pack that is missing, from another pack version, corrupt, or built from CSVs whose names, sizes or modification
+times have since changed is ignored (with a warning unless missing), and the CSVs are read instead.
+"""
+import os
+import sys
+import json
+import hashlib
+import warnings
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from core.logic.curve import Curve
+from core.utils.file_paths import optimix_paths, natural_sort_key
+
+# Version of the pack layout, packs of any other version are rebuilt
+pack_version = 3
+
+# Columns of every reference curve CSV
+curve_columns = ['x', ' y']
+
+
+def source_csvs() -> List[Path]:
+    """
+    Reference curve CSVs in the data folder, in a deterministic (natural) order
+
+    :return: (list): CSV paths
+    """
+    data_dir = optimix_paths.data_dir
+
+    return sorted(data_dir.glob('*/*.csv'),
+                  key=lambda path: [path.parent.name] + natural_sort_key(path))
+
+
+def curve_name(path) -> str:
+    """Index name of a curve, its path relative to the data folder"""
+    return Path(path).resolve().relative_to(optimix_paths.data_dir.resolve()).as_posix()
+
+
+def source_manifest(paths: List[Path] = None) -> List[list]:
+    """
+    Name, size & modification time (ns) of each CSV, checked when a pack is loaded.
+    Only the files' metadata is read, so the check costs no more opens than the pack itself.
+
+    :param paths: (list): CSV paths, `source_csvs()` by default
+    :return: (list): [name, size, mtime_ns] of each CSV
+    """
+    paths = source_csvs() if paths is None else paths
+    manifest = []
+
+    for path in paths:
+        # The CSVs are found in the data folder, their names need no resolving as `curve_name` does
+        status = os.stat(path)
+        manifest.append([Path(path).relative_to(optimix_paths.data_dir).as_posix(), status.st_size, status.st_mtime_ns])
+
+    return manifest
+
+
+def source_fingerprint(paths: List[Path] = None) -> str:
+    """
+    Fingerprint of the CSVs' names and contents, checked by `verify_reference_pack`.
+    Unlike `source_manifest`, it catches an edit that keeps a file's size and modification time.
+
+    :param paths: (list): CSV paths, `source_csvs()` by default
+    :return: (str): hex digest
+    """
+    paths = source_csvs() if paths is None else paths
+    digest = hashlib.blake2b(digest_size=32)
+
+    for path in paths:
+        digest.update(curve_name(path).encode('utf-8') + b'\0')
+        digest.update(hashlib.blake2b(path.read_bytes(), digest_size=32).digest())
+
+    return digest.hexdigest()
+
+
+def curves_checksum(names: List[str], curves: List[np.ndarray]) -> str:
+    """
+    Checksum of the packed curves, to detect a corrupt pack
+
+    :param names: (list): Curve names
+    :param curves: (list): Curves, (2, n) float64 arrays of x & y rows
+    :return: (str): hex digest
+    """
+    digest = hashlib.sha256()
+
+    for name, curve in zip(names, curves):
+        digest.update(name.encode('utf-8'))
+        digest.update(np.ascontiguousarray(curve, dtype=np.float64).tobytes())
+
+    return digest.hexdigest()
+
+
+def build_reference_pack(path=None) -> int:
+    """
+    Reads every reference curve CSV and writes them into a single .npz pack
+
+    :param path: Location of the pack, `optimix_paths.reference_pack_path` by default
+    :return: (int): Number of curves packed
+    """
+    path = optimix_paths.reference_pack_path if path is None else Path(path)
+    paths = source_csvs()
+
+    names = [curve_name(csv_path) for csv_path in paths]
+    curves = [pd.read_csv(csv_path)[curve_columns].to_numpy(dtype=np.float64).T.copy() for csv_path in paths]
+
+    metadata = {
+        'version': pack_version,
+        'names': names,
+        'manifest': source_manifest(paths),
+        'fingerprint': source_fingerprint(paths),
+        'checksum': curves_checksum(names, curves)
+    }
+
+    # Written to a temporary file first, so a failed build never leaves a half-written pack behind
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'wb') as file:
+        np.savez(file,
+                 metadata=np.frombuffer(json.dumps(metadata).encode('utf-8'), dtype=np.uint8),
+                 **{f'curve_{i}': curve for i, curve in enumerate(curves)})
+
+    temp_path.replace(path)
+
+    return len(curves)
+
+
+def load_reference_pack(path=None) -> Dict[str, np.ndarray] | None:
+    """
+    Loads the curves of an up-to-date pack
+
+    :param path: Location of the pack, `optimix_paths.reference_pack_path` by default
+    :return: (dict): curve name -> (2, n) float64 array of x & y rows, None if the pack is missing, stale or corrupt
+    """
+    path = optimix_paths.reference_pack_path if path is None else Path(path)
+
+    if not path.exists():
+        return None
+
+    try:
+        with np.load(path) as pack:
+            metadata = json.loads(pack['metadata'].tobytes().decode('utf-8'))
+
+            if metadata['version'] != pack_version or metadata['manifest'] != source_manifest():
+                warnings.warn(f"{path.name} is out of date, reading the CSVs instead. "
+                              f"Rebuild it with `python -m core.logic.reference_pack`")
+                return None
+
+            curves = [pack[f'curve_{i}'] for i in range(len(metadata['names']))]
+
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as error:
+        warnings.warn(f"{path.name} could not be read ({error}), reading the CSVs instead")
+        return None
+
+    if curves_checksum(metadata['names'], curves) != metadata['checksum']:
+        warnings.warn(f"{path.name} failed its checksum, reading the CSVs instead")
+        return None
+
+    for curve in curves:
+        curve.flags.writeable = False
+
+    return dict(zip(metadata['names'], curves))
+
+
+def verify_reference_pack(path=None) -> List[str]:
+    """
+    Checks a pack against the contents of the CSVs, rather than the sizes & modification times checked on loading
+
+    :param path: Location of the pack, `optimix_paths.reference_pack_path` by default
+    :return: (list): What is wrong with the pack, empty if it matches the CSVs
+    """
+    path = optimix_paths.reference_pack_path if path is None else Path(path)
+
+    if not path.exists():
+        return [f"{path.name} has not been built"]
+
+    try:
+        with np.load(path) as pack:
+            metadata = json.loads(pack['metadata'].tobytes().decode('utf-8'))
+            curves = [pack[f'curve_{i}'] for i in range(len(metadata['names']))]
+
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as error:
+        return [f"{path.name} could not be read ({error})"]
+
+    problems = []
+
+    if metadata['version'] != pack_version:
+        problems.append(f"{path.name} is pack version {metadata['version']}, not {pack_version}")
+    if metadata['fingerprint'] != source_fingerprint():
+        problems.append(f"{path.name} was built from CSVs whose names or contents have since changed")
+    if curves_checksum(metadata['names'], curves) != metadata['checksum']:
+        problems.append(f"{path.name} failed its checksum")
+
+    return problems
+
+
+@lru_cache(maxsize=None)
+def reference_pack() -> Dict[str, np.ndarray] | None:
+    """The pack's curves, loaded once per process, None when the CSVs have to be read"""
+    return load_reference_pack()
+
+
+def read_reference_curve(path) -> Curve:
+    """
+    Reads a reference curve, from the pack when it is up-to-date, else from its CSV.
+    Curves from the pack are read-only views of it.
+
+    :param path: Location of the curve's CSV
+    :return: (Curve): the curve's 'x' & ' y' columns
+    """
+    pack = reference_pack()
+    name = curve_name(path)
+
+    if pack is not None and name in pack:
+        return Curve.from_rows(pack[name])
+
+    csv = pd.read_csv(path)
+    return Curve(csv[curve_columns[0]], csv[curve_columns[1]])
+
+
+if __name__ == '__main__':
+    if '--verify' in sys.argv[1:]:
+        errors = verify_reference_pack()
+        print('\n'.join(errors) if errors else f"{optimix_paths.reference_pack_path.name} matches the CSVs")
+        sys.exit(1 if errors else 0)
+
+    count = build_reference_pack()
+    print(f"Packed {count} curves into {optimix_paths.reference_pack_path}")
@@ -0,0 +1,195 @@
+"""shared_reference.py
+
+Packs the reference charts read from files or fitted at start-up (Figure 4 curves & their fit, Figure 5 lines,
+Figure 6 lines) into a single shared memory block, so that worker processes attach to one copy instead of loading
+their own.
+
+Workers started with the spawn or forkserver start methods (the defaults on Windows & macOS) import OptiMix afresh,
+and read every chart from the block. Workers forked from the parent (the default on Linux) inherit the charts the
+parent had already loaded as copy-on-write pages, which the block cannot improve on; they only read from the block
+what the parent had not loaded before forking, e.g. a Figure 4 fit (`fit_figure_iv`) or Figure 6 lines not yet needed.
+
+Block layout:
+    [8 bytes: index length n][n bytes: JSON index {name: [offset, shape]}][float64 arrays, 64-byte aligned]
+
+Usage (parent process, before starting workers):
+    with SharedReferenceData.create() as reference:
+        os.environ[reference_env_var] = reference.name
+        ...  # start the worker pool, workers attach on import of `core.logic.reference_data`
+
+The small literal tables (table_ii, table_iii_a, table_iii_b, figure_iii) are compiled into `reference_data`
+and cost no I/O, so they are not packed.
+"""
+import os
+import json
+import sys
+import struct
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+import numpy as np
+
+# Environment variable holding the name of the shared block workers should attach to
+reference_env_var = 'OPTIMIX_REFERENCE_SHM'
+
+# Byte alignment of each array in the block
+alignment = 64
+
+
+def build_reference_arrays() -> Dict[str, np.ndarray]:
+    """
+    Reads and fits every packed chart, each curve as a (2, n) array of x & y rows (see `Curve.from_rows`),
+    and the arrays of the Figure 4 fit as `fit_figure_iv_curves` returns them
+
+    :return: (dict): name -> array, names are '<chart>/<key>/.../<index>'
+    """
+    # Imported here, these modules themselves read from the shared block when attached
+    from core.utils.file_paths import optimix_paths
+    from core.logic.reference_pack import read_reference_curve
+    from core.logic.helpers.computation_helpers import generate_figure_v
+    from core.logic.fine_agg_portioner import fit_figure_vi
+    from core.logic.fwc_model import fit_figure_iv_curves
+
+    arrays = {}
+
+    for i, plot_path in enumerate(optimix_paths.fwc_plot_paths):
+        arrays[f'chart_iv/{i}'] = read_reference_curve(plot_path).to_rows()
+
+    for i, line in enumerate(generate_figure_v()):
+        arrays[f'figure_v/{i}'] = line.to_rows()
+
+    for agg_size, slump_lines in fit_figure_vi().items():
+        for slump_category, lines in slump_lines.items():
+            for i, line in enumerate(lines):
+                arrays[f'figure_vi/{agg_size}/{slump_category}/{i}'] = line.to_rows()
+
+    for name, array in fit_figure_iv_curves().items():
+        arrays[f'figure_iv_fit/{name}'] = array
+
+    return arrays
+
+
+class SharedReferenceData:
+    """
+    Reference arrays held in a `multiprocessing.shared_memory` block.
+    Arrays handed out are read-only views into the block, nothing is copied.
+    """
+
+    def __init__(self, block: shared_memory.SharedMemory, owner: bool):
+        """
+        Use `create` or `attach` instead.
+
+        :param block: (SharedMemory): The shared block
+        :param owner: (bool): Whether this process created the block and should unlink it
+        """
+        self.block = block
+        self.owner = owner
+        self.name = block.name
+
+        index_length, = struct.unpack_from('<Q', block.buf, 0)
+        self.index = json.loads(bytes(block.buf[8:8 + index_length]).decode('utf-8'))
+
+        self.arrays = {}
+        for name, (offset, shape) in self.index.items():
+            array = np.ndarray(shape, dtype=np.float64, buffer=block.buf, offset=offset)
+            array.flags.writeable = False
+            self.arrays[name] = array
+
+    @classmethod
+    def create(cls, arrays: Dict[str, np.ndarray] = None) -> 'SharedReferenceData':
+        """
+        Packs the reference arrays into a new shared block
+
+        :param arrays: (dict): name -> array, `build_reference_arrays()` by default
+        """
+        arrays = build_reference_arrays() if arrays is None else arrays
+
+        # Lay the arrays out after the index, the index length is fixed before the offsets are known
+        # by reserving room for the largest offsets the block could need
+        index = {name: [0, list(array.shape)] for name, array in arrays.items()}
+        reserved = len(json.dumps(index)) + len(arrays) * 12
+
+        offset = -(-(8 + reserved) // alignment) * alignment
+        for name, array in arrays.items():
+            index[name][0] = offset
+            offset += -(-array.nbytes // alignment) * alignment
+
+        index_bytes = json.dumps(index).encode('utf-8')
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+
+        struct.pack_into('<Q', block.buf, 0, len(index_bytes))
+        block.buf[8:8 + len(index_bytes)] = index_bytes
+
+        for name, array in arrays.items():
+            start = index[name][0]
+            view = np.ndarray(array.shape, dtype=np.float64, buffer=block.buf, offset=start)
+            view[...] = array
+
+        return cls(block, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedReferenceData':
+        """
+        Attaches to a block created by another process
+
+        :param name: (str): Name of the shared block
+        """
+        # The creating process owns the block. Before Python 3.13 attaching always registers the block with the
+        # resource tracker; workers started by multiprocessing share their parent's tracker, so that is harmless
+        if sys.version_info >= (3, 13):
+            block = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            block = shared_memory.SharedMemory(name=name)
+
+        return cls(block, owner=False)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def group(self, prefix: str) -> List[np.ndarray]:
+        """
+        Arrays whose names start with `prefix/`, in the order they were packed
+
+        :param prefix: (str): e.g. 'chart_iv' or 'figure_vi/20/10-30mm'
+        """
+        return [array for name, array in self.arrays.items() if name.startswith(prefix + '/')]
+
+    def close(self) -> None:
+        """
+        Detaches from the block, the creating process also frees it
+        """
+        self.arrays = {}
+        self.block.close()
+
+        if self.owner:
+            self.block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Block this process is attached to, if any
+_attached = None
+
+
+def attached_reference() -> SharedReferenceData | None:
+    """
+    Attaches (once per process) to the block named in the `OPTIMIX_REFERENCE_SHM` environment variable
+
+    :return: (SharedReferenceData): the attached block, None when there is none and data should be loaded from files
+    """
+    global _attached
+
+    name = os.environ.get(reference_env_var)
+
+    if _attached is None and name:
+        try:
+            _attached = SharedReferenceData.attach(name)
+        except FileNotFoundError:
+            # The parent has already gone, fall back to loading from files
+            return None
+
+    return _attached
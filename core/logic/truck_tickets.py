@@ -0,0 +1,184 @@
+"""truck_tickets.py
+
+Splits a day's pour schedule into truck loads and makes their batch tickets.
+
+`batch_to_desired_volume` scales one design to one batch. A schedule orders many volumes of several mixes, e.g.
+280 m³ of C35, and each order goes out as full truck loads with the remainder in its last truck. Every load gets a
+ticket with its batch weights, the coarse aggregate split into its single sizes as `cagg_proportioning` does, and the
+running totals of every material sent out so far that day.
+
+The whole schedule is worked out at once: each order is repeated for its loads, and the loads' weights are their
+volumes times their mixes' quantities per m³, so hundreds of tickets take a few array operations. Tickets are written
+as one .csv file, or one .pdf with a page per ticket.
+"""
+import html
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from weasyprint import HTML
+
+# Quantities per m³ in `design_results` ticketed for each load, and the single sizes of the coarse aggregate
+ticket_materials = ('cement', 'pfa', 'ggbs', 'water', 'fagg', 'cagg')
+coarse_sizes = ('10mm', '20mm', '40mm')
+
+# Names of the ticket columns
+material_labels = {
+    'cement': 'Cement',
+    'pfa': 'Pfa',
+    'ggbs': 'Ggbs',
+    'water': 'Water',
+    'fagg': 'Fine aggregate',
+    'cagg': 'Coarse aggregate',
+    'cagg_10mm': 'Coarse aggregate 10mm',
+    'cagg_20mm': 'Coarse aggregate 20mm',
+    'cagg_40mm': 'Coarse aggregate 40mm'
+}
+
+# Ticket columns shown in their own rows of a printed ticket, not among its other details
+ticket_fields = ('ticket', 'order', 'mix', 'load', 'loads', 'load_volume', 'delivered', 'volume', 'truck_capacity')
+
+# Truck drum capacity (m³) used when the schedule does not give one
+default_truck_capacity = 8.0
+
+ticket_css = """
+@page { size: A5; margin: 12mm; }
+body { font-family: sans-serif; font-size: 10pt; }
+section { page-break-after: always; }
+section:last-child { page-break-after: auto; }
+table { border-collapse: collapse; width: 100%; }
+th, td { border: 1px solid #999; padding: 3px 6px; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+"""
+
+
+def material_rates(designs: dict) -> pd.DataFrame:
+    """
+    The exact quantities per m³ of each mix, one row per mix
+
+    :param designs: (dict): mix -> its `design_results`, or corrected results of `MoistureCorrection` (per m³)
+    :return: (pd.DataFrame): `ticket_materials` & 'cagg_10mm', 'cagg_20mm', 'cagg_40mm' columns (kg/m³), 0 for
+             materials a mix does not have
+    """
+    rows = {}
+
+    for mix, results in designs.items():
+        row = {material: float(np.asarray(results[material])[0]) if material in results else 0.0
+               for material in ticket_materials}
+
+        # 'cagg_sizes' names the sizes of 'cagg_proportioning', e.g. '10mm, 20mm'
+        sizes = [size.strip() for size in results['cagg_sizes'].split(',')]
+        split = np.atleast_1d(np.asarray(results['cagg_proportioning'][0], dtype=np.float64))
+        row.update({f'cagg_{size}': 0.0 for size in coarse_sizes})
+        row.update({f'cagg_{size}': float(mass) for size, mass in zip(sizes, split)})
+
+        rows[str(mix)] = row
+
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def schedule_tickets(schedule: pd.DataFrame, designs: dict, truck_capacity: float = default_truck_capacity,
+                     decimals: int = 1) -> pd.DataFrame:
+    """
+    Splits a schedule of orders into truck loads
+
+    :param schedule: (pd.DataFrame): Orders in dispatch order, 'mix' & 'volume' (m³) columns and optionally
+                     'truck_capacity' (m³) & any others (e.g. 'site', 'time'), which are copied onto their tickets
+    :param designs: (dict): mix -> its `design_results`, see `material_rates`
+    :param truck_capacity: (float): Capacity (m³) of trucks for orders without one
+    :param decimals: (int): Decimals the weights are rounded to, 1 as `batch_to_desired_volume`
+    :return: (pd.DataFrame): One row per ticket: 'ticket', 'order', the order's columns, 'load', 'loads',
+             'load_volume', 'delivered' the order's volume so far, the load's weights (kg) named as `material_rates`
+             and their running totals for the day, 'total_' + material, sums of the rounded weights
+    :raises ValueError: For a mix with no design, or volumes or capacities that are not positive
+    """
+    rates = material_rates(designs)
+    codes = rates.index.get_indexer(schedule['mix'].astype(str))
+
+    if (codes < 0).any():
+        missing = sorted(set(schedule['mix'].astype(str)[codes < 0]))
+        raise ValueError(f"No design for mixes {missing}")
+
+    volume = schedule['volume'].to_numpy(dtype=np.float64)
+    capacity = (schedule['truck_capacity'].to_numpy(dtype=np.float64) if 'truck_capacity' in schedule
+                else np.full(volume.size, float(truck_capacity)))
+
+    if not (volume > 0).all() or not (capacity > 0).all():
+        raise ValueError("Order volumes & truck capacities must be positive")
+
+    # Full loads, with the remainder in each order's last truck; rounding error is not a load of its own
+    loads = np.ceil(np.round(volume / capacity, 9)).astype(np.int64)
+    order = np.repeat(np.arange(volume.size), loads)
+    load = np.arange(order.size) - np.repeat(np.cumsum(loads) - loads, loads) + 1
+    load_volume = np.minimum(capacity[order], volume[order] - (load - 1) * capacity[order])
+
+    # Totals add up the printed (rounded) loads, so every ticket's total is the sum of the loads ticketed so far
+    weights = np.round(load_volume[:, np.newaxis] * rates.to_numpy()[codes[order]], decimals)
+    totals = np.round(np.cumsum(weights, axis=0), decimals)
+
+    tickets = schedule.iloc[order].reset_index(drop=True)
+    tickets.insert(0, 'ticket', np.arange(1, order.size + 1))
+    tickets.insert(1, 'order', order + 1)
+    tickets['load'] = load
+    tickets['loads'] = loads[order]
+    tickets['load_volume'] = load_volume
+    tickets['delivered'] = np.minimum(load * capacity[order], volume[order])
+
+    tickets[list(rates.columns)] = weights
+    tickets[[f'total_{material}' for material in rates.columns]] = totals
+
+    # Materials none of the scheduled mixes use are left off
+    unused = [material for material in rates.columns if not weights[:, rates.columns.get_loc(material)].any()]
+
+    return tickets.drop(columns=unused + [f'total_{material}' for material in unused])
+
+
+def tickets_html(tickets: pd.DataFrame) -> str:
+    """
+    The tickets as one HTML document, a section (printed page) per ticket
+
+    :param tickets: (pd.DataFrame): Tickets of `schedule_tickets`
+    """
+    materials = [material for material in material_labels if material in tickets]
+    details = [column for column in tickets.columns if column not in ticket_fields and column not in materials
+               and not column.startswith('total_')]
+
+    # Table rows of every ticket's weights & running totals, material by material
+    weights = tickets[materials].to_numpy()
+    totals = tickets[[f'total_{material}' for material in materials]].to_numpy()
+    labels = [material_labels[material] for material in materials]
+
+    sections = []
+    for i, ticket in enumerate(tickets[['ticket', 'mix', 'load', 'loads', 'load_volume', 'delivered',
+                                        'volume']].itertuples(index=False)):
+        detail_rows = ''.join(f'<tr><td>{html.escape(str(column))}</td><td>{html.escape(str(tickets[column].iat[i]))}'
+                              f'</td></tr>' for column in details)
+        material_rows = ''.join(f'<tr><td>{label}</td><td>{weight:.1f}</td><td>{total:.1f}</td></tr>'
+                                for label, weight, total in zip(labels, weights[i], totals[i]))
+
+        sections.append(
+            f'<section><h2>Batch ticket {ticket.ticket}</h2>'
+            f'<table><tr><td>Mix</td><td>{html.escape(str(ticket.mix))}</td></tr>'
+            f'<tr><td>Load</td><td>{ticket.load} of {ticket.loads}</td></tr>'
+            f'<tr><td>Load volume</td><td>{ticket.load_volume:.2f} m³</td></tr>'
+            f'<tr><td>Delivered</td><td>{ticket.delivered:.2f} of {ticket.volume:.2f} m³</td></tr>{detail_rows}'
+            f'</table><h3>Batch weights (kg)</h3>'
+            f'<table><tr><th>Material</th><th>This load</th><th>Day total</th></tr>{material_rows}</table></section>'
+        )
+
+    return f'<html><head><style>{ticket_css}</style></head><body>{"".join(sections)}</body></html>'
+
+
+def write_tickets(tickets: pd.DataFrame, path) -> None:
+    """
+    Writes the tickets as a .csv file, a row per ticket, or a .pdf file, a page per ticket
+
+    :param tickets: (pd.DataFrame): Tickets of `schedule_tickets`
+    :param path: (str, Path): The .csv or .pdf file
+    """
+    if Path(path).suffix == '.pdf':
+        # One document for every ticket, laid out & rendered once
+        Path(path).write_bytes(HTML(string=tickets_html(tickets), base_url="").write_pdf())
+
+    else:
+        tickets.to_csv(path, index=False)
@@ -0,0 +1,360 @@
+"""conformity.py
+
+Monitors production cube strengths against the designs they were made to, over many mix families at once.
+
+A design assumes a standard deviation, a risk factor k (from its defective rate) and their product the margin, so that
+its results should average the characteristic strength plus the margin. `ProductionMonitor` checks these assumptions as
+results come in:
+
+- Conformity criteria on the mean of consecutive results and on individual results, `conformity_rules`.
+- CUSUMs of the mean (results against the target mean), of the standard deviation (ranges of successive results
+  against those the design's standard deviation gives) and of the correlation (results against the strengths
+  predicted for them from early-age results). These are two-sided tabular CUSUMs in standard deviations.
+
+Results are processed in chunks with array operations grouped by mix family, the CUSUMs in closed form as running
+maxima, and each family's state carried to the next chunk, so years of results can be backfilled in a few passes.
+Every alarm carries the characteristic strength, k, sd & margin of the family's design and names the one it
+shows to be wrong, `alarm_links`.
+"""
+from dataclasses import dataclass
+from enum import IntEnum
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# rule -> (results per group, group mean above the characteristic strength (N/mm2), plus standard deviations,
+#          individual results allowed below the characteristic strength (N/mm2))
+conformity_rules = {
+    'EN 206 continuous': (15, 0.0, 1.48, 4.0),
+    'EN 206 initial': (3, 4.0, 0.0, 4.0),
+    'BS 5328': (4, 3.0, 0.0, 3.0)
+}
+
+# CUSUM reference value & decision interval, in standard deviations
+cusum_reference = 0.5
+cusum_decision = 5.0
+
+# Mean & standard deviation of the range of two results, in standard deviations
+range_mean = 1.128
+range_sd = 0.853
+
+
+class Cusum(IntEnum):
+    """The CUSUMs kept for every mix family, in the order of `ProductionMonitor.cusums`' columns"""
+    MEAN_LOW = 0
+    MEAN_HIGH = 1
+    SD_HIGH = 2
+    SD_LOW = 3
+    CORRELATION_LOW = 4
+    CORRELATION_HIGH = 5
+
+
+# alarm kind -> the design value it shows to be wrong
+alarm_links = {
+    'mean_low': 'margin',
+    'mean_high': 'margin',
+    'sd_high': 'sd',
+    'sd_low': 'sd',
+    'correlation_low': 'margin',
+    'correlation_high': 'margin',
+    'group_mean': 'margin',
+    'individual': 'k'
+}
+
+# Columns of the alarms, see `alarm_frame`, typed so that frames without alarms concatenate with the others
+alarm_columns = {
+    'row': 'int64',
+    'mix': 'str',
+    'kind': 'str',
+    'value': 'float64',
+    'limit': 'float64',
+    'violates': 'str',
+    'characteristic_strength': 'float64',
+    'k': 'float64',
+    'sd': 'float64',
+    'margin': 'float64',
+    'target_mean_strength': 'float64'
+}
+
+
+@dataclass(frozen=True, slots=True)
+class FamilyDesign:
+    """The assumptions of the design a mix family is produced to"""
+    mix: str
+    characteristic_strength: float
+    k: float
+    sd: float
+    margin: float
+
+    @property
+    def target_mean_strength(self) -> float:
+        """The mean strength (N/mm2) results should have, before any air-entrainment adjustment"""
+        return self.characteristic_strength + self.margin
+
+    @classmethod
+    def from_analyzer(cls, mix: str, analyzer) -> 'FamilyDesign':
+        """
+        Takes the assumptions of a designed analyzer
+
+        :param mix: (str): The mix family
+        :param analyzer: (MixDesignAnalyzer): The family's design, at least to its target mean strength
+        """
+        return cls(mix, float(analyzer.data['Specified variables']['Characteristic Strength']),
+                   float(analyzer.calc_data['k']), float(analyzer.calc_data['sd']), float(analyzer.calc_data['margin']))
+
+
+def running_cusums(groups: np.ndarray, z: np.ndarray, initial: np.ndarray) -> np.ndarray:
+    """
+    Lower one-sided tabular CUSUMs, C_t = max(0, C_t-1 - z_t - reference), of many families at once
+
+    With A_t = S_t + reference * t, S_t the running sum of z, C_t = max(C_0, A_1 ... A_t) - A_t,
+    so each family's CUSUM is a grouped running sum and running maximum. Negate z for the upper CUSUM.
+
+    :param groups: (np.ndarray): Family code of each row, rows of a family in order
+    :param z: (np.ndarray): Standardized statistic of each row
+    :param initial: (np.ndarray): Each row's family's CUSUM before its first row
+    :return: (np.ndarray): The CUSUM after each row
+    """
+    a = pd.Series(z + cusum_reference).groupby(groups, sort=False).cumsum().to_numpy()
+    peak = pd.Series(a).groupby(groups, sort=False).cummax().to_numpy()
+
+    return np.maximum(peak, initial) - a
+
+
+class ProductionMonitor:
+    """
+    Conformity & CUSUM monitoring of the cube strengths of many mix families, see the module's description
+
+    Attributes:
+        - designs (`list`): FamilyDesign of each family, by family code
+        - rule (`str`): The `conformity_rules` rule applied
+        - cusums (`np.ndarray`): [family, Cusum] the latest CUSUMs
+        - counts (`np.ndarray`): Results processed per family
+        - unlinked (`int`): Results of mixes with no design, not monitored
+    """
+
+    def __init__(self, designs, rule: str = 'EN 206 continuous'):
+        """
+        :param designs: (Iterable[FamilyDesign]): The design of each mix family
+        :param rule: (str): One of `conformity_rules`
+        """
+        if rule not in conformity_rules:
+            raise ValueError(f"rule must be one of {list(conformity_rules)}")
+
+        self.designs = list(designs)
+        self.rule = rule
+        self.families = pd.Index([design.mix for design in self.designs])
+
+        if not self.families.is_unique:
+            raise ValueError("Each mix family needs exactly one design")
+
+        # Design assumptions by family code
+        self.fck = np.array([design.characteristic_strength for design in self.designs], dtype=np.float64)
+        self.sd = np.array([design.sd for design in self.designs], dtype=np.float64)
+        self.target = np.array([design.target_mean_strength for design in self.designs], dtype=np.float64)
+
+        # State carried between chunks
+        group_size = conformity_rules[rule][0]
+        self.cusums = np.zeros((len(self.designs), len(Cusum)), dtype=np.float64)
+        self.tail = np.full((len(self.designs), group_size), np.nan)
+        self.failing = np.zeros(len(self.designs), dtype=bool)
+        self.counts = np.zeros(len(self.designs), dtype=np.int64)
+        self.unlinked = 0
+
+    def process(self, results: pd.DataFrame) -> pd.DataFrame:
+        """
+        Monitors the next results of any of the families
+
+        :param results: (pd.DataFrame): 'mix' & 'strength' columns, optionally 'predicted' the strength predicted for
+                        each result from early-age results; each family's results in test order
+        :return: (pd.DataFrame): The alarms raised, see `alarm_frame`
+        """
+        codes = self.families.get_indexer(results['mix'].astype(str))
+        known = codes >= 0
+        self.unlinked += int((~known).sum())
+
+        codes = codes[known]
+        rows = results.index.to_numpy()[known]
+        x = results['strength'].to_numpy(dtype=np.float64)[known]
+        predicted = (results['predicted'].to_numpy(dtype=np.float64)[known] if 'predicted' in results
+                     else np.full(x.size, np.nan))
+
+        if not x.size:
+            return alarm_frame([])
+
+        sd, last = self.sd[codes], self.last_rows(codes)
+        alarms = []
+
+        # Each family's previous result, from this chunk or the last
+        previous_x = pd.Series(x).groupby(codes, sort=False).shift(1).to_numpy()
+        previous_x = np.where(np.isnan(previous_x), self.tail[codes, -1], previous_x)
+
+        with np.errstate(invalid='ignore'):
+            statistics = {
+                'mean': (x - self.target[codes]) / sd,
+                'sd': np.nan_to_num((np.abs(x - previous_x) / sd - range_mean) / range_sd),
+                'correlation': np.nan_to_num((x - predicted) / sd)
+            }
+
+        # (CUSUM, statistic, sign, alarm kind), the upper CUSUMs are the lower CUSUMs of the negated statistic
+        sides = ((Cusum.MEAN_LOW, 'mean', 1, 'mean_low'), (Cusum.MEAN_HIGH, 'mean', -1, 'mean_high'),
+                 (Cusum.SD_HIGH, 'sd', -1, 'sd_high'), (Cusum.SD_LOW, 'sd', 1, 'sd_low'),
+                 (Cusum.CORRELATION_LOW, 'correlation', 1, 'correlation_low'),
+                 (Cusum.CORRELATION_HIGH, 'correlation', -1, 'correlation_high'))
+
+        for cusum, statistic, sign, kind in sides:
+            initial = self.cusums[codes, cusum]
+            values = running_cusums(codes, sign * statistics[statistic], initial)
+
+            # Alarm when a CUSUM crosses its decision interval
+            before = pd.Series(values).groupby(codes, sort=False).shift(1).to_numpy()
+            before = np.where(np.isnan(before), initial, before)
+            crossed = (values > cusum_decision) & (before <= cusum_decision)
+            alarms.append((kind, crossed, values, np.full(x.size, cusum_decision)))
+
+            self.cusums[codes[last], cusum] = values[last]
+
+        alarms.extend(self.conformity(codes, x, last))
+
+        # Carry each family's latest results to the next chunk
+        self.counts += np.bincount(codes, minlength=self.counts.size)
+        self.update_tail(codes, x)
+
+        design_fields = {name: np.array([getattr(design, name) for design in self.designs])
+                         for name in ('characteristic_strength', 'k', 'sd', 'margin')}
+
+        return alarm_frame([
+            {'row': rows[mask], 'mix': self.families.to_numpy()[codes[mask]], 'kind': kind,
+             'value': value[mask], 'limit': limit[mask], 'violates': alarm_links[kind],
+             **{name: field[codes[mask]] for name, field in design_fields.items()},
+             'target_mean_strength': self.target[codes[mask]]}
+            for kind, mask, value, limit in alarms if mask.any()
+        ])
+
+    @staticmethod
+    def last_rows(codes: np.ndarray) -> np.ndarray:
+        """Position of each family's last row"""
+        reverse = codes[::-1]
+        _, first = np.unique(reverse, return_index=True)
+
+        return codes.size - 1 - first
+
+    def conformity(self, codes: np.ndarray, x: np.ndarray, last: np.ndarray) -> list:
+        """
+        Applies the conformity rule to the chunk's results, continuing each family's groups from the last chunk
+
+        :param last: (np.ndarray): Position of each family's last row, see `last_rows`
+        :return: (list): (kind, mask, value, limit) of the group mean & individual result failures
+        """
+        group_size, mean_margin, sd_multiple, individual_margin = conformity_rules[self.rule]
+        fck = self.fck[codes]
+        alarms = []
+
+        # Individual results
+        individual_limit = fck - individual_margin
+        alarms.append(('individual', x < individual_limit, x, individual_limit))
+
+        # Each family's previous results, ahead of this chunk's, complete the first groups
+        families = codes[last]
+        carried = ~np.isnan(self.tail[families, 1:])
+        context_codes = np.repeat(families, carried.sum(axis=1))
+        context_x = self.tail[families, 1:][carried]
+
+        all_codes = np.concatenate((context_codes, codes))
+        all_x = pd.Series(np.concatenate((context_x, x)))
+
+        sums = all_x.groupby(all_codes, sort=False).cumsum()
+        before = sums.groupby(all_codes, sort=False).shift(group_size).fillna(0.0)
+        position = all_x.groupby(all_codes, sort=False).cumcount().to_numpy()
+
+        group_mean = ((sums - before).to_numpy() / group_size)[context_codes.size:]
+        complete = position[context_codes.size:] >= group_size - 1
+
+        # Group means, alarmed where a family starts failing
+        mean_limit = fck + mean_margin + sd_multiple * self.sd[codes]
+        failing = complete & (group_mean < mean_limit)
+
+        was_failing = pd.Series(failing).groupby(codes, sort=False).shift(1).to_numpy()
+        was_failing = np.where(pd.isna(was_failing), self.failing[codes], was_failing).astype(bool)
+        alarms.append(('group_mean', failing & ~was_failing, group_mean, mean_limit))
+
+        self.failing[families] = failing[last]
+
+        return alarms
+
+    def update_tail(self, codes: np.ndarray, x: np.ndarray) -> None:
+        """Keeps the latest results of each family, enough for the next chunk's first groups & ranges"""
+        width = self.tail.shape[1]
+        families = np.unique(codes)
+
+        # Results newest first within each family
+        reverse = pd.Series(x[::-1]).groupby(codes[::-1], sort=False).cumcount().to_numpy()
+        kept = reverse < width
+
+        # Shift the carried results along by the family's new results, then write them in
+        new_counts = np.bincount(codes, minlength=self.tail.shape[0])[families]
+        shifted = np.full((families.size, width), np.nan)
+
+        for shift in np.unique(np.minimum(new_counts, width)):
+            chosen = np.minimum(new_counts, width) == shift
+            shifted[chosen, :width - shift] = self.tail[families[chosen], shift:]
+
+        self.tail[families] = shifted
+        self.tail[codes[::-1][kept], width - 1 - reverse[kept]] = x[::-1][kept]
+
+    def backfill(self, path, chunksize: int = 1_000_000) -> pd.DataFrame:
+        """
+        Monitors a file of past results, in chunks
+
+        :param path: (str, Path): .csv or .parquet file of 'mix', 'strength' & optionally 'predicted' columns
+        :param chunksize: (int): Results per chunk
+        :return: (pd.DataFrame): Every alarm raised, rows numbered from the file's first result
+        """
+        # Chunks without alarms are left out, their empty frames would only get in the way of the columns' dtypes
+        alarms = [alarms for alarms in (self.process(chunk) for chunk in read_results(path, chunksize)) if len(alarms)]
+
+        return pd.concat(alarms, ignore_index=True) if alarms else alarm_frame([])
+
+
+def read_results(path, chunksize: int, columns=('mix', 'strength', 'predicted')) -> Iterator[pd.DataFrame]:
+    """
+    Reads a file of cube results (or logger readings) chunk by chunk, rows numbered from the file's first result
+
+    :param path: (str, Path): .csv or .parquet file of 'mix', 'strength' & optionally 'predicted' columns
+    :param chunksize: (int): Results per chunk
+    :param columns: The columns read where present, the first one (the mix or pour) as text
+    """
+    if Path(path).suffix == '.parquet':
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        first_row = 0
+
+        for record_batch in parquet_file.iter_batches(batch_size=chunksize,
+                                                      columns=[c for c in columns if c in parquet_file.schema.names]):
+            chunk = record_batch.to_pandas()
+            chunk.index += first_row
+            first_row += len(chunk)
+
+            yield chunk
+
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=lambda column: column in columns,
+                               dtype={columns[0]: str})
+
+
+def alarm_frame(parts: list) -> pd.DataFrame:
+    """
+    Collects alarms, one row each, ordered by the result that raised them
+
+    Columns: 'row' the result's row, 'mix', 'kind' (see `alarm_links`), 'value' the CUSUM, group mean or result,
+    'limit' the decision interval or conformity limit, 'violates' the design value the alarm shows to be wrong,
+    and the design's 'characteristic_strength', 'k', 'sd', 'margin' & 'target_mean_strength'
+    """
+    if not parts:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in alarm_columns.items()})
+
+    frame = pd.concat([pd.DataFrame(part) for part in parts], ignore_index=True)[list(alarm_columns)]
+
+    return frame.sort_values('row', kind='stable', ignore_index=True)
@@ -0,0 +1,369 @@
+"""cube_results.py
+
+Ingests cube test results from the lab as they are crushed, and keeps the running strength statistics of every mix.
+
+Results arrive one at a time, appended to a CSV file (`tail_csv`) or sent to a local socket as JSON Lines
+(`serve_results`). Each result updates its mix's mean & standard deviation with Welford's method, in constant time,
+over all of the mix's results or only the latest `window` of them. `CubeResultMonitor.apply` feeds the live
+standard deviation and result count back into a design's 'Standard Deviation' & 'Less Than 20 Results' inputs,
+which `MixDesignAnalyzer.calculate_sd` and `calculate_margin` then use for the redesign.
+
+CSV files need a header with 'mix' & 'strength' columns, and may have 'tested_at' & 'cube_id' columns.
+Socket records are objects with the same fields, {"mix": "C30-A", "strength": 38.5}, one per line.
+"""
+import os
+import csv
+import json
+import math
+import time
+import signal
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+
+# Results needed before a mix's own standard deviation is used, figure 3's line B
+min_results = 20
+
+
+@dataclass(frozen=True, slots=True)
+class CubeResult:
+    """A crushed cube: its mix, compressive strength (N/mm2) and optionally when it was tested & its identifier"""
+    mix: str
+    strength: float
+    tested_at: str | None = None
+    cube_id: str | None = None
+
+    @classmethod
+    def from_record(cls, record: dict) -> 'CubeResult':
+        """
+        Parses a CSV row or decoded JSON record
+
+        :param record: (dict): 'mix', 'strength' and optionally 'tested_at' & 'cube_id'
+        :raises ValueError: If the mix is missing or the strength is not a positive number
+        """
+        if not isinstance(record, dict):
+            raise ValueError("A cube result must be an object with 'mix' & 'strength'")
+
+        mix = str(record.get('mix') or '').strip()
+        if not mix:
+            raise ValueError("A cube result needs its 'mix'")
+
+        try:
+            strength = float(record.get('strength'))
+        except (TypeError, ValueError):
+            raise ValueError(f"'strength' must be a number, got {record.get('strength')!r}") from None
+
+        if not math.isfinite(strength) or strength <= 0:
+            raise ValueError(f"'strength' must be a positive number, got {strength!r}")
+
+        def optional(name: str) -> str | None:
+            value = record.get(name)
+            return None if value is None or str(value).strip() == '' else str(value).strip()
+
+        return cls(mix, strength, optional('tested_at'), optional('cube_id'))
+
+
+class RollingStrength:
+    """
+    Running mean & standard deviation of a mix's cube strengths, by Welford's method.
+
+    With a window, only the latest `window` results count: the oldest result is taken back out as each new one
+    comes in, so every update is constant time however many results the mix has.
+
+    Attributes:
+        - window (`int`): Results kept, None for every result
+        - count (`int`): Results counted
+        - mean (`float`): Mean strength (N/mm2)
+        - total_count (`int`): Results ever added, including those that left the window
+    """
+    __slots__ = ('window', 'count', 'mean', 'm2', 'total_count', 'results')
+
+    def __init__(self, window: int = None):
+        """
+        :param window: (int): Results kept, None for every result
+        """
+        if window is not None and window < 2:
+            raise ValueError("window must hold at least 2 results")
+
+        self.window = window
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.total_count = 0
+        self.results = deque() if window else None
+
+    def add(self, strength: float) -> None:
+        """Counts a new result, dropping the oldest one when the window is full"""
+        if self.results is not None:
+            if len(self.results) == self.window:
+                self.remove(self.results.popleft())
+            self.results.append(strength)
+
+        self.count += 1
+        self.total_count += 1
+
+        delta = strength - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (strength - self.mean)
+
+    def remove(self, strength: float) -> None:
+        """Takes a counted result back out, the reverse of `add`"""
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+
+        self.count -= 1
+
+        delta = strength - self.mean
+        self.mean -= delta / self.count
+        self.m2 = max(self.m2 - delta * (strength - self.mean), 0.0)
+
+    @property
+    def sd(self) -> float:
+        """Sample standard deviation (N/mm2), nan with fewer than two results"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'total_count': self.total_count, 'mean': self.mean, 'sd': self.sd}
+
+
+class CubeResultMonitor:
+    """
+    Keeps the running strength statistics of every mix, see `RollingStrength`, and feeds them back into designs
+
+    Attributes:
+        - mixes (`dict`): mix -> RollingStrength
+        - rejected (`int`): Records that were not valid cube results
+    """
+
+    def __init__(self, window: int = None):
+        """
+        :param window: (int): Latest results each mix's statistics are taken over, None for every result
+        :raises ValueError: For a window of fewer than `min_results` results, a mix's own standard deviation would then
+                            never be used
+        """
+        if window is not None and window < min_results:
+            raise ValueError(f"window must hold at least {min_results} results, the results a mix's own standard "
+                             f"deviation needs")
+
+        self.window = window
+        self.mixes = {}
+        self.rejected = 0
+
+    def add(self, result: CubeResult) -> RollingStrength:
+        """
+        Counts a cube result
+
+        :return: (RollingStrength): The statistics of the result's mix
+        """
+        statistics = self.mixes.get(result.mix)
+
+        if statistics is None:
+            statistics = self.mixes[result.mix] = RollingStrength(self.window)
+
+        statistics.add(result.strength)
+
+        return statistics
+
+    def extend(self, results: Iterable[CubeResult]) -> int:
+        """Counts many cube results, e.g. from `tail_csv(path, follow=False)`; returns how many"""
+        added = 0
+
+        for result in results:
+            self.add(result)
+            added += 1
+
+        return added
+
+    def design_inputs(self, mix: str) -> dict:
+        """
+        The standard deviation inputs a design of the mix should use
+
+        :param mix: (str): The mix
+        :return: (dict): 'Standard Deviation' the entry text of the mix's own standard deviation over its latest
+                 `window` results (all of them without a window), blank until it has `min_results` results,
+                 & 'Less Than 20 Results' the checkbutton value
+        """
+        statistics = self.mixes.get(mix)
+
+        if statistics is None or statistics.count < min_results:
+            return {'Standard Deviation': '', 'Less Than 20 Results': 1}
+
+        return {'Standard Deviation': f'{statistics.sd:.3f}', 'Less Than 20 Results': 0}
+
+    def apply(self, analyzer, mix: str, mode: str = None) -> dict:
+        """
+        Feeds the mix's live standard deviation & result count into a design's inputs
+
+        Without a mode the inputs are only updated, for `run_headless` or the GUI to redesign with;
+        with one the standard deviation, margin & target mean strength are recalculated straight away.
+
+        :param analyzer: (MixDesignAnalyzer): The mix's design
+        :param mix: (str): The mix
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] the concrete mix design mode
+        :return: (dict): The inputs applied, see `design_inputs`
+        """
+        inputs = self.design_inputs(mix)
+
+        analyzer.data['Additional info']['Standard Deviation'] = inputs['Standard Deviation']
+        analyzer.data['Specified variables']['Less Than 20 Results'] = inputs['Less Than 20 Results']
+
+        if mode is not None:
+            analyzer.calculate_k()
+            analyzer.calculate_sd()
+            analyzer.calculate_margin(mode)
+            analyzer.calculate_target_mean_strength(mode)
+
+        return inputs
+
+    def summary(self) -> dict:
+        """mix -> its statistics, see `RollingStrength.summary`"""
+        return {mix: statistics.summary() for mix, statistics in self.mixes.items()}
+
+
+def tail_csv(path, follow: bool = True, poll_interval: float = 1.0, stop: Callable[[], bool] = None,
+             on_error: Callable[[str, Exception], None] = None) -> Iterator[CubeResult]:
+    """
+    Reads cube results from a CSV file as lines are appended to it
+
+    A partly written last line is left until it is complete. If the file is truncated or replaced,
+    it is read again from its header. Without following, a last line with no line ending is read as it is.
+
+    :param path: CSV file with 'mix' & 'strength' columns
+    :param follow: (bool): Wait for new lines at the end of the file, otherwise stop there
+    :param poll_interval: (float): Seconds between checks for new lines
+    :param stop: Called between checks, following ends when it returns True
+    :param on_error: Called with each malformed line and its error, they are skipped
+    :return: (Iterator[CubeResult]): The results, in file order
+    """
+    path = os.fspath(path)
+    file, identity, header = None, None, None
+
+    try:
+        while True:
+            if file is None and os.path.exists(path):
+                file = open(path, 'rb')
+                identity, header = os.fstat(file.fileno()).st_ino, None
+
+            line = file.readline() if file is not None else b''
+
+            # Nothing more will be written to a file that is not followed, its last line is complete
+            if not follow and line and not line.endswith(b'\n'):
+                line += b'\n'
+
+            if line.endswith(b'\n'):
+                text = line.decode('utf-8-sig' if header is None else 'utf-8')
+
+                if header is None:
+                    header = [name.strip() for name in next(csv.reader([text]))]
+                elif text.strip():
+                    try:
+                        yield CubeResult.from_record(dict(zip(header, next(csv.reader([text])))))
+                    except ValueError as error:
+                        if on_error is not None:
+                            on_error(text, error)
+                continue
+
+            # At the end of the file, or of what has been written of its last line
+            if file is not None:
+                file.seek(file.tell() - len(line))
+
+            if not follow or (stop is not None and stop()):
+                return
+
+            time.sleep(poll_interval)
+
+            # Start again if the file was replaced or truncated
+            if file is not None:
+                try:
+                    status = os.stat(path)
+                    replaced = status.st_ino != identity or status.st_size < file.tell()
+                except FileNotFoundError:
+                    replaced = True
+
+                if replaced:
+                    file.close()
+                    file = None
+
+    finally:
+        if file is not None:
+            file.close()
+
+
+async def serve_results(monitor: CubeResultMonitor, host: str = '127.0.0.1', port: int = 8766,
+                        unix_socket: str = None, ready=None, on_result=None) -> None:
+    """
+    Receives cube results on a local socket until SIGINT or SIGTERM
+
+    Clients send one JSON record per line; each is answered with a line of its mix's statistics,
+    {"mix", "count", "total_count", "mean", "sd"}, or {"error"} for a malformed record.
+
+    :param monitor: (CubeResultMonitor): Where the results are counted
+    :param host: (str): Address to listen on, localhost by default so results are never taken from a network
+    :param port: (int): Port to listen on
+    :param unix_socket: (str): Listen on this Unix socket instead of host & port
+    :param ready: Called with the listening address once results are accepted
+    :param on_result: Called with each result and its mix's statistics
+    """
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+
+                try:
+                    result = CubeResult.from_record(json.loads(line))
+                except ValueError as error:
+                    # Malformed JSON (json.JSONDecodeError is a ValueError) or result
+                    monitor.rejected += 1
+                    response = {'error': str(error)}
+                else:
+                    statistics = monitor.add(result)
+                    response = {'mix': result.mix, **statistics.summary()}
+
+                    # nan is not JSON, a mix with one result has no standard deviation yet
+                    if math.isnan(response['sd']):
+                        response['sd'] = None
+
+                    if on_result is not None:
+                        on_result(result, statistics)
+
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Client went away mid record
+            pass
+
+        finally:
+            writer.close()
+
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = await asyncio.start_unix_server(handle_connection, path=unix_socket)
+        address = unix_socket
+    else:
+        server = await asyncio.start_server(handle_connection, host=host, port=port)
+        address = '%s:%d' % server.sockets[0].getsockname()[:2]
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows event loops have no signal handlers, Ctrl-C then raises KeyboardInterrupt
+            pass
+
+    if ready:
+        ready(address)
+
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        if unix_socket and os.path.exists(unix_socket):
+            os.unlink(unix_socket)
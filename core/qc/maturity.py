@@ -0,0 +1,233 @@
+"""maturity.py
+
+Estimates the in-place strength of pours from the temperature loggers cast into them.
+
+Table 2's strengths are for curing at 20°C. Concrete curing warmer gains strength sooner, and colder later, so a pour's
+temperature history is converted to its equivalent age: the time at 20°C that gives the same maturity, summed over
+every interval between readings with a temperature-time factor,
+
+- Nurse-Saul: (T - T0) / (20 - T0), with datum temperature T0 = -10°C and nothing gained below it.
+- Arrhenius: exp(-E/R (1/(T + 273.15) - 1/293.15)), with activation energy E = 40 kJ/mol.
+
+T is the mean of the interval's two readings. The equivalent age then takes the place of the curing days in
+`get_approximate_strength`, giving each pour's approximate strength as it cures. Table 2 is not extrapolated: past
+91 days the 91 day strength is kept, and before 3 days strength rises linearly from nothing to the 3 day strength.
+
+Loggers record millions of readings per pour, so readings are processed in chunks with array operations, each pour's
+equivalent age and last reading carried to the next chunk.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from core.logic.helpers.computation_helpers import get_approximate_strength, approximate_strengths
+from core.logic.reference_data import curing_ages
+from core.qc.conformity import read_results
+
+# The temperature-time factors, see the module's description
+maturity_methods = ('Nurse-Saul', 'Arrhenius')
+
+# Temperatures (°C): Table 2's curing & Nurse-Saul's datum, below which no strength is gained
+reference_temperature = 20.0
+datum_temperature = -10.0
+
+# Arrhenius apparent activation energy (J/mol) & the gas constant (J/mol/K)
+activation_energy = 40_000.0
+gas_constant = 8.314
+
+
+def temperature_time_factors(temperature, method: str = 'Nurse-Saul') -> np.ndarray:
+    """
+    Rates of strength gain at many temperatures, relative to curing at 20°C
+
+    :param temperature: Curing temperatures (°C)
+    :param method: (str): One of `maturity_methods`
+    :return: (np.ndarray): The factors, shaped as `temperature`
+    """
+    temperature = np.asarray(temperature, dtype=np.float64)
+
+    if method == 'Nurse-Saul':
+        return np.maximum(temperature - datum_temperature, 0.0) / (reference_temperature - datum_temperature)
+
+    if method == 'Arrhenius':
+        inverse_kelvin = 1 / (temperature + 273.15) - 1 / (reference_temperature + 273.15)
+        return np.exp(-activation_energy / gas_constant * inverse_kelvin)
+
+    raise ValueError(f"method must be one of {list(maturity_methods)}")
+
+
+def hours(times) -> np.ndarray:
+    """Reading times as hours, from numbers of hours or date-times"""
+    times = pd.Series(times)
+
+    if pd.api.types.is_numeric_dtype(times):
+        return times.to_numpy(dtype=np.float64)
+
+    # Date-times, naive ones taken as UTC
+    return ((pd.to_datetime(times, utc=True) - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(hours=1)).to_numpy()
+
+
+def table_ages(equivalent_age) -> np.ndarray:
+    """Equivalent ages (days) within Table 2's curing ages, where its strengths are read"""
+    return np.clip(equivalent_age, curing_ages[0], curing_ages[-1])
+
+
+def early_ages(equivalent_age) -> np.ndarray:
+    """Fraction of Table 2's first strength reached at equivalent ages (days), before its first curing age"""
+    return np.minimum(np.asarray(equivalent_age, dtype=np.float64) / curing_ages[0], 1.0)
+
+
+@dataclass(frozen=True, slots=True)
+class Pour:
+    """A logged pour and the materials its strength depends on"""
+    pour: str
+    cement_type: str
+    coarse_agg_type: str
+
+    @classmethod
+    def from_analyzer(cls, pour: str, analyzer) -> 'Pour':
+        """
+        Takes the materials of the pour's design
+
+        :param pour: (str): The pour
+        :param analyzer: (MixDesignAnalyzer): The design of the concrete poured
+        """
+        return cls(pour, analyzer.data['Specified variables']['Cement Type'],
+                   analyzer.data['Additional info']['Coarse Aggregate Type'])
+
+
+class MaturityMonitor:
+    """
+    Equivalent ages & approximate strengths of many pours from their temperature logger readings
+
+    Attributes:
+        - pours (`list`): Pour of each logged pour, by pour code
+        - method (`str`): The `maturity_methods` method used
+        - equivalent_age (`np.ndarray`): Equivalent age (days at 20°C) of each pour
+        - readings (`np.ndarray`): Readings processed per pour
+        - unlinked (`int`): Readings of unknown pours, not counted
+    """
+
+    def __init__(self, pours, method: str = 'Nurse-Saul'):
+        """
+        :param pours: (Iterable[Pour]): The logged pours
+        :param method: (str): One of `maturity_methods`
+        """
+        if method not in maturity_methods:
+            raise ValueError(f"method must be one of {list(maturity_methods)}")
+
+        self.pours = list(pours)
+        self.method = method
+        self.index = pd.Index([pour.pour for pour in self.pours])
+
+        if not self.index.is_unique:
+            raise ValueError("Each pour can only be registered once")
+
+        # State carried between chunks
+        self.equivalent_age = np.zeros(len(self.pours), dtype=np.float64)
+        self.readings = np.zeros(len(self.pours), dtype=np.int64)
+        self.first_time = np.full(len(self.pours), np.nan)
+        self.last_time = np.full(len(self.pours), np.nan)
+        self.last_temperature = np.full(len(self.pours), np.nan)
+        self.unlinked = 0
+
+    def process(self, readings: pd.DataFrame) -> pd.DataFrame:
+        """
+        Counts the next readings of any of the pours
+
+        :param readings: (pd.DataFrame): 'pour', 'time' (hours or date-times) & 'temperature' (°C) columns;
+                         each pour's readings in time order, following its readings of earlier chunks
+        :return: (pd.DataFrame): The updated predictions of the chunk's pours, see `predictions`
+        :raises ValueError: If a pour's readings go back in time
+        """
+        codes = self.index.get_indexer(readings['pour'].astype(str))
+        known = codes >= 0
+        self.unlinked += int((~known).sum())
+
+        # Each pour's readings together, still in time order
+        order = np.argsort(codes[known], kind='stable')
+        codes = codes[known][order]
+        times = hours(readings['time'])[known][order]
+        temperatures = readings['temperature'].to_numpy(dtype=np.float64)[known][order]
+
+        if not codes.size:
+            return self.predictions([])
+
+        first = np.r_[True, codes[1:] != codes[:-1]]
+        last = np.r_[codes[1:] != codes[:-1], True]
+
+        # Each reading's previous one, from this chunk or the last
+        previous_time = np.r_[np.nan, times[:-1]]
+        previous_temperature = np.r_[np.nan, temperatures[:-1]]
+        previous_time[first] = self.last_time[codes[first]]
+        previous_temperature[first] = self.last_temperature[codes[first]]
+
+        interval = times - previous_time
+        if (interval < 0).any():
+            pour = self.pours[codes[np.flatnonzero(interval < 0)[0]]].pour
+            raise ValueError(f"The readings of pour {pour!r} must be in time order")
+
+        # Equivalent days at 20°C of every interval, nothing before a pour's first reading
+        factors = temperature_time_factors((temperatures + previous_temperature) / 2, self.method)
+        increments = np.nan_to_num(factors * interval / 24)
+
+        self.equivalent_age += np.bincount(codes, weights=increments, minlength=self.equivalent_age.size)
+        self.readings += np.bincount(codes, minlength=self.readings.size)
+
+        started = first & np.isnan(self.first_time[codes])
+        self.first_time[codes[started]] = times[started]
+        self.last_time[codes[last]] = times[last]
+        self.last_temperature[codes[last]] = temperatures[last]
+
+        return self.predictions(codes[last])
+
+    def predictions(self, codes=None) -> pd.DataFrame:
+        """
+        Approximate strengths of pours at their equivalent ages, Table 2 interpolated as by `get_approximate_strength`
+
+        :param codes: Pour codes to predict, every pour by default
+        :return: (pd.DataFrame): 'pour', 'readings', 'elapsed_hours' since the first reading, 'equivalent_age' (days),
+                 'strength' (N/mm2) & 'outside_table', ages outside Table 2's 3 to 91 days
+        """
+        codes = np.arange(len(self.pours)) if codes is None else np.asarray(codes, dtype=np.int64)
+        pours = [self.pours[code] for code in codes]
+        age = self.equivalent_age[codes]
+
+        strength = (approximate_strengths([pour.cement_type for pour in pours],
+                                          [pour.coarse_agg_type for pour in pours], table_ages(age)) * early_ages(age)
+                    if pours else np.empty(0))
+
+        return pd.DataFrame({
+            'pour': self.index.to_numpy()[codes],
+            'readings': self.readings[codes],
+            'elapsed_hours': np.nan_to_num(self.last_time[codes] - self.first_time[codes]),
+            'equivalent_age': age,
+            'strength': strength,
+            'outside_table': (age < curing_ages[0]) | (age > curing_ages[-1])
+        })
+
+    def strength(self, pour: str) -> float:
+        """
+        The approximate strength (N/mm2) of a pour at its equivalent age
+
+        :param pour: (str): The pour
+        """
+        code = self.index.get_loc(pour)
+        age = self.equivalent_age[code]
+
+        return get_approximate_strength(self.pours[code].cement_type, self.pours[code].coarse_agg_type,
+                                        table_ages(age)) * float(early_ages(age))
+
+    def backfill(self, path, chunksize: int = 1_000_000) -> pd.DataFrame:
+        """
+        Counts a file of logger readings, in chunks
+
+        :param path: (str, Path): .csv or .parquet file of 'pour', 'time' & 'temperature' columns
+        :param chunksize: (int): Readings per chunk
+        :return: (pd.DataFrame): The predictions of every pour afterwards, see `predictions`
+        """
+        for chunk in read_results(path, chunksize, columns=('pour', 'time', 'temperature')):
+            self.process(chunk)
+
+        return self.predictions()
@@ -0,0 +1,350 @@
+"""design_service.py
+
+Local HTTP/1.1 design service, over a Unix socket or a localhost port, for tools that need designs on demand.
+
+Endpoints:
+    POST /design          {"mode": "DOE", "characteristic_strength": 30, ...}  -> design record
+    POST /design/batch    {"mode": "DOE", "specs": [{...}, {...}]}              -> {"results": [design record, ...]}
+    GET  /health                                                                 -> {"status": "ok", ...}
+
+Specifications use the column names of `stream_helpers.input_fields`, with an optional 'mode'.
+A design record is laid out as a `JsonlSink` line:
+    {"mode", "design_status", "inputs", "design_results", "design_batch_results", "status"}
+"""
+import os
+import json
+import signal
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+from core.logic.batch_engine import design_spec, DesignCache, design_modes
+from core.logic.helpers.stream_helpers import input_fields, design_status, to_json
+from core.logic.shared_reference import SharedReferenceData, reference_env_var
+
+# Fields a specification may contain
+spec_fields = set(input_fields) | {'mode'}
+
+# Designs kept for reuse by each worker process
+worker_cache = DesignCache(max_designs=1024)
+
+
+def design_in_worker(spec: dict, mode: str) -> tuple:
+    """
+    Designs a specification in a worker process and serializes its record there,
+    keeping both the design and the JSON encoding off the event loop.
+
+    :param spec: (dict): input column name -> value
+    :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] mode if the specification has none
+    :return: (tuple): (design status, the design record as JSON), the status 'ok' or why the design failed
+    """
+    row_mode, analyzer, status = design_spec(spec, mode, worker_cache)
+
+    record = {'mode': row_mode,
+              'design_status': status,
+              'inputs': analyzer.data,
+              'design_results': analyzer.design_results,
+              'design_batch_results': analyzer.design_batch_results,
+              'status': design_status(analyzer)}
+
+    return status, json.dumps(record, default=to_json, separators=(',', ':'))
+
+
+def request_key(spec: dict, mode: str) -> str:
+    """Identifies identical design requests, so that only one of them is designed while both are in flight"""
+    return json.dumps([spec.get('mode') or mode, {k: v for k, v in spec.items() if k != 'mode'}],
+                      sort_keys=True, separators=(',', ':'))
+
+
+def check_spec(spec) -> None:
+    """
+    Rejects specifications the engine would misread
+
+    :param spec: A decoded specification
+    :raises ValueError: If the specification is not an object of known fields holding single values
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("A specification must be a JSON object")
+
+    unknown = set(spec) - spec_fields
+    if unknown:
+        raise ValueError(f"Unknown specification fields: {', '.join(sorted(unknown))}")
+
+    for field, value in spec.items():
+        if value is not None and not isinstance(value, (str, int, float)):
+            raise ValueError(f"'{field}' must be a number or a string")
+
+    if spec.get('mode') is not None and str(spec['mode']).strip().upper() not in design_modes:
+        raise ValueError(f"'mode' must be one of {', '.join(design_modes)}")
+
+
+class ServiceBusy(Exception):
+    """Raised when accepting a request would exceed the service's limit of designs in flight"""
+
+
+class RequestTooLarge(Exception):
+    """Raised when a request needs more designs than the service ever allows in flight"""
+
+
+class DesignService:
+    """
+    asyncio HTTP/1.1 server handing designs to a process pool.
+
+    Identical specifications in flight at the same time share one design (request coalescing),
+    and requests needing more designs than `max_pending` allows in flight are refused with 503 (backpressure).
+    A request needing more new designs than `max_pending` altogether could never be admitted, and is refused with 413.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, max_body_bytes: int = 1 << 24):
+        """
+        :param workers: (int): Worker processes, the number of CPUs by default
+        :param max_pending: (int): Designs allowed in flight before requests are refused, 32 per worker by default
+        :param max_body_bytes: (int): Largest request body accepted
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 32 * self.workers
+        self.max_body_bytes = max_body_bytes
+        self.pool = None
+        self.in_flight = {}
+        self.counts = {'requests': 0, 'designs': 0, 'coalesced': 0, 'refused': 0}
+
+    def submit(self, spec: dict, mode: str) -> asyncio.Future:
+        """
+        Starts the design of a specification, or joins the identical design already in flight
+
+        :param spec: (dict): input column name -> value
+        :param mode: (str) ['DOE', 'AEM', 'PFA', 'GGBS'] mode if the specification has none
+        :return: (asyncio.Future): resolves to (design status, the design record as JSON)
+        """
+        key = request_key(spec, mode)
+        future = self.in_flight.get(key)
+
+        if future is not None:
+            self.counts['coalesced'] += 1
+            return future
+
+        future = asyncio.get_running_loop().run_in_executor(self.pool, design_in_worker, spec, mode)
+        future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+
+        self.in_flight[key] = future
+        self.counts['designs'] += 1
+
+        return future
+
+    def reserve(self, specs: list, mode: str) -> None:
+        """
+        Checks there is room in flight for the new designs a request needs
+
+        :raises RequestTooLarge: If the request alone needs more than `max_pending` designs
+        :raises ServiceBusy: If the designs would exceed `max_pending`
+        """
+        new_designs = {request_key(spec, mode) for spec in specs} - set(self.in_flight)
+
+        if len(new_designs) > self.max_pending:
+            self.counts['refused'] += 1
+            raise RequestTooLarge(f"{len(new_designs)} different specifications, more than the {self.max_pending} "
+                                  f"designs allowed in flight; split the batch into requests of at most "
+                                  f"{self.max_pending}")
+
+        if len(self.in_flight) + len(new_designs) > self.max_pending:
+            self.counts['refused'] += 1
+            raise ServiceBusy(f"{len(self.in_flight)} designs in flight, try again shortly")
+
+    async def design(self, body: dict):
+        """
+        POST /design
+
+        :param body: (dict): a single specification
+        :return: (status, response body)
+        """
+        check_spec(body)
+        self.reserve([body], 'DOE')
+
+        # Shielded, so a client hanging up does not cancel a design another request may be sharing
+        status, record = await asyncio.shield(self.submit(body, 'DOE'))
+
+        return (HTTPStatus.OK if status == 'ok' else HTTPStatus.UNPROCESSABLE_ENTITY), record.encode('utf-8')
+
+    async def design_batch(self, body: dict):
+        """
+        POST /design/batch
+
+        :param body: (dict): {"mode": default mode, "specs": [specification, ...]}
+        :return: (status, response body), the records are in the order of the specifications
+        """
+        if not isinstance(body, dict) or not isinstance(body.get('specs'), list):
+            raise ValueError("Expected {\"mode\": ..., \"specs\": [...]}")
+
+        mode = str(body.get('mode') or 'DOE').strip().upper()
+        if mode not in design_modes:
+            raise ValueError(f"'mode' must be one of {', '.join(design_modes)}")
+
+        for spec in body['specs']:
+            check_spec(spec)
+
+        self.reserve(body['specs'], mode)
+
+        futures = [self.submit(spec, mode) for spec in body['specs']]
+        records = await asyncio.gather(*(asyncio.shield(future) for future in futures), return_exceptions=True)
+
+        lines = [record[1] if isinstance(record, tuple)
+                 else json.dumps({'design_status': f'error: {type(record).__name__}: {record}'})
+                 for record in records]
+
+        return HTTPStatus.OK, ('{"results":[' + ','.join(lines) + ']}').encode('utf-8')
+
+    def health(self):
+        """
+        GET /health
+
+        :return: (status, response body)
+        """
+        body = {'status': 'ok', 'workers': self.workers, 'in_flight': len(self.in_flight),
+                'max_pending': self.max_pending, **self.counts}
+
+        return HTTPStatus.OK, json.dumps(body).encode('utf-8')
+
+    async def route(self, method: str, target: str, body: bytes):
+        """
+        Answers a single request
+
+        :return: (status, response body)
+        """
+        path = target.split('?', 1)[0].rstrip('/')
+        self.counts['requests'] += 1
+
+        routes = {('POST', '/design'): self.design, ('POST', '/design/batch'): self.design_batch}
+
+        if (method, path) == ('GET', '/health'):
+            return self.health()
+
+        if (method, path) not in routes:
+            known_path = path in ('/design', '/design/batch', '/health')
+            status = HTTPStatus.METHOD_NOT_ALLOWED if known_path else HTTPStatus.NOT_FOUND
+            return status, json.dumps({'error': status.phrase}).encode('utf-8')
+
+        try:
+            return await routes[(method, path)](json.loads(body or b'null'))
+
+        except ValueError as error:
+            # Malformed JSON (json.JSONDecodeError is a ValueError) or specification
+            return HTTPStatus.BAD_REQUEST, json.dumps({'error': str(error)}).encode('utf-8')
+
+        except ServiceBusy as error:
+            return HTTPStatus.SERVICE_UNAVAILABLE, json.dumps({'error': str(error)}).encode('utf-8')
+
+        except RequestTooLarge as error:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, json.dumps({'error': str(error)}).encode('utf-8')
+
+        except Exception as error:
+            body = json.dumps({'error': f'{type(error).__name__}: {error}'})
+            return HTTPStatus.INTERNAL_SERVER_ERROR, body.encode('utf-8')
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serves the requests of a connection, keeping it open between requests unless asked not to
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, b'{"error":"Bad Request"}', False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length') or 0)
+                if length > self.max_body_bytes:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                       b'{"error":"Request body too large"}', False)
+                    break
+
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                status, response = await self.route(method.upper(), target, body)
+                await self.respond(writer, status, response, keep_alive)
+
+                if not keep_alive:
+                    break
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Client went away mid request
+            pass
+
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, status: HTTPStatus, body: bytes, keep_alive: bool) -> None:
+        """Writes a JSON response"""
+        head = (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n')
+
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            head += 'Retry-After: 1\r\n'
+
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, unix_socket: str = None, ready=None) -> None:
+        """
+        Serves until SIGINT or SIGTERM
+
+        :param host: (str): Address to listen on, localhost by default so the service is never exposed to a network
+        :param port: (int): Port to listen on
+        :param unix_socket: (str): Listen on this Unix socket instead of host & port
+        :param ready: Called with the listening address once the service accepts connections
+        """
+        # Workers attach to one shared copy of the reference charts instead of each loading their own
+        reference = SharedReferenceData.create()
+        os.environ[reference_env_var] = reference.name
+
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_socket)
+            address = unix_socket
+        else:
+            server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+            address = '%s:%d' % server.sockets[0].getsockname()[:2]
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows event loops have no signal handlers, Ctrl-C then raises KeyboardInterrupt
+                pass
+
+        if ready:
+            ready(address)
+
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+            os.environ.pop(reference_env_var, None)
+            reference.close()
+
+            if unix_socket and os.path.exists(unix_socket):
+                os.unlink(unix_socket)
@@ -4,9 +4,17 @@ This module centralizes storage and access of file paths for various assets, dat
 templates, and reports used within OptiMix.
 """
 
+import re
 from pathlib import Path
 
 
+def natural_sort_key(path: Path) -> list:
+    """Sort key ordering numbered file names naturally, i.e. plot-data-l2.csv before plot-data-l10.csv
+
+    """
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', path.name)]
+
+
 class ProjectPaths:
     """Centralizes storage and access of all project file paths
     """
@@ -21,6 +29,8 @@ class ProjectPaths:
         self.data_dir = None
         self.fagg_prop_data_dir = None
         self.fwc_data_dir = None
+        self.reference_pack_path = None
+        self.design_atlas_dir = None
         self.gui_images_dir = None
         self.aem_dir = None
         self.doe_dir = None
@@ -71,6 +81,12 @@ class ProjectPaths:
         self.fagg_prop_data_dir = self.data_dir / "fagg_prop_data"
         self.fwc_data_dir = self.data_dir / "fwc_data"
 
+        # Compiled pack of all the data folder's curves, see `core.logic.reference_pack`
+        self.reference_pack_path = self.data_dir / "reference_pack.npz"
+
+        # Precomputed grid of designs, see `core.logic.design_atlas`
+        self.design_atlas_dir = self.data_dir / "design_atlas"
+
         # GUI Images folder & its sub-folders
         self.gui_images_dir = self.assets_dir / "gui_images"
         self.aem_dir = self.gui_images_dir / "aem_mode"
@@ -189,8 +205,8 @@ class ProjectPaths:
         ]
         
         # Free-water/cement ratio plot data paths
-        self.fwc_plot_paths = [csv_file for csv_file in self.fwc_data_dir.iterdir()]
-        self.fwc_plot_paths = self.fwc_plot_paths[:1] + self.fwc_plot_paths[2:] + self.fwc_plot_paths[1:2]
+        # Natural order (l1, l2, ..., l10), independent of the order the filesystem lists them in
+        self.fwc_plot_paths = sorted(self.fwc_data_dir.glob('*.csv'), key=natural_sort_key)
 
         # Air entrained design mode assets
         self.aem_assets = {
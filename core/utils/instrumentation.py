@@ -0,0 +1,272 @@
+"""instrumentation.py
+
+Opt-in timing of the design engine, figure rendering and exporters, for finding where design time goes.
+
+Enable by setting the `OPTIMIX_TRACE` environment variable before launching, e.g.
+    OPTIMIX_TRACE=traces/session python optimix_launcher.py
+
+Every `MixDesignAnalyzer` method, `plotly_image_converter` (kaleido render), `load_tk_image` (PNG decode)
+and exporter call is recorded as a span in a ring buffer, tagged with the trace id of the design it belongs to.
+At exit the buffer is written to `<prefix>.json` (spans & per-stage latency percentiles) and
+`<prefix>.trace.json` (Chrome trace format, open in chrome://tracing or https://ui.perfetto.dev).
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import itertools
+import threading
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Environment variables: output path prefix ('1' for ./optimix_trace), ring buffer size
+trace_env_var = 'OPTIMIX_TRACE'
+buffer_env_var = 'OPTIMIX_TRACE_BUFFER'
+
+# Functions timed besides the analyzer's methods: module -> function names
+traced_functions = {
+    'core.logic.helpers.output_helpers': ['plotly_image_converter', 'load_tk_image', 'result_preparer',
+                                          'generate_md_report', 'to_xlsx', 'to_xlsx_workbook', 'to_pdf', 'to_word'],
+}
+
+# Analyzer methods that start a new design (stage one), each design gets its own trace id
+design_start_methods = {'special_check', 'run_headless', 'headless_mix_parameters'}
+
+# Recorded spans, the oldest are dropped once full
+span_buffer = deque(maxlen=100_000)
+
+# Trace id of the design whose code is running
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+_trace_ids = itertools.count(1)
+_last_trace = None
+_origin_ns = time.perf_counter_ns()
+_installed = False
+
+
+def new_trace_id() -> str:
+    """Makes a trace id, unique within the process"""
+    return f'{os.getpid()}-{next(_trace_ids)}'
+
+
+def record_span(name: str, category: str, start_ns: int, end_ns: int, trace_id: str | None, error: bool) -> None:
+    """
+    Adds a finished span to the ring buffer
+
+    :param name: (str): What was timed, e.g. 'MixDesignAnalyzer.calculate_k'
+    :param category: (str): 'engine', 'render' or 'export'
+    :param start_ns: (int): perf_counter_ns() at the start
+    :param end_ns: (int): perf_counter_ns() at the end
+    :param trace_id: (str): Trace id of the design
+    :param error: (bool): Whether the call raised
+    """
+    span_buffer.append({'name': name,
+                        'category': category,
+                        'trace_id': trace_id,
+                        'start_us': (start_ns - _origin_ns) / 1e3,
+                        'duration_us': (end_ns - start_ns) / 1e3,
+                        'thread': threading.get_ident(),
+                        'error': error})
+
+
+@contextmanager
+def span(name: str, category: str = 'engine', trace_id: str = None):
+    """
+    Times a block of code
+
+    :param name: (str): What is timed
+    :param category: (str): Span category
+    :param trace_id: (str): Trace id of the design, the one running (or last run) by default
+    """
+    trace_id = trace_id or current_trace.get() or _last_trace
+    start = time.perf_counter_ns()
+    error = False
+
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record_span(name, category, start, time.perf_counter_ns(), trace_id, error)
+
+
+def trace_method(method, name: str):
+    """
+    Wraps an analyzer method so that it is timed under the trace id of the analyzer's current design.
+    The GUI reuses one analyzer per mode page, so a design's trace starts over at its first stage.
+
+    :param method: The unbound method
+    :param name: (str): Span name
+    """
+    starts_design = method.__name__ in design_start_methods
+
+    @functools.wraps(method)
+    def traced(self, *args, **kwargs):
+        global _last_trace
+
+        trace_id = self.__dict__.get('trace_id')
+        if trace_id is None or (starts_design and current_trace.get() is None):
+            trace_id = self.__dict__['trace_id'] = new_trace_id()
+
+        _last_trace = trace_id
+        token = current_trace.set(trace_id)
+
+        try:
+            with span(name, 'engine', trace_id):
+                return method(self, *args, **kwargs)
+        finally:
+            current_trace.reset(token)
+
+    traced.__wrapped_by_instrumentation__ = True
+    return traced
+
+
+def trace_function(function, name: str, category: str):
+    """
+    Wraps a function so that it is timed under the trace id of the design running, or last run
+
+    :param function: The function
+    :param name: (str): Span name
+    :param category: (str): Span category
+    """
+    @functools.wraps(function)
+    def traced(*args, **kwargs):
+        with span(name, category):
+            return function(*args, **kwargs)
+
+    traced.__wrapped_by_instrumentation__ = True
+    return traced
+
+
+def rebind(original, replacement) -> None:
+    """
+    Replaces a function in every OptiMix module that imported it by name
+
+    :param original: The original function
+    :param replacement: Its replacement
+    """
+    for module_name, module in list(sys.modules.items()):
+        if module is None or not module_name.startswith(('core', 'gui', 'optimix', '__main__')):
+            continue
+
+        for attribute, value in list(vars(module).items()):
+            if value is original:
+                setattr(module, attribute, replacement)
+
+
+def install(buffer_size: int = None) -> None:
+    """
+    Starts timing the analyzer's methods and the traced functions, safe to call more than once
+
+    :param buffer_size: (int): Number of spans kept in the ring buffer
+    """
+    global _installed, span_buffer
+
+    if _installed:
+        return
+
+    if buffer_size:
+        span_buffer = deque(span_buffer, maxlen=buffer_size)
+
+    import importlib
+    from core.logic.mix_design import MixDesignAnalyzer
+
+    for name, attribute in list(vars(MixDesignAnalyzer).items()):
+        if callable(attribute) and not name.startswith('__'):
+            setattr(MixDesignAnalyzer, name, trace_method(attribute, f'MixDesignAnalyzer.{name}'))
+
+    for module_name, function_names in traced_functions.items():
+        module = importlib.import_module(module_name)
+
+        for function_name in function_names:
+            original = getattr(module, function_name)
+            category = 'render' if function_name in ('plotly_image_converter', 'load_tk_image') else 'export'
+            rebind(original, trace_function(original, function_name, category))
+
+    _installed = True
+
+
+def percentiles(durations_us: list) -> dict:
+    """Latency statistics of a span name, in milliseconds"""
+    durations = np.asarray(durations_us) / 1e3
+    p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+
+    return {'count': len(durations), 'total_ms': float(durations.sum()), 'mean_ms': float(durations.mean()),
+            'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(durations.max())}
+
+
+def summary() -> dict:
+    """
+    Latency statistics per span name, slowest total first
+
+    :return: (dict): span name -> {count, total_ms, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}
+    """
+    durations = {}
+    for recorded in list(span_buffer):
+        durations.setdefault(recorded['name'], []).append(recorded['duration_us'])
+
+    stats = {name: percentiles(values) for name, values in durations.items()}
+    return dict(sorted(stats.items(), key=lambda item: item[1]['total_ms'], reverse=True))
+
+
+def dump_json(path) -> None:
+    """
+    Writes the recorded spans and their latency statistics as JSON
+
+    :param path: Location of the .json file
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'summary': summary(), 'spans': list(span_buffer)}, file)
+
+
+def dump_chrome_trace(path) -> None:
+    """
+    Writes the recorded spans in Chrome trace event format
+
+    :param path: Location of the .json file
+    """
+    pid = os.getpid()
+    events = [{'name': recorded['name'], 'cat': recorded['category'], 'ph': 'X',
+               'ts': recorded['start_us'], 'dur': recorded['duration_us'], 'pid': pid, 'tid': recorded['thread'],
+               'args': {'trace_id': recorded['trace_id'], 'error': recorded['error']}}
+              for recorded in list(span_buffer)]
+
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+
+def dump(prefix) -> None:
+    """
+    Writes `<prefix>.json` and `<prefix>.trace.json`
+
+    :param prefix: Output path prefix
+    """
+    prefix = Path(prefix)
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+
+    dump_json(prefix.with_name(prefix.name + '.json'))
+    dump_chrome_trace(prefix.with_name(prefix.name + '.trace.json'))
+
+
+def install_from_env() -> bool:
+    """
+    Installs the instrumentation if `OPTIMIX_TRACE` is set, writing the traces at exit
+
+    :return: (bool): Whether the instrumentation was installed
+    """
+    prefix = os.environ.get(trace_env_var)
+
+    if not prefix:
+        return False
+
+    install(int(os.environ.get(buffer_env_var, 0)) or None)
+    atexit.register(dump, 'optimix_trace' if prefix == '1' else prefix)
+
+    return True
@@ -0,0 +1,216 @@
+"""profiling.py
+
+Whole-session profiling of the GUI, labelled with the mode page and design stage the user was on.
+
+Enable with `python optimix_launcher.py --profile [PREFIX]` or the `OPTIMIX_PROFILE=PREFIX` environment variable.
+On exit these are written:
+    - <prefix>.pstats                    cProfile statistics of the whole session (python -m pstats, snakeviz)
+    - <prefix>.<label>.pstats            cProfile statistics of each page & stage
+    - <prefix>.collapsed.txt             sampled stacks, collapsed (flamegraph.pl, speedscope, inferno)
+    - <prefix>.speedscope.json           sampled stacks, one profile per page & stage (https://www.speedscope.app)
+
+Nothing here is imported or started unless profiling is enabled.
+"""
+import re
+import sys
+import json
+import pstats
+import cProfile
+import threading
+from pathlib import Path
+from typing import Callable
+
+# Environment variables: output path prefix ('1' for ./optimix_profile), sampling interval in milliseconds
+profile_env_var = 'OPTIMIX_PROFILE'
+interval_env_var = 'OPTIMIX_PROFILE_INTERVAL'
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the main thread's Python stack at a fixed interval, counting identical stacks under the current label
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        :param interval: (float): Seconds between samples
+        """
+        super().__init__(name='optimix-stack-sampler', daemon=True)
+        self.interval = interval
+        self.label = 'startup'
+        self.counts = {}
+        self.target_thread = threading.main_thread().ident
+        self.halt = threading.Event()
+
+    def run(self) -> None:
+        while not self.halt.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread)
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+
+            key = (self.label, tuple(reversed(stack)))
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self) -> None:
+        self.halt.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        """
+        The samples as collapsed stacks, 'label;outer;...;inner count' per line
+        """
+        lines = []
+        for (label, stack), count in self.counts.items():
+            frames = [label] + [f'{name} ({Path(filename).name}:{line})' for name, filename, line in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+
+        return '\n'.join(sorted(lines)) + '\n'
+
+    def speedscope(self) -> dict:
+        """
+        The samples in speedscope's file format, one sampled profile per label
+        """
+        frames, frame_index, profiles = [], {}, {}
+        interval_ms = self.interval * 1e3
+
+        for (label, stack), count in self.counts.items():
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                indices.append(frame_index[frame])
+
+            profile = profiles.setdefault(label, {'type': 'sampled', 'name': label, 'unit': 'milliseconds',
+                                                  'startValue': 0, 'endValue': 0, 'samples': [], 'weights': []})
+            profile['samples'].append(indices)
+            profile['weights'].append(count * interval_ms)
+            profile['endValue'] += count * interval_ms
+
+        return {'$schema': 'https://www.speedscope.app/file-format-schema.json',
+                'name': 'OptiMix session',
+                'exporter': 'optimix',
+                'activeProfileIndex': 0,
+                'shared': {'frames': frames},
+                'profiles': list(profiles.values())}
+
+
+class SessionProfiler:
+    """
+    Profiles a Tk session with cProfile (one profile per label) and a stack sampler.
+
+    The label is polled on the Tk main loop, so reading widget state stays on the main thread.
+    """
+
+    def __init__(self, root, label: Callable[[], str], prefix='optimix_profile', interval: float = 0.005,
+                 poll_ms: int = 100):
+        """
+        :param root: (tk.Tk): The application's root window
+        :param label: Returns the current page & stage, called on the main loop
+        :param prefix: Output path prefix
+        :param interval: (float): Seconds between stack samples
+        :param poll_ms: (int): Milliseconds between label polls
+        """
+        self.root = root
+        self.label = label
+        self.prefix = Path(prefix)
+        self.poll_ms = poll_ms
+        self.sampler = StackSampler(interval)
+        self.profiles = {}
+        self.current = None
+        self.active = False
+
+    def switch(self, label: str) -> None:
+        """Moves cProfile collection to the profile of `label`"""
+        if self.current is not None:
+            self.profiles[self.current].disable()
+
+        self.current = label
+        self.sampler.label = label
+        self.profiles.setdefault(label, cProfile.Profile()).enable()
+
+    def poll(self) -> None:
+        """Follows the user from page to page and stage to stage"""
+        if not self.active:
+            return
+
+        label = self.label()
+        if label != self.current:
+            self.switch(label)
+
+        self.root.after(self.poll_ms, self.poll)
+
+    def start(self) -> 'SessionProfiler':
+        """Starts profiling under the 'startup' label, the label is polled once the main loop runs"""
+        self.active = True
+        self.switch('startup')
+        self.sampler.start()
+        self.root.after(self.poll_ms, self.poll)
+
+        return self
+
+    def stop(self) -> list:
+        """
+        Stops profiling and writes the profiles
+
+        :return: (list): Paths of the files written
+        """
+        if not self.active:
+            return []
+
+        self.active = False
+        self.profiles[self.current].disable()
+        self.sampler.stop()
+
+        self.prefix.parent.mkdir(parents=True, exist_ok=True)
+        written = []
+
+        def output(suffix: str) -> Path:
+            path = self.prefix.with_name(self.prefix.name + suffix)
+            written.append(path)
+            return path
+
+        profiles = [profile for profile in self.profiles.values() if profile.getstats()]
+        if profiles:
+            pstats.Stats(*profiles).dump_stats(output('.pstats'))
+
+        for label, profile in self.profiles.items():
+            if profile.getstats():
+                profile.dump_stats(output(f".{re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')}.pstats"))
+
+        output('.collapsed.txt').write_text(self.sampler.collapsed())
+        output('.speedscope.json').write_text(json.dumps(self.sampler.speedscope()))
+
+        return written
+
+
+def profile_prefix(argv: list, environ: dict) -> str | None:
+    """
+    Whether (and where) to profile, from `--profile [PREFIX]` or `OPTIMIX_PROFILE`
+
+    :param argv: (list): Command line arguments, `--profile` and its value are removed from it
+    :param environ: (dict): Environment variables
+    :return: (str): Output prefix, None when profiling is disabled
+    """
+    prefix = environ.get(profile_env_var) or None
+
+    if '--profile' in argv:
+        position = argv.index('--profile')
+        argv.pop(position)
+        prefix = 'optimix_profile'
+
+        if position < len(argv) and not argv[position].startswith('-'):
+            prefix = argv.pop(position)
+
+    if prefix == '1':
+        prefix = 'optimix_profile'
+
+    return prefix
+
+
+def sampling_interval(environ: dict) -> float:
+    """Seconds between stack samples, from `OPTIMIX_PROFILE_INTERVAL` in milliseconds (5 ms by default)"""
+    return float(environ.get(interval_env_var) or 5) / 1e3
@@ -0,0 +1,249 @@
+"""stall_monitor.py
+
+Watchdog for the Tk event loop, reporting when blocking work on the main thread
+(calculations, figure renders, image decoding, PDF export) freezes the window.
+
+Enable by setting the `OPTIMIX_STALLS` environment variable before launching, e.g.
+    OPTIMIX_STALLS=logs/stalls OPTIMIX_STALL_MS=150 python optimix_launcher.py
+
+A heartbeat is scheduled with `after()`; a heartbeat firing later than the threshold (200 ms by default) is a stall.
+While the main loop is stalled a watchdog thread samples the main thread's stack, so each stall is logged with
+what was blocking, and with the page, stage and results window the user was on.
+Stalls are printed to stderr and appended to `<prefix>.log` as they end; at exit the stall distribution is
+printed and written, with every stall, to `<prefix>.json`.
+"""
+import sys
+import json
+import time
+import atexit
+import threading
+import traceback
+import tkinter as tk
+from collections import Counter
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+# Environment variables: output path prefix ('1' for ./optimix_stalls), stall threshold in milliseconds
+stalls_env_var = 'OPTIMIX_STALLS'
+threshold_env_var = 'OPTIMIX_STALL_MS'
+
+# Upper edges of the stall duration histogram, in milliseconds
+histogram_edges_ms = [250, 500, 1000, 2000, 5000, float('inf')]
+
+
+def main_thread_stack() -> str:
+    """The main thread's stack, formatted innermost call last"""
+    frame = sys._current_frames().get(threading.main_thread().ident)
+
+    return ''.join(traceback.format_stack(frame)) if frame is not None else ''
+
+
+class StallMonitor:
+    """
+    Measures how late `after()` heartbeats fire on the Tk main loop, logging the stalls longer than a threshold.
+
+    Attributes:
+        - stalls `list`: Every stall, {'start', 'duration_ms', 'context', 'stack', 'samples'}
+        - beats `int`: Heartbeats fired
+    """
+
+    def __init__(self, root, context: Callable[[], str] = None, prefix=None, threshold_ms: float = 200,
+                 interval_ms: int = 50):
+        """
+        :param root: (tk.Tk): The application's root window
+        :param context: Returns where the user is (page & stage), called on the main loop
+        :param prefix: Output path prefix, nothing is written to file when None
+        :param threshold_ms: (float): Lateness of a heartbeat counted as a stall, in milliseconds
+        :param interval_ms: (int): Milliseconds between heartbeats
+        """
+        self.root = root
+        self.context = context or (lambda: '')
+        self.prefix = None if prefix is None else Path(prefix)
+        self.threshold = threshold_ms / 1e3
+        self.interval_ms = interval_ms
+
+        self.stalls = []
+        self.beats = 0
+        self.started = None
+        self.active = False
+
+        # Shared with the watchdog thread: when the next heartbeat is due, stacks sampled since the last one
+        self.lock = threading.Lock()
+        self.due = None
+        self.samples = []
+        self.last_context = ''
+        self.halt = threading.Event()
+        self.watchdog = threading.Thread(target=self.watch, name='optimix-stall-watchdog', daemon=True)
+
+    def where(self) -> str:
+        """The page & stage shown, and the results window on top, if any"""
+        windows = [f'{type(child).__module__.rsplit(".", 1)[-1]}.{type(child).__name__}'
+                   for child in self.root.children.values() if isinstance(child, tk.Toplevel)]
+        context = self.context()
+
+        return f'{context} [{windows[-1]}]' if windows else context
+
+    def beat(self) -> None:
+        """The heartbeat, run on the main loop"""
+        if not self.active:
+            return
+
+        now = time.monotonic()
+
+        with self.lock:
+            late = now - self.due
+            samples, self.samples = self.samples, []
+
+        if late > self.threshold:
+            self.record(now - late, late, samples)
+
+        self.beats += 1
+        self.last_context = self.where()
+
+        with self.lock:
+            self.due = time.monotonic() + self.interval_ms / 1e3
+
+        self.root.after(self.interval_ms, self.beat)
+
+    def watch(self) -> None:
+        """The watchdog, sampling the main thread's stack while a heartbeat is overdue"""
+        period = min(self.threshold, 0.05)
+
+        while not self.halt.wait(period):
+            # One sample once the threshold is passed, then one per threshold while the stall lasts
+            with self.lock:
+                overdue = time.monotonic() - self.due > self.threshold * (len(self.samples) + 1)
+
+            if overdue:
+                stack = main_thread_stack()
+
+                with self.lock:
+                    self.samples.append(stack)
+
+    def record(self, start: float, late: float, samples: list) -> None:
+        """
+        Logs a stall
+
+        :param start: (float): monotonic() when the heartbeat was due
+        :param late: (float): Seconds the heartbeat was late
+        :param samples: (list): Main thread stacks sampled during the stall
+        """
+        stack = Counter(samples).most_common(1)[0][0] if samples else ''
+        stall = {'start': round(start - self.started, 3),
+                 'duration_ms': round(late * 1e3, 1),
+                 'context': self.last_context,
+                 'stack': stack,
+                 'samples': len(samples)}
+        self.stalls.append(stall)
+
+        message = (f"[stall] {stall['duration_ms']:.0f} ms at {stall['start']:.1f}s "
+                   f"in {stall['context'] or 'startup'}\n{stack}")
+        print(message, file=sys.stderr, end='')
+
+        if self.prefix is not None:
+            with open(self.prefix.with_name(self.prefix.name + '.log'), 'a', encoding='utf-8') as file:
+                file.write(message)
+
+    def summary(self) -> dict:
+        """
+        Distribution of the stalls
+
+        :return: (dict): {beats, stalls, stalled_ms, p50_ms, p95_ms, max_ms, histogram, by_context}
+        """
+        durations = np.array([stall['duration_ms'] for stall in self.stalls])
+        summary = {'beats': self.beats, 'threshold_ms': self.threshold * 1e3, 'stalls': len(self.stalls)}
+
+        if not durations.size:
+            return summary
+
+        lower, histogram = self.threshold * 1e3, {}
+        for edge in histogram_edges_ms:
+            if edge > lower:
+                histogram[f'{lower:g}-{edge:g} ms'] = int(((durations > lower) & (durations <= edge)).sum())
+                lower = edge
+
+        by_context = {}
+        for stall in self.stalls:
+            entry = by_context.setdefault(stall['context'] or 'startup', {'stalls': 0, 'stalled_ms': 0.0})
+            entry['stalls'] += 1
+            entry['stalled_ms'] = round(entry['stalled_ms'] + stall['duration_ms'], 1)
+
+        summary.update({'stalled_ms': round(float(durations.sum()), 1),
+                        'p50_ms': float(np.percentile(durations, 50)),
+                        'p95_ms': float(np.percentile(durations, 95)),
+                        'max_ms': float(durations.max()),
+                        'histogram': histogram,
+                        'by_context': dict(sorted(by_context.items(), key=lambda item: item[1]['stalled_ms'],
+                                                  reverse=True))})
+
+        return summary
+
+    def start(self) -> 'StallMonitor':
+        self.active = True
+        self.started = time.monotonic()
+
+        with self.lock:
+            self.due = self.started + self.interval_ms / 1e3
+
+        if self.prefix is not None:
+            self.prefix.parent.mkdir(parents=True, exist_ok=True)
+
+        self.root.after(self.interval_ms, self.beat)
+        self.watchdog.start()
+
+        return self
+
+    def stop(self) -> dict:
+        """
+        Stops monitoring, printing the stall distribution and writing it, with every stall, to `<prefix>.json`
+
+        :return: (dict): The stall distribution
+        """
+        if not self.active:
+            return self.summary()
+
+        self.active = False
+        self.halt.set()
+        self.watchdog.join()
+
+        summary = self.summary()
+        lines = [f"[stall] {summary['stalls']} stalls over {summary['threshold_ms']:g} ms in {summary['beats']} "
+                 f"heartbeats"]
+
+        if summary['stalls']:
+            lines.append(f"[stall] {summary['stalled_ms']:.0f} ms stalled, p50 {summary['p50_ms']:.0f} ms, "
+                         f"p95 {summary['p95_ms']:.0f} ms, max {summary['max_ms']:.0f} ms")
+            lines += [f"[stall]   {bucket:>14}: {count}" for bucket, count in summary['histogram'].items()]
+            lines += [f"[stall]   {context}: {entry['stalls']} stalls, {entry['stalled_ms']:.0f} ms"
+                      for context, entry in summary['by_context'].items()]
+
+        print('\n'.join(lines), file=sys.stderr)
+
+        if self.prefix is not None:
+            with open(self.prefix.with_name(self.prefix.name + '.json'), 'w', encoding='utf-8') as file:
+                json.dump({'summary': summary, 'stalls': self.stalls}, file, indent=2)
+
+        return summary
+
+
+def monitor_from_env(root, context: Callable[[], str], environ: dict) -> StallMonitor | None:
+    """
+    Starts a stall monitor if `OPTIMIX_STALLS` is set, stopping it at exit
+
+    :param root: (tk.Tk): The application's root window
+    :param context: Returns where the user is (page & stage), called on the main loop
+    :param environ: (dict): Environment variables
+    :return: (StallMonitor): The running monitor, None if monitoring is disabled
+    """
+    prefix = environ.get(stalls_env_var)
+
+    if not prefix:
+        return None
+
+    monitor = StallMonitor(root, context, 'optimix_stalls' if prefix == '1' else prefix,
+                           threshold_ms=float(environ.get(threshold_env_var) or 200)).start()
+    atexit.register(monitor.stop)
+
+    return monitor
@@ -1329,7 +1329,14 @@ class StageThree(tk.Frame):
 
         # Perform background calculations before proceeding to check
         self.collect_data()
-        self.calculate()
+        try:
+            self.calculate()
+
+        except ValueError as error:
+            # The cement content could not be calculated, e.g. from a zero free-water/cement ratio
+            messagebox.showerror(title="Invalid Specification", message=str(error), parent=self.stage_canvas)
+            self.fill_status = [False, False]
+            return
 
         if self.analyzer.invalid_cc_entry:
             # The user entered a non-numeric value, display an error message
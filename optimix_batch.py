@@ -0,0 +1,64 @@
+"""optimix_batch.py
+
+Designs mix specifications in batch from a .csv or .parquet file, without the GUI.
+
+Usage:
+    python optimix_batch.py specifications.csv results.jsonl --mode PFA --chunksize 5000
+    python optimix_batch.py specifications.csv results.jsonl --mode PFA --chunksize 5000 --resume
+
+Input columns are named as in `core.logic.helpers.stream_helpers.input_fields`
+(characteristic_strength, curing_days, defective_rate, slump, ...), with an optional 'mode' column.
+"""
+
+import sys
+import argparse
+
+from core.logic.batch_engine import run_batch, design_modes
+from core.utils.instrumentation import install_from_env
+
+
+def report_progress(summary: dict) -> None:
+    """Prints the running summary of a batch run after each chunk"""
+    print(f"chunk {summary['chunks']}: {summary['rows']} rows, {summary['failed']} failed, "
+          f"{summary['rows_per_second']:.1f} rows/s, peak RSS {summary['peak_rss_mb']:.1f} MiB", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch concrete mix design with OptiMix")
+    parser.add_argument('input', help="Specification file (.csv or .parquet)")
+    parser.add_argument('output', help="Results file (.jsonl or .parquet), '-' streams JSON Lines to stdout")
+    parser.add_argument('--mode', choices=design_modes, default='DOE',
+                        help="Design mode of rows without a 'mode' column")
+    parser.add_argument('--chunksize', type=int, default=1000, help="Specifications designed per chunk")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run from its checkpoint, skipping finished chunks")
+    parser.add_argument('--no-dedup', dest='dedup', action='store_false',
+                        help="Design every row, even when its inputs repeat an earlier row")
+    args = parser.parse_args()
+
+    # Time the design stages when OPTIMIX_TRACE is set
+    install_from_env()
+
+    # Keep stdout clean when it carries the results
+    progress = report_progress if args.output != '-' else None
+
+    try:
+        summary = run_batch(args.input, args.output, mode=args.mode, chunksize=args.chunksize,
+                            progress=progress, resume=args.resume, dedup=args.dedup)
+    except KeyboardInterrupt:
+        print("Interrupted, run again with --resume to continue from the last finished chunk", file=sys.stderr)
+        sys.exit(130)
+
+    if progress:
+        if summary['resumed_rows']:
+            print(f"Resumed after {summary['resumed_rows']} specifications designed by an earlier run")
+        print(f"Designed {summary['rows']} specifications in {summary['seconds']:.1f}s "
+              f"({summary['rows_per_second']:.1f} rows/s, peak RSS {summary['peak_rss_mb']:.1f} MiB)")
+
+        if args.dedup:
+            print(f"{summary['unique_designs']} unique designs, {summary['reused_designs']} rows "
+                  f"({summary['dedup_ratio']:.1%}) reused an earlier design")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,11 +5,16 @@ managing page transitions, and handling user interactions seamlessly.
 
 """
 
+import os
+import sys
+import atexit
 import tkinter as tk
 from typing import List
 
 from core.utils.themes import BG
 from core.utils.file_paths import optimix_paths
+from core.utils.instrumentation import install_from_env
+from core.utils.stall_monitor import monitor_from_env
 
 from gui.intro_page import IntroPage
 from gui.design_mode import DesignModePage
@@ -62,8 +67,37 @@ class OptiMixApp:
         for page in self.page_frames[1:]:
             page.forget()
 
+    def session_label(self) -> str:
+        """
+        The page shown and, on a mode page, its stage, e.g. 'DoeModePage stage 3'; labels profiles & stalls
+        """
+        for page in reversed(self.page_frames):
+            if page.winfo_manager():
+                stage = getattr(page, 'index', None)
+                return type(page).__name__ if stage is None else f'{type(page).__name__} stage {stage + 1}'
+
+        return 'startup'
+
+
+# Time the design stages, rendering and exports when OPTIMIX_TRACE is set
+install_from_env()
+
+# Profile the session when launched with --profile [PREFIX] or with OPTIMIX_PROFILE set, written at exit
+profile_to = None
+if '--profile' in sys.argv or os.environ.get('OPTIMIX_PROFILE'):
+    from core.utils.profiling import SessionProfiler, profile_prefix, sampling_interval
+    profile_to = profile_prefix(sys.argv, os.environ)
 
 # Launch the OptiMix application
 root = tk.Tk()
+
+if profile_to:
+    profiler = SessionProfiler(root, lambda: app.session_label(), profile_to, sampling_interval(os.environ)).start()
+    atexit.register(profiler.stop)
+
 app = OptiMixApp(root)
+
+# Log the main loop's stalls when OPTIMIX_STALLS is set
+monitor_from_env(root, app.session_label, os.environ)
+
 root.mainloop()
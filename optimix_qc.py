@@ -0,0 +1,71 @@
+"""optimix_qc.py
+
+Follows cube test results from the lab and prints each mix's running mean & standard deviation as they come in.
+
+Usage:
+    python optimix_qc.py --csv cube_results.csv --window 40
+    python optimix_qc.py --csv cube_results.csv --no-follow
+    python optimix_qc.py --unix /tmp/optimix_qc.sock
+
+    echo '{"mix": "C30-A", "strength": 38.5}' | nc -U /tmp/optimix_qc.sock
+
+Each result prints a JSON line {"mix", "count", "total_count", "mean", "sd"}. See `core.qc.cube_results`
+for the CSV columns and for feeding the statistics back into a design.
+"""
+
+import sys
+import json
+import math
+import asyncio
+import argparse
+
+from core.qc.cube_results import CubeResultMonitor, tail_csv, serve_results, min_results
+
+
+def print_statistics(result, statistics) -> None:
+    """Prints a result's mix statistics as a JSON line"""
+    summary = statistics.summary()
+    if math.isnan(summary['sd']):
+        summary['sd'] = None
+
+    print(json.dumps({'mix': result.mix, **summary}), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OptiMix cube test result monitor")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', metavar='PATH', help="CSV file of results to follow as lines are appended")
+    source.add_argument('--port', type=int, help="Receive JSON Lines results on this localhost port")
+    source.add_argument('--unix', metavar='PATH', help="Receive JSON Lines results on this Unix socket")
+    parser.add_argument('--window', type=int,
+                        help=f"Latest results per mix the statistics are taken over, at least {min_results}; "
+                             f"all by default")
+    parser.add_argument('--no-follow', action='store_true', help="Stop at the end of the CSV file")
+    parser.add_argument('--poll', type=float, default=1.0, help="Seconds between checks of the CSV file for new lines")
+    args = parser.parse_args()
+
+    if args.window is not None and args.window < min_results:
+        parser.error(f"--window must be at least {min_results}, the results a mix's own standard deviation needs")
+
+    monitor = CubeResultMonitor(window=args.window)
+
+    def report_error(line: str, error: Exception) -> None:
+        monitor.rejected += 1
+        print(f"skipped {line.strip()!r}: {error}", file=sys.stderr, flush=True)
+
+    try:
+        if args.csv:
+            for result in tail_csv(args.csv, follow=not args.no_follow, poll_interval=args.poll,
+                                   on_error=report_error):
+                print_statistics(result, monitor.add(result))
+        else:
+            asyncio.run(serve_results(monitor, port=args.port or 8766, unix_socket=args.unix,
+                                      on_result=print_statistics,
+                                      ready=lambda address: print(f"OptiMix QC listening on {address}",
+                                                                  file=sys.stderr, flush=True)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
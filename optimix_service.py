@@ -0,0 +1,45 @@
+"""optimix_service.py
+
+Runs OptiMix as a local design service, for tools that need designs without the GUI.
+
+Usage:
+    python optimix_service.py --port 8765
+    python optimix_service.py --unix /tmp/optimix.sock --workers 4
+
+    curl -X POST localhost:8765/design -d '{"mode": "PFA", "characteristic_strength": 30, "curing_days": 28,
+                                            "defective_rate": 5, "pfa_proportion": 30,
+                                            "agg_10mm": 0, "agg_20mm": 20, "agg_40mm": 0}'
+
+The aggregate size fields take the size itself (10, 20 or 40) when used and 0 when not, as the GUI's checkbuttons do.
+
+See `core.service.design_service` for the endpoints.
+"""
+
+import argparse
+import asyncio
+
+from core.service.design_service import DesignService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OptiMix local design service")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (localhost by default)")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on")
+    parser.add_argument('--unix', metavar='PATH', help="Listen on a Unix socket instead of a port")
+    parser.add_argument('--workers', type=int, help="Design worker processes, the number of CPUs by default")
+    parser.add_argument('--max-pending', type=int,
+                        help="Designs allowed in flight before requests are refused with 503, 32 per worker by default")
+    args = parser.parse_args()
+
+    service = DesignService(workers=args.workers, max_pending=args.max_pending)
+
+    try:
+        asyncio.run(service.serve(host=args.host, port=args.port, unix_socket=args.unix,
+                                  ready=lambda address: print(f"OptiMix design service listening on {address}",
+                                                              flush=True)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""test_batch_engine.py
+
+Regression tests of headless batch design from specification files.
+"""
+import json
+
+import pandas as pd
+
+from core.logic.batch_engine import run_batch
+from core.logic.helpers.stream_helpers import input_fields
+
+
+def test_blank_optional_columns_keep_defaults(tmp_path):
+    # Every input column, the optional ones left blank, so the analyzer's defaults (Strength Loss 5.5,
+    # Cementing Efficiency Factor 0.3, Fine Aggregate & Water Content Reduction 5) have to be kept
+    specs = pd.DataFrame([{name: '' for name in input_fields} for _ in range(2)])
+    specs['mode'] = ['AEM', 'PFA']
+    specs['characteristic_strength'] = '30'
+    specs['curing_days'] = '28'
+    specs['defective_rate'] = '5'
+    specs.loc[0, 'air_content'] = '4'
+    specs.loc[1, 'pfa_proportion'] = '30'
+
+    input_path, output_path = tmp_path / 'specs.csv', tmp_path / 'results.jsonl'
+    specs.to_csv(input_path, index=False)
+
+    summary = run_batch(input_path, output_path, dedup=False)
+    records = [json.loads(line) for line in output_path.read_text().splitlines()]
+
+    assert summary['failed'] == 0
+    assert [record['design_status'] for record in records] == ['ok', 'ok']
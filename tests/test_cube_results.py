@@ -0,0 +1,19 @@
+"""test_cube_results.py
+
+Regression tests of reading cube results from CSV files.
+"""
+from core.qc.cube_results import tail_csv
+
+
+def test_unterminated_last_line_without_following(tmp_path):
+    path = tmp_path / 'cube_results.csv'
+    path.write_bytes(b'mix,strength\nA,30\nA,32\nA,35')
+
+    assert [result.strength for result in tail_csv(path, follow=False)] == [30, 32, 35]
+
+
+def test_partly_written_last_line_is_left_when_following(tmp_path):
+    path = tmp_path / 'cube_results.csv'
+    path.write_bytes(b'mix,strength\nA,30\nA,3')
+
+    assert [result.strength for result in tail_csv(path, poll_interval=0, stop=lambda: True)] == [30]
@@ -0,0 +1,40 @@
+"""test_fwc_model.py
+
+Regression tests of the fitted Figure 4 model against the offset-curve construction it replaced.
+"""
+import numpy as np
+import pytest
+
+from core.logic.fwc_model import figure_iv_curves, fwc_ratios, offset_curve_fwc_ratio, validation_designs
+
+# Largest free-water/cement ratio difference allowed from the offset-curve construction
+tolerance = 0.003
+
+# (approx_strength, fm, initial_fwc_ratio) of DOE designs made by `calculate_fwc_ratio` before the fitted model,
+# cured to ages between table 2's, the first two on either side of a curve's threshold
+baseline_designs = [
+    (40.666666666666664, 24.869121761708833, 0.6760908154531455),  # RHPC, Uncrushed, 14 days, 15 N/mm2
+    (40.333333333333336, 43.15882901561177, 0.47771265355308634),  # OPC, Crushed, 14 days, 30 N/mm2
+    (45.111111111111114, 38.15882901561177, 0.5589117956774159),   # SRPC, Uncrushed, 56 days, 25 N/mm2
+    (57.666666666666664, 53.15882901561177, 0.5378455962787834),   # RHPC, Crushed, 56 days, 40 N/mm2
+    (45.111111111111114, 48.15882901561177, 0.47579898261705267),  # OPC, Uncrushed, 56 days, 35 N/mm2
+]
+
+
+@pytest.mark.parametrize('approx_strength, fm, expected', baseline_designs)
+def test_baseline_designs(approx_strength, fm, expected):
+    assert fwc_ratios(fm, approx_strength) == pytest.approx(expected, abs=tolerance)
+    assert offset_curve_fwc_ratio(fm, approx_strength) == pytest.approx(expected, abs=1e-12)
+
+
+def test_curve_thresholds():
+    # Between the curve's strength at 0.5 (40.39) & the strength read near it (40.83), the curve above stays the same
+    assert figure_iv_curves(40.3) == figure_iv_curves(40.67) == figure_iv_curves(40.8)
+    assert figure_iv_curves(40.9) == figure_iv_curves(40.67) + 1
+
+
+def test_validation_designs():
+    fm, approx_strength = validation_designs(np.arange(10, 101, 5))
+    expected = np.array([offset_curve_fwc_ratio(*design) for design in zip(fm, approx_strength)])
+
+    assert np.abs(fwc_ratios(fm, approx_strength) - expected).max() < tolerance